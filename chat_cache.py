@@ -0,0 +1,184 @@
+"""/api/chat の回答キャッシュ
+
+同じ検索条件（scope）での同じ質問には、検索・生成をやり直さずに前回の回答を返す。
+- 完全一致: 空白・大文字小文字を正規化した質問文で引く（追加コストなし）
+- 意味一致: CHAT_SEMANTIC_CACHE_ENABLED のときのみ。質問の Embedding と保存済みベクトルの
+  コサイン類似度が CHAT_SEMANTIC_CACHE_THRESHOLD 以上なら同じ質問とみなす
+
+意味一致用のベクトルは連続した float32 行列（スロット単位で再利用）に保持し、近傍探索は
+行列・ベクトル積 1 回とスコープ・TTL のマスクで行う（照会ごとにベクトルを集め直さない）。
+インデックスが更新されたら invalidate() で全破棄する（indexer から呼ばれる）。
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# (scope, 正規化済み質問) -> {"ts", "value", "slot"}（slot は意味一致用ベクトルの行。無ければ -1）
+_entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+# 世代番号。生成中に invalidate() された場合、古い世代の回答は保存しない
+_epoch = 0
+
+# 意味一致用: 行 i がスロット i のベクトル。_slot_used[i] が False のスロットは空き
+_vecs: Optional[np.ndarray] = None
+_slot_used = np.zeros(0, dtype=bool)
+_slot_scope = np.zeros(0, dtype=np.int64)   # スコープの hash（最終判定はキーで照合）
+_slot_ts = np.zeros(0, dtype=np.float64)
+_slot_keys: List[Optional[tuple]] = []
+_free_slots: List[int] = []
+
+
+def _normalize(question: str) -> str:
+    return " ".join(question.split()).casefold()
+
+
+def current_epoch() -> int:
+    return _epoch
+
+
+def invalidate() -> None:
+    """キャッシュを全破棄する（インデックス再構築・ファイル追加/削除後）"""
+    global _epoch, _vecs, _slot_used, _slot_scope, _slot_ts
+    with _lock:
+        _epoch += 1
+        _entries.clear()
+        _vecs = None
+        _slot_used = np.zeros(0, dtype=bool)
+        _slot_scope = np.zeros(0, dtype=np.int64)
+        _slot_ts = np.zeros(0, dtype=np.float64)
+        _slot_keys.clear()
+        _free_slots.clear()
+
+
+def _alloc_slot(key: tuple, vec: np.ndarray, ts: float) -> int:
+    """ベクトルを空きスロットに書き込む（空きが無ければ行列を倍に広げる）。_lock 保持下で呼ぶ"""
+    global _vecs, _slot_used, _slot_scope, _slot_ts
+    from config import CHAT_ANSWER_CACHE_MAX_ENTRIES
+
+    if _vecs is not None and _vecs.shape[1] != vec.shape[0]:
+        return -1  # Embedding の次元が変わった（モデル切替直後）場合は意味一致に使わない
+    if not _free_slots:
+        old = 0 if _vecs is None else _vecs.shape[0]
+        new = max(old * 2, min(CHAT_ANSWER_CACHE_MAX_ENTRIES, 64), 1)
+        grown = np.zeros((new, vec.shape[0]), dtype=np.float32)
+        if _vecs is not None:
+            grown[:old] = _vecs
+        _vecs = grown
+        _slot_used = np.concatenate([_slot_used, np.zeros(new - old, dtype=bool)])
+        _slot_scope = np.concatenate([_slot_scope, np.zeros(new - old, dtype=np.int64)])
+        _slot_ts = np.concatenate([_slot_ts, np.zeros(new - old, dtype=np.float64)])
+        _slot_keys.extend([None] * (new - old))
+        _free_slots.extend(range(new - 1, old - 1, -1))
+    slot = _free_slots.pop()
+    _vecs[slot] = vec
+    _slot_used[slot] = True
+    _slot_scope[slot] = hash(key[0])
+    _slot_ts[slot] = ts
+    _slot_keys[slot] = key
+    return slot
+
+
+def _drop(key: tuple) -> None:
+    """エントリを削除し、ベクトルのスロットを空きに戻す。_lock 保持下で呼ぶ"""
+    entry = _entries.pop(key)
+    slot = entry.get("slot", -1)
+    if slot >= 0:
+        _slot_used[slot] = False
+        _slot_keys[slot] = None
+        _free_slots.append(slot)
+
+
+def _embed(question: str) -> Optional[np.ndarray]:
+    """質問の L2 正規化済み Embedding。失敗時は None（キャッシュを使わないだけ）"""
+    from indexer import get_query_embeddings_batch
+    try:
+        vec = np.asarray(get_query_embeddings_batch([question])[0], dtype=np.float32)
+    except Exception as e:
+        logger.warning(f"Chat cache embedding failed: {e}")
+        return None
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else None
+
+
+def _expired(entry: Dict[str, Any], now: float) -> bool:
+    from config import CHAT_ANSWER_CACHE_TTL_SEC
+    return now - entry["ts"] >= CHAT_ANSWER_CACHE_TTL_SEC
+
+
+def lookup(question: str, scope: Hashable) -> Optional[Dict[str, Any]]:
+    """キャッシュ済みの回答（store() に渡した dict のコピー）を返す。無ければ None"""
+    from config import CHAT_SEMANTIC_CACHE_ENABLED, CHAT_SEMANTIC_CACHE_THRESHOLD
+
+    key = (scope, _normalize(question))
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            if not _expired(entry, now):
+                _entries.move_to_end(key)
+                return dict(entry["value"])
+            _drop(key)
+
+    if not CHAT_SEMANTIC_CACHE_ENABLED:
+        return None
+    from config import CHAT_ANSWER_CACHE_TTL_SEC
+    scope_hash = hash(scope)
+    with _lock:
+        if _vecs is None or not np.any(_slot_used & (_slot_scope == scope_hash)):
+            return None
+    qv = _embed(question)
+    if qv is None:
+        return None
+    with _lock:
+        if _vecs is None or _vecs.shape[1] != qv.shape[0]:
+            return None
+        mask = _slot_used & (_slot_scope == scope_hash) & (now - _slot_ts < CHAT_ANSWER_CACHE_TTL_SEC)
+        if not mask.any():
+            return None
+        sims = np.where(mask, _vecs @ qv, -np.inf)
+        best = int(np.argmax(sims))
+        similarity = float(sims[best])
+        k = _slot_keys[best]
+        if similarity < CHAT_SEMANTIC_CACHE_THRESHOLD or k[0] != scope:
+            return None
+        _entries.move_to_end(k)
+        value = dict(_entries[k]["value"])
+    logger.info(f"Chat cache semantic hit (similarity={similarity:.3f})")
+    return value
+
+
+def store(question: str, scope: Hashable, value: Dict[str, Any], epoch: int) -> None:
+    """回答を保存する。epoch は生成開始時の current_epoch()"""
+    from config import CHAT_ANSWER_CACHE_MAX_ENTRIES, CHAT_SEMANTIC_CACHE_ENABLED
+
+    vec = _embed(question) if CHAT_SEMANTIC_CACHE_ENABLED else None
+    key = (scope, _normalize(question))
+    with _lock:
+        if epoch != _epoch:
+            return
+        if key in _entries:
+            _drop(key)
+        # 先に追い出してからスロットを確保する（上限件数ちょうどで行列を広げない）
+        while _entries and len(_entries) >= CHAT_ANSWER_CACHE_MAX_ENTRIES:
+            _drop(next(iter(_entries)))
+        now = time.monotonic()
+        slot = _alloc_slot(key, vec, now) if vec is not None else -1
+        _entries[key] = {"ts": now, "value": dict(value), "slot": slot}
+
+
+def scope_key(*parts: Any) -> tuple:
+    """リスト等を含む検索条件をハッシュ可能なタプルにする"""
+    out: List[Any] = []
+    for p in parts:
+        if isinstance(p, (list, tuple, set)):
+            out.append(tuple(sorted(map(str, p))))
+        else:
+            out.append(p)
+    return tuple(out)
@@ -3,7 +3,8 @@ import yaml
 import re
 import json
 import logging
-from typing import Dict, Any, List, Optional
+import threading
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 
 from google.genai import types
@@ -19,6 +20,14 @@ _LAW_KEYWORDS = ["法規", "法令", "建築基準", "消防法", "e-Gov", "基
 _DRAWING_KEYWORDS = ["図面", "図", "drawing", "配置図", "平面図", "断面図", "立面図", "詳細図", "設備図"]
 _SPEC_KEYWORDS = ["仕様", "技術基準", "spec", "施工", "工法", "JASS", "JIS"]
 
+# libyaml があれば C 実装のローダーで読む
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# rules_path -> ((mtime_ns, size), rules)。DocumentClassifier はファイルごとに生成されるため、
+# YAML を編集するまでは再パースしない
+_RULES_CACHE: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_RULES_CACHE_LOCK = threading.Lock()
+
 class DocumentClassifier:
     def __init__(self, rules_path: str = "classification_rules.yaml"):
         self.rules_path = rules_path
@@ -32,8 +41,18 @@ class DocumentClassifier:
                 base_dir = Path(__file__).parent
                 self.rules_path = str(base_dir / self.rules_path)
                 
+            st = os.stat(self.rules_path)
+            key = (st.st_mtime_ns, st.st_size)
+            with _RULES_CACHE_LOCK:
+                cached = _RULES_CACHE.get(self.rules_path)
+            if cached and cached[0] == key:
+                return cached[1]
+
             with open(self.rules_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+                rules = yaml.load(f, Loader=_YAML_LOADER)
+            with _RULES_CACHE_LOCK:
+                _RULES_CACHE[self.rules_path] = (key, rules)
+            return rules
         except Exception as e:
             logger.error(f"ルールの読み込みに失敗しました: {e}")
             return {}
@@ -71,6 +71,9 @@ ENABLE_AUTO_CATEGORIZE = os.environ.get("ENABLE_AUTO_CATEGORIZE", "true").lower(
 # 対応ファイル拡張子
 SUPPORTED_EXTENSIONS = ['.pdf', '.md', '.txt', '.docx']
 
+# /api/files/tree のキャッシュ保持秒数（KB ルートと DB 更新時刻が変わらない間は再走査しない）
+FILE_TREE_CACHE_TTL_SEC: float = float(os.getenv("FILE_TREE_CACHE_TTL_SEC", "60"))
+
 # チャンキング設定（レガシー互換用。実際の検索用チャンクサイズは indexer.py の SMALL_CHUNK_SIZES を参照）
 CHUNK_SIZE = 1000  # 文字数
 CHUNK_OVERLAP = 200  # オーバーラップ文字数
@@ -79,6 +82,40 @@ CHUNK_OVERLAP = 200  # オーバーラップ文字数
 TOP_K_RESULTS = 10  # 検索で返すチャンク数
 RERANK_THRESHOLD: float = float(os.getenv("RERANK_THRESHOLD", "0.35"))
 RERANK_CANDIDATE_COUNT: int = int(os.getenv("RERANK_CANDIDATE_COUNT", "15"))
+# ベクトル検索モード:
+#   "average" - 拡張クエリ + HyDE の Embedding を L2 正規化・平均した 1 ベクトルで 1 回検索
+#   "multi"   - クエリごとに検索してマージ（比較検証用）
+VECTOR_QUERY_MODE: str = os.getenv("VECTOR_QUERY_MODE", "average").lower()
+if VECTOR_QUERY_MODE not in {"average", "multi"}:
+    VECTOR_QUERY_MODE = "average"
+# 上位 RERANK_SKIP_MIN_HITS 件のベクトル類似度がすべて RERANK_SKIP_SCORE 以上ならリランクを省略
+RERANK_SKIP_SCORE: float = float(os.getenv("RERANK_SKIP_SCORE", "0.80"))
+RERANK_SKIP_MIN_HITS: int = int(os.getenv("RERANK_SKIP_MIN_HITS", "5"))
+# Gemini 呼び出し（クエリ分析・埋め込み・リランク）が失敗した入力を覚えておく秒数。
+# 期間内の同一入力はリトライせず即フォールバックする（障害時のリトライ連鎖防止）
+GEMINI_NEGATIVE_CACHE_TTL_SEC: float = float(os.getenv("GEMINI_NEGATIVE_CACHE_TTL_SEC", "30"))
+# この文字数未満のクエリはクエリ展開・HyDE（Gemini 呼び出し）をスキップする
+QUERY_EXPANSION_MIN_CHARS: int = int(os.getenv("QUERY_EXPANSION_MIN_CHARS", "8"))
+# 同時に来た検索クエリの Embedding 要求をこの時間窓（ミリ秒）でまとめて 1 回の API 呼び出しにする（0 で無効）
+QUERY_EMBED_BATCH_WINDOW_MS: float = float(os.getenv("QUERY_EMBED_BATCH_WINDOW_MS", "5"))
+# 1 回の API 呼び出しにまとめるテキスト数の上限（Gemini の embed_content は 1 リクエスト 100 件まで）
+QUERY_EMBED_BATCH_MAX: int = int(os.getenv("QUERY_EMBED_BATCH_MAX", "100"))
+# /api/chat の回答キャッシュ（履歴なし・ウェブ検索なしの質問のみ対象。インデックス更新時は破棄）
+CHAT_ANSWER_CACHE_TTL_SEC: float = float(os.getenv("CHAT_ANSWER_CACHE_TTL_SEC", "600"))
+CHAT_ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("CHAT_ANSWER_CACHE_MAX_ENTRIES", "1024"))
+# 意味的に同じ質問（質問 Embedding のコサイン類似度が閾値以上）にもキャッシュを返す。
+# 未ヒット時は質問の Embedding 取得が 1 回増えるため既定は無効
+CHAT_SEMANTIC_CACHE_ENABLED = os.environ.get("CHAT_SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+CHAT_SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("CHAT_SEMANTIC_CACHE_THRESHOLD", "0.97"))
+# 同期エンドポイント（def ハンドラ）・run_in_threadpool が共有するスレッド数の上限（anyio の既定は 40）。
+# /api/chat は検索と Gemini の回答生成が終わるまで 1 スレッドを占有するため、既定より多めに取る
+THREADPOOL_MAX_THREADS: int = int(os.getenv("THREADPOOL_MAX_THREADS", "64"))
+# アップロード後の取り込みパイプライン（OCR・文字起こし・図面解析）を同時に走らせるファイル数。
+# 超えた分はキューで待ち、前のファイルが終わり次第処理される
+INGEST_MAX_WORKERS: int = int(os.getenv("INGEST_MAX_WORKERS", "4"))
+# /api/upload/multiple で 1 リクエスト内に同時に書き込み・ハッシュ・登録するファイル数
+# （アップロード書き込み用スレッドプールの大きさも兼ねる）。ディスクが速ければ増やしてよい
+UPLOAD_CONCURRENCY: int = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
 
 # Gemini API設定
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -98,6 +135,8 @@ TEMPERATURE = 0.2  # 技術的正確性を重視
 GEMINI_MODEL_RAG = "gemini-3-flash-preview"  # RAG用
 GEMINI_MODEL_OCR = "gemini-3-flash-preview"  # OCR用
 GEMINI_MODEL_TRANSCRIPTION = os.getenv("GEMINI_MODEL_TRANSCRIPTION", "gemini-3-flash-preview")  # 音声文字起こし用（WER 3.1%、高速・低コスト）
+# /api/transcribe・/api/meetings/chunk で受け付ける音声の上限（inline_data で送れるリクエストサイズ 20MB に合わせる）
+TRANSCRIBE_MAX_AUDIO_BYTES = int(os.getenv("TRANSCRIBE_MAX_AUDIO_BYTES", str(20 * 1024 * 1024)))
 # Embeddingモデル（環境変数で切替可能）
 # 利用可能なモデル:
 #   models/gemini-embedding-001       - テキスト専用・安定版（デフォルト）
@@ -139,6 +139,11 @@ class LegacyDocument(Base):
     context_sheet_model = Column(String,   nullable=True)  # 使用したモデル名
     context_sheet_at    = Column(DateTime, nullable=True)  # 生成日時
 
+    __table_args__ = (
+        # OCR ステータス一覧（status で絞り込み updated_at 降順）用
+        Index('idx_legacy_documents_status_updated', 'status', 'updated_at'),
+    )
+
 
 class PersonalContext(Base):
     """パーソナルコンテキスト管理テーブル（個人知見・判断基準などを保持）"""
@@ -695,6 +700,8 @@ def _run_migrations():
             created_at          TEXT NOT NULL
         )""",
         """CREATE INDEX IF NOT EXISTS idx_issue_attachments_issue ON issue_attachments(issue_id)""",
+        # OCR ステータス一覧の絞り込み・並び替え用
+        """CREATE INDEX IF NOT EXISTS idx_legacy_documents_status_updated ON legacy_documents(status, updated_at)""",
     ]
     with engine.connect() as conn:
         for sql in migrations:
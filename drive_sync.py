@@ -5,8 +5,10 @@ import io
 import json
 import pickle
 import logging
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timezone
 import sys
 
@@ -99,6 +101,7 @@ def save_credentials_from_code(code: str, redirect_uri: str, state: str = None):
     
     with open(TOKEN_PATH, 'wb') as token:
         pickle.dump(creds, token)
+    invalidate_auth_status_cache()
         
     if state_file.exists():
         state_file.unlink() # Cleanup
@@ -134,6 +137,7 @@ def get_drive_service():
                 # リフレッシュ成功したら保存
                 with open(TOKEN_PATH, 'wb') as token:
                     pickle.dump(creds, token)
+                invalidate_auth_status_cache()
                 logger.info("Google Drive token refreshed successfully")
             except Exception as e:
                 logger.error(f"Token refresh failed: {e}", exc_info=True)
@@ -143,6 +147,7 @@ def get_drive_service():
                     logger.info("Corrupted token.pickle deleted. Re-authentication required.")
                 except Exception as del_e:
                     logger.warning(f"Failed to delete token.pickle: {del_e}")
+                invalidate_auth_status_cache()
                 raise Exception("トークンの更新に失敗しました。再認証が必要です。/api/drive/auth で認証してください。")
         else:
             raise Exception("認証が必要です。/api/drive/auth で認証してください。")
@@ -218,6 +223,34 @@ def get_auth_status() -> Dict[str, Any]:
         }
 
 
+# ヘルスチェックなど高頻度の呼び出し向けに、get_auth_status の結果をプロセス内で TTL キャッシュする
+_AUTH_STATUS_TTL = 60.0
+_auth_status_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+_auth_status_lock = threading.Lock()
+
+
+def invalidate_auth_status_cache() -> None:
+    """認証状態キャッシュを破棄する（トークン保存・更新・削除時に呼ぶ）"""
+    global _auth_status_cache
+    with _auth_status_lock:
+        _auth_status_cache = None
+
+
+def get_auth_status_cached(ttl: float = _AUTH_STATUS_TTL) -> Dict[str, Any]:
+    """get_auth_status() の TTL キャッシュ版（ttl 秒以内は前回の結果を返す）"""
+    global _auth_status_cache
+    cached = _auth_status_cache
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        return dict(cached[1])
+    with _auth_status_lock:
+        cached = _auth_status_cache
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            return dict(cached[1])
+        status = get_auth_status()
+        _auth_status_cache = (time.monotonic(), status)
+    return dict(status)
+
+
 # ========== フォルダ操作 ==========
 
 def create_folder(service, folder_name: str, parent_id: str = None) -> str:
@@ -500,11 +533,9 @@ def _update_file_store_drive_id(local_path: Path, drive_id: str):
     """file_storeにDrive IDを記録（可能な場合）"""
     try:
         import file_store
-        import hashlib
-        # ファイルのチェックサムでfile_store内を検索
-        with open(local_path, 'rb') as f:
-            content = f.read()
-        checksum = hashlib.sha256(content).hexdigest()
+        from utils.file_hash import cached_sha256_file
+        # ファイルのチェックサムでfile_store内を検索（file_store が無ければ import 時点で抜けるので読まない）
+        checksum = cached_sha256_file(local_path)
         file_info = file_store.get_file_by_checksum(checksum)
         if file_info:
             file_store.update_drive_sync(file_info['id'], drive_id)
@@ -514,8 +545,43 @@ def _update_file_store_drive_id(local_path: Path, drive_id: str):
         logger.debug(f"file_store integration skipped: {e}")
 
 
+# アップロード同期の多重起動防止: 実行中に来た要求は 1 回分の再実行フラグにまとめる
+_upload_sync_lock = threading.Lock()
+_upload_sync_running = False
+_upload_sync_pending = False
+
+
 def sync_upload_to_drive(target_folder_name: str = GOOGLE_DRIVE_FOLDER_NAME):
-    """ローカルのナレッジベースをGoogle Driveに同期（アップロード）"""
+    """ローカルのナレッジベースをGoogle Driveに同期（アップロード）
+
+    同期中に再度呼ばれた場合は走査を重ねて実行せず、現在の同期の終了後に 1 回だけ再実行する
+    （連続アップロード時に同じディレクトリ走査・Drive API 呼び出しが N 回走るのを防ぐ）。
+    """
+    global _upload_sync_running, _upload_sync_pending
+    with _upload_sync_lock:
+        if _upload_sync_running:
+            _upload_sync_pending = True
+            logger.info(f"同期（アップロード）実行中のため後続に統合: {target_folder_name}")
+            return {"status": "coalesced", "folder": target_folder_name}
+        _upload_sync_running = True
+
+    try:
+        while True:
+            result = _sync_upload_once(target_folder_name)
+            with _upload_sync_lock:
+                if not _upload_sync_pending:
+                    _upload_sync_running = False
+                    return result
+                _upload_sync_pending = False
+    except BaseException:
+        with _upload_sync_lock:
+            _upload_sync_running = False
+            _upload_sync_pending = False
+        raise
+
+
+def _sync_upload_once(target_folder_name: str):
+    """sync_upload_to_drive の 1 回分の同期処理"""
     service = get_drive_service()
     logger.info(f"同期（アップロード）開始: {target_folder_name}")
     
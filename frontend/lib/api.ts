@@ -19,6 +19,7 @@ export interface WebSource {
 }
 
 export type StreamUpdate =
+    | { type: 'status'; data: 'searching' | 'reranking' }
     | { type: 'sources'; data: SourceFile[] }
     | { type: 'web_sources'; data: WebSource[] }
     | { type: 'answer'; data: string }
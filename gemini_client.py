@@ -5,9 +5,17 @@ from threading import Lock
 _client = None
 _client_lock = Lock()
 
+# APIキーごとのクライアント（mindmap 等、Web設定のキーを使う経路用）。
+# genai.Client は内部に HTTP 接続プールを持つため、使い回すことで TLS ハンドシェイクを毎回払わずに済む
+_keyed_clients = {}
+_KEYED_CLIENTS_MAX = 4
+
 
 def get_client() -> genai.Client:
     global _client
+    client = _client
+    if client is not None:
+        return client
     if not GEMINI_API_KEY:
         raise ValueError("GEMINI_API_KEY is not set in environment variables or config.")
     with _client_lock:
@@ -16,8 +24,23 @@ def get_client() -> genai.Client:
         return _client
 
 
+def get_client_for_key(api_key: str) -> genai.Client:
+    """指定 APIキーのクライアントを返す（キーごとに 1 度だけ生成して再利用）"""
+    client = _keyed_clients.get(api_key)
+    if client is not None:
+        return client
+    with _client_lock:
+        client = _keyed_clients.get(api_key)
+        if client is None:
+            if len(_keyed_clients) >= _KEYED_CLIENTS_MAX:
+                _keyed_clients.clear()
+            client = _keyed_clients[api_key] = genai.Client(api_key=api_key)
+        return client
+
+
 def reconfigure(api_key: str):
     """APIキー更新時にクライアントを再生成"""
     global _client
     with _client_lock:
         _client = genai.Client(api_key=api_key)
+        _keyed_clients.clear()
@@ -8,10 +8,13 @@ import os
 import json
 import logging
 import hashlib
+import threading
+import time
 import uuid
+import concurrent.futures
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
 import fitz  # PyMuPDF
 from docx import Document
@@ -41,6 +44,7 @@ from config import (
 from dense_indexer import get_chroma_client, _make_embed_config
 from gemini_client import get_client
 from utils.retry import sync_retry
+from utils.file_hash import sha256_file as _sha256_file
 
 # ─── チャンクサイズ設定（doc_type 別） ──────────────────────────────────────────
 # 小チャンク（ChromaDB に登録する検索用チャンク）
@@ -107,9 +111,115 @@ def get_query_embedding(text: str) -> List[float]:
     return result.embeddings[0].values
 
 
+def get_query_embeddings_batch(texts: List[str]) -> List[List[float]]:
+    """複数の検索クエリの Embedding をまとめて取得（入力と同順）
+
+    同時に実行中の他の検索（別リクエスト）の要求とも QUERY_EMBED_BATCH_WINDOW_MS の時間窓で
+    相乗りし、1 回の API 呼び出しで取得する。
+    """
+    if not texts:
+        return []
+    from config import QUERY_EMBED_BATCH_WINDOW_MS
+    if QUERY_EMBED_BATCH_WINDOW_MS <= 0:
+        return _embed_query_texts(list(texts))
+    return _query_embed_batcher.embed(list(texts))
+
+
+def _embed_query_texts(texts: List[str]) -> List[List[float]]:
+    """検索クエリの Embedding を 1 回の API 呼び出しで取得（入力と同順）"""
+    client = get_client()
+    result = _call_embed_content(
+        client,
+        model=EMBEDDING_MODEL,
+        contents=list(texts),
+        config=_make_embed_config("retrieval_query")
+    )
+    embeddings = [emb.values for emb in result.embeddings]
+    if len(embeddings) != len(texts):
+        raise ValueError(
+            f"Embedding count mismatch: requested {len(texts)}, got {len(embeddings)}"
+        )
+    return embeddings
+
+
+class _QueryEmbedBatcher:
+    """検索クエリの Embedding 要求を短い時間窓で集めて一括取得する
+
+    最初に来たスレッドがリーダーとなって時間窓だけ待ち、その間に積まれた要求をまとめて
+    _embed_query_texts に渡す。他のスレッドは自分の Future の結果を待つだけ。
+    まとめた呼び出しが失敗した場合は、1 件の不正な入力で他のリクエストまで失敗しないよう要求ごとに取り直す。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[List[str], concurrent.futures.Future]] = []
+        self._leader_active = False
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        from config import QUERY_EMBED_BATCH_WINDOW_MS
+
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+        with self._lock:
+            self._pending.append((texts, fut))
+            lead = not self._leader_active
+            self._leader_active = True
+        if lead:
+            time.sleep(QUERY_EMBED_BATCH_WINDOW_MS / 1000)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._leader_active = False
+            self._run(batch)
+        return fut.result()
+
+    @staticmethod
+    def _run(batch: List[Tuple[List[str], concurrent.futures.Future]]) -> None:
+        from config import QUERY_EMBED_BATCH_MAX
+
+        # API の件数上限を超えないよう、要求単位で区切って呼び出す
+        groups: List[List[Tuple[List[str], concurrent.futures.Future]]] = [[]]
+        count = 0
+        for item in batch:
+            if groups[-1] and count + len(item[0]) > QUERY_EMBED_BATCH_MAX:
+                groups.append([])
+                count = 0
+            groups[-1].append(item)
+            count += len(item[0])
+
+        for group in groups:
+            try:
+                embeddings = _embed_query_texts([t for texts, _ in group for t in texts])
+            except Exception as e:
+                if len(group) == 1:
+                    group[0][1].set_exception(e)
+                    continue
+                logger.warning(f"Batched query embedding failed ({len(group)} requests), retrying individually: {e}")
+                for texts, fut in group:
+                    try:
+                        fut.set_result(_embed_query_texts(texts))
+                    except Exception as inner:
+                        fut.set_exception(inner)
+                continue
+            offset = 0
+            for texts, fut in group:
+                fut.set_result(embeddings[offset:offset + len(texts)])
+                offset += len(texts)
+
+
+_query_embed_batcher = _QueryEmbedBatcher()
+
+
 # (GeminiEmbeddingFunction and get_query_embedding remain for backward compatibility if needed, 
 # but DenseIndexer is preferred for new code)
 
+# ─── 検索側キャッシュ連携 ───────────────────────────────────────────────────────
+def _invalidate_search_cache():
+    """retriever の「DB 非空」キャッシュと /api/chat の回答キャッシュを破棄（削除・再構築後）"""
+    from retriever import invalidate_db_cache
+    import chat_cache
+    invalidate_db_cache()
+    chat_cache.invalidate()
+
+
 # ─── doc_type 自動判定 (classifier.py に移行済み。互換性のためのラッパー) ──────────
 def _infer_doc_type(category: str, filename: str) -> str:
     """カテゴリとファイル名から doc_type を推定 (DocumentClassifierに委譲)"""
@@ -137,6 +247,24 @@ def _should_exclude(path: Path, base_path: Path) -> bool:
     return False
 
 
+def iter_md_files(base_dir: Path = MD_DIR) -> Iterator[Path]:
+    """インデックス対象の .md ファイルを 1 件ずつ返す（除外ルール適用済み・リストを作らない）"""
+    base_path = Path(base_dir)
+    for filepath in base_path.rglob("*.md"):
+        if filepath.is_dir():
+            continue
+        if _should_exclude(filepath, base_path):
+            continue
+        yield filepath
+
+
+def count_md_files(base_dir: Path = MD_DIR) -> int:
+    """インデックス対象の .md ファイル数（stat やメタデータ辞書の構築をせずに数える）"""
+    if not Path(base_dir).exists():
+        return 0
+    return sum(1 for _ in iter_md_files(base_dir))
+
+
 def scan_files(base_dir: Path = MD_DIR) -> List[Dict[str, Any]]:
     """MD_DIR フォルダを再帰スキャンしてファイルメタデータを収集"""
     files = []
@@ -146,12 +274,7 @@ def scan_files(base_dir: Path = MD_DIR) -> List[Dict[str, Any]]:
         return files
 
     raw_files = []
-    for filepath in base_path.rglob("*.md"):
-        if filepath.is_dir():
-            continue
-        if _should_exclude(filepath, base_path):
-            continue
-
+    for filepath in iter_md_files(base_path):
         rel_path = filepath.relative_to(base_path)
         parts = rel_path.parts
         category = parts[0] if len(parts) > 1 else ""
@@ -363,6 +486,27 @@ def load_parent_chunk(parent_chunk_id: str) -> Optional[str]:
     return None
 
 
+def load_parent_chunks_batch(parent_chunk_ids: List[str]) -> Dict[str, str]:
+    """複数の parent_chunk_id をまとめて読み込み {parent_chunk_id: text} を返す
+    同じ親を共有するヒットは 1 回だけ読む。存在しない / 不正な ID は結果に含めない。
+    """
+    parents: Dict[str, str] = {}
+    base_dir = Path(PARENT_CHUNKS_DIR)
+    for parent_chunk_id in dict.fromkeys(pid for pid in parent_chunk_ids if pid):
+        parts = parent_chunk_id.split("/", 1)
+        if len(parts) != 2:
+            continue
+        pdf_hash, pid = parts
+        try:
+            # exists() を挟まず直接開く（stat 1 回分の削減）
+            parents[parent_chunk_id] = (base_dir / pdf_hash / f"{pid}.md").read_text(encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.warning(f"Failed to load parent_chunk ({parent_chunk_id}): {e}")
+    return parents
+
+
 def chunk_for_indexing(
     text: str,
     page_number: Optional[int],
@@ -613,6 +757,8 @@ def process_and_index_file(
     # 完了更新
     _upsert_doc_index(rel_path, {**file_info, **source_metadata}, len(chunks)) # Legacy DB Sync
     repo.mark_as_searchable(rel_path)
+    # アップロード・OCR 完了経路（ingestion_orchestrator）からも直接呼ばれるため、ここで回答キャッシュを破棄する
+    _invalidate_search_cache()
     
     stats["indexed"] += 1
     stats["chunks"] += len(chunks)
@@ -657,6 +803,7 @@ def build_index(force_rebuild: bool = False) -> Dict[str, int]:
             logger.error(f"インデックスエラー ({rel_path}): {e}", exc_info=True)
             stats["errors"] += 1
 
+    _invalidate_search_cache()
     logger.info(f"インデックス完了: {stats['indexed']}ファイル, {stats['chunks']}チャンク")
     return stats
 
@@ -706,29 +853,19 @@ def reindex_from_pdfs(progress_interval: int = 10) -> Dict[str, Any]:
             logger.error(f"  エラー ({pdf_name}): {e}", exc_info=True)
             stats["errors"] += 1
 
+    _invalidate_search_cache()
     logger.info(f"再インデックス完了: {stats}")
     return stats
 
 
 # ─── 単一ファイルインデックス (外部API用) ────────────────────────────────────────
-def index_file(filepath: str) -> Dict[str, Any]:
-    """単一ファイルをインデックスに追加・更新"""
-    path = Path(filepath)
-    if not path.exists():
-        return {"error": "File not found"}
-
-    from config import KNOWLEDGE_BASE_DIR as _KB_DIR, EXCLUDE_FOLDERS, SUPPORTED_EXTENSIONS
-
-    base_path = Path(_KB_DIR)
-    try:
-        rel_path = path.relative_to(base_path)
-    except ValueError:
-        return {"error": f"File is outside knowledge base dir: {path}"}
-
+def _file_info_for_index(path: Path, base_path: Path) -> Dict[str, Any]:
+    """index_file / index_files 用のファイル情報を組み立てる（KB 外なら ValueError）"""
+    rel_path = path.relative_to(base_path)
     parts = rel_path.parts
     category = parts[0] if len(parts) > 1 else ""
-
-    file_info = {
+    st = path.stat()
+    return {
         "filename":       path.name,
         "full_path":      str(path),
         "rel_path":       str(rel_path),
@@ -736,11 +873,26 @@ def index_file(filepath: str) -> Dict[str, Any]:
         "subcategory":    parts[1] if len(parts) > 2 else "",
         "sub_subcategory": parts[2] if len(parts) > 3 else "",
         "file_type":      path.suffix.lower().lstrip("."),
-        "file_size_kb":   round(path.stat().st_size / 1024, 2),
-        "modified_at":    datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc).isoformat(),
+        "file_size_kb":   round(st.st_size / 1024, 2),
+        "modified_at":    datetime.fromtimestamp(st.st_mtime, tz=timezone.utc).isoformat(),
         "doc_type":       _infer_doc_type(category, path.name),
     }
 
+
+def index_file(filepath: str) -> Dict[str, Any]:
+    """単一ファイルをインデックスに追加・更新"""
+    path = Path(filepath)
+    if not path.exists():
+        return {"error": "File not found"}
+
+    from config import KNOWLEDGE_BASE_DIR as _KB_DIR
+
+    try:
+        file_info = _file_info_for_index(path, Path(_KB_DIR))
+    except ValueError:
+        return {"error": f"File is outside knowledge base dir: {path}"}
+    rel_path = file_info["rel_path"]
+
     client = get_chroma_client()
     embedding_function = GeminiEmbeddingFunction()
     collection = client.get_or_create_collection(
@@ -760,11 +912,56 @@ def index_file(filepath: str) -> Dict[str, Any]:
         logger.info(f"単一ファイルインデックス完了: {stats['chunks']}チャンク ({path.name})")
     except Exception as e:
         logger.error(f"インデックスエラー ({path.name}): {e}", exc_info=True)
+        # 既存チャンクは削除済みなので、失敗時もキャッシュ済みの回答は使わない
+        _invalidate_search_cache()
         return {"error": str(e)}
 
     return stats
 
 
+def index_files(filepaths: List[str]) -> Dict[str, Any]:
+    """複数ファイルをまとめてインデックスに追加・更新
+
+    コレクション取得と既存チャンクの削除をバッチ全体で 1 回にまとめる。
+    1 ファイルの失敗は errors に数えて残りの処理を続ける。
+    """
+    from config import KNOWLEDGE_BASE_DIR as _KB_DIR
+
+    base_path = Path(_KB_DIR)
+    stats = {"chunks": 0, "indexed": 0, "skipped": 0, "errors": 0}
+    infos = []
+    for filepath in filepaths:
+        path = Path(filepath)
+        try:
+            infos.append(_file_info_for_index(path, base_path))
+        except (OSError, ValueError) as e:
+            logger.warning(f"インデックス対象外 ({filepath}): {e}")
+            stats["errors"] += 1
+    if not infos:
+        return stats
+
+    collection = get_chroma_client().get_or_create_collection(
+        name=COLLECTION_NAME,
+        embedding_function=GeminiEmbeddingFunction(),
+    )
+    rel_paths = [info["rel_path"] for info in infos]
+    try:
+        collection.delete(where={"rel_path": {"$in": rel_paths}})
+    except Exception as e:
+        logger.warning(f"既存インデックス削除エラー (無視可能) ({len(rel_paths)}件): {e}")
+
+    for info in infos:
+        try:
+            process_and_index_file(info, stats)
+        except Exception as e:
+            logger.error(f"インデックスエラー ({info['filename']}): {e}", exc_info=True)
+            stats["errors"] += 1
+
+    _invalidate_search_cache()
+    logger.info(f"一括インデックス完了: {stats['indexed']}/{len(filepaths)}ファイル, {stats['chunks']}チャンク")
+    return stats
+
+
 def delete_from_index(rel_path: str) -> bool:
     """インデックスからファイルを削除"""
     try:
@@ -773,6 +970,7 @@ def delete_from_index(rel_path: str) -> bool:
         collection.delete(where={"rel_path": rel_path})
     except Exception as e:
         logger.error(f"ChromaDB削除エラー ({rel_path}): {e}", exc_info=True)
+    _invalidate_search_cache()
 
     try:
         result = _delete_doc_index(rel_path)
@@ -783,7 +981,7 @@ def delete_from_index(rel_path: str) -> bool:
         return False
 
 
-def delete_file_completely(file_path: str) -> dict:
+def delete_file_completely(file_path: str, collection=None) -> dict:
     """
     ファイルに紐づく全データを完全削除する。
     - ChromaDB チャンク（rel_path & source_pdf_hash の両方で削除）
@@ -795,13 +993,13 @@ def delete_file_completely(file_path: str) -> dict:
 
     Args:
         file_path: knowledge_base からの相対パス（例: "06_設計/hoge.pdf"）
+        collection: 取得済みの ChromaDB コレクション（一括削除時に使い回す。省略時は都度取得）
 
     Returns:
         dict: 削除結果サマリー
     """
     from pathlib import Path
     from config import KNOWLEDGE_BASE_DIR, PARENT_CHUNKS_DIR, PDF_STORAGE_DIR, COLLECTION_NAME
-    import hashlib
 
     results: Dict[str, Any] = {
         "chroma_chunks": 0,
@@ -817,11 +1015,14 @@ def delete_file_completely(file_path: str) -> dict:
     # PDF/MDどちらのパスが来ても両方を対象にする
     pdf_path = abs_path.with_suffix(".pdf") if abs_path.suffix.lower() == ".md" else abs_path
     md_path  = abs_path.with_suffix(".md")  if abs_path.suffix.lower() == ".pdf" else abs_path
+    # 存在確認は一度だけ行い、以降のステップで使い回す
+    pdf_exists = pdf_path.exists()
 
     # --- 1. ChromaDB: rel_path で削除 ---
     try:
-        client = get_chroma_client()
-        col = client.get_or_create_collection(name=COLLECTION_NAME)
+        col = collection
+        if col is None:
+            col = get_chroma_client().get_or_create_collection(name=COLLECTION_NAME)
 
         # MDのrel_pathで削除（インデックスはMDで登録）
         md_rel = str(md_path.relative_to(Path(KNOWLEDGE_BASE_DIR)))
@@ -836,9 +1037,8 @@ def delete_file_completely(file_path: str) -> dict:
 
     # --- 2. ChromaDB: source_pdf_hash で削除（漏れチャンク対策） ---
     try:
-        if pdf_path.exists():
-            with open(pdf_path, "rb") as f:
-                pdf_hash = hashlib.sha256(f.read()).hexdigest()
+        if pdf_exists:
+            pdf_hash = _sha256_file(pdf_path)
             existing = col.get(where={"source_pdf_hash": pdf_hash}, include=[])
             if existing["ids"]:
                 col.delete(ids=existing["ids"])
@@ -847,23 +1047,27 @@ def delete_file_completely(file_path: str) -> dict:
     except Exception as e:
         results["errors"].append(f"ChromaDB hash削除エラー: {e}")
         logger.warning(f"[Delete] ChromaDB hash削除エラー（続行）: {e}")
+    if results["chroma_chunks"]:
+        _invalidate_search_cache()
 
     # --- 3. parent_chunks JSON 削除 ---
     try:
         parent_dir = Path(PARENT_CHUNKS_DIR)
         if parent_dir.exists():
             # source_pdf_hash に基づくJSONを検索・削除
-            if pdf_path.exists():
-                deleted = 0
-                for json_file in parent_dir.glob(f"{pdf_hash[:16]}*.json"):
-                    json_file.unlink()
-                    deleted += 1
-                # ファイル名ベースでも検索（ハッシュが取れない場合のフォールバック）
+            if pdf_exists:
+                # ハッシュ名・ファイル名ベース（ハッシュが取れない場合のフォールバック）の両方を対象に、
+                # 重複を除いてから存在確認なしで unlink する（消えていれば FileNotFoundError で飛ばす）
                 stem = pdf_path.stem
-                for json_file in parent_dir.glob(f"*{stem}*.json"):
-                    if json_file.exists():
-                        json_file.unlink()
+                targets = dict.fromkeys(parent_dir.glob(f"{pdf_hash[:16]}*.json"))
+                targets.update(dict.fromkeys(parent_dir.glob(f"*{stem}*.json")))
+                deleted = 0
+                for json_file in targets:
+                    try:
+                        os.unlink(json_file)
                         deleted += 1
+                    except FileNotFoundError:
+                        pass
                 results["parent_chunks"] = deleted
                 if deleted:
                     logger.info(f"[Delete] parent_chunks JSON削除: {deleted}件")
@@ -873,13 +1077,15 @@ def delete_file_completely(file_path: str) -> dict:
 
     # --- 4. data/pdfs/ のハッシュ名PDF削除 ---
     try:
-        if pdf_path.exists():
+        if pdf_exists:
             pdf_storage_dir = Path(PDF_STORAGE_DIR)
             hash_pdf = pdf_storage_dir / f"{pdf_hash}{pdf_path.suffix}"
-            if hash_pdf.exists():
-                hash_pdf.unlink()
+            try:
+                os.unlink(hash_pdf)
                 results["pdf_storage"] = True
                 logger.info(f"[Delete] data/pdfs/ ハッシュPDF削除: {hash_pdf.name}")
+            except FileNotFoundError:
+                pass
     except Exception as e:
         results["errors"].append(f"data/pdfs/削除エラー: {e}")
         logger.warning(f"[Delete] data/pdfs/削除エラー（続行）: {e}")
@@ -910,15 +1116,17 @@ def delete_file_completely(file_path: str) -> dict:
         logger.warning(f"[Delete] Status cleanup error: {e}")
 
     # --- 8. 物理ファイル削除（knowledge_base内） ---
-    for target in [pdf_path, md_path]:
-        if target.exists():
-            try:
-                target.unlink()
-                results["physical_files"].append(target.name)
-                logger.info(f"[Delete] 物理ファイル削除: {target}")
-            except Exception as e:
-                results["errors"].append(f"物理ファイル削除エラー ({target.name}): {e}")
-                logger.error(f"[Delete] 物理ファイル削除エラー: {target}: {e}")
+    # exists() で確認してから消すのではなく直接 unlink する（.txt 等は pdf_path == md_path なので重複を除く）
+    for target in dict.fromkeys([pdf_path, md_path]):
+        try:
+            os.unlink(target)
+            results["physical_files"].append(target.name)
+            logger.info(f"[Delete] 物理ファイル削除: {target}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            results["errors"].append(f"物理ファイル削除エラー ({target.name}): {e}")
+            logger.error(f"[Delete] 物理ファイル削除エラー: {target}: {e}")
 
     logger.info(
         f"[Delete] 完全削除完了: {file_path} | "
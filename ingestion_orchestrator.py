@@ -1,5 +1,5 @@
 import logging
-import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Any
 
@@ -11,9 +11,24 @@ from visual_indexer import index_visual_file
 from audio_indexer import index_audio_file
 from video_indexer import index_video_file
 from mixed_indexer import index_mixed_file
+from config import INGEST_MAX_WORKERS
 
 logger = logging.getLogger(__name__)
 
+# アップロードごとにスレッドを立てると、同時アップロード数だけ OCR・Gemini 呼び出しが並走して
+# API ワーカーの CPU とクォータを食い潰すため、上限付きのキューに積んで順に処理する
+_ingest_executor = ThreadPoolExecutor(max_workers=INGEST_MAX_WORKERS, thread_name_prefix="ingest")
+
+
+def shutdown_ingest_executor() -> None:
+    """サーバー停止時に呼ぶ。キューで待っているジョブは取り消し、実行中のジョブの完了も待たない
+
+    ThreadPoolExecutor のワーカーはデーモンではないため、取り消さないと終了時に全ジョブの完了を待ってしまう。
+    取り消したジョブの版は、次回起動時の lifespan で failed にリセットされる。
+    """
+    _ingest_executor.shutdown(wait=False, cancel_futures=True)
+
+
 class IngestionOrchestrator:
     """
     Phase 3: ファイルの処理パイプラインの進行を管理するオーケストレーター
@@ -46,36 +61,16 @@ class IngestionOrchestrator:
 
         # モダリティに応じたパイプラインへルーティング
         if source_kind == "audio":
-            threading.Thread(
-                target=self._run_audio_stage,
-                args=(version_id, file_path, source_pdf_hash, project_id),
-                daemon=True,
-            ).start()
+            _ingest_executor.submit(self._run_audio_stage, version_id, file_path, source_pdf_hash, project_id)
         elif source_kind == "video":
-            threading.Thread(
-                target=self._run_video_stage,
-                args=(version_id, file_path, source_pdf_hash),
-                daemon=True,
-            ).start()
+            _ingest_executor.submit(self._run_video_stage, version_id, file_path, source_pdf_hash)
         elif doc_type == "drawing":
-            threading.Thread(
-                target=self._run_visual_stage,
-                args=(version_id, file_path, source_pdf_hash),
-                daemon=True,
-            ).start()
+            _ingest_executor.submit(self._run_visual_stage, version_id, file_path, source_pdf_hash)
         elif doc_type == "mixed":
-            threading.Thread(
-                target=self._run_mixed_stage,
-                args=(version_id, file_path, source_pdf_hash),
-                daemon=True,
-            ).start()
+            _ingest_executor.submit(self._run_mixed_stage, version_id, file_path, source_pdf_hash)
         else:
             # 既存テキストパイプライン（Document）
-            threading.Thread(
-                target=self._run_ocr_stage,
-                args=(version_id, file_path, source_pdf_hash, source_kind, doc_type),
-                daemon=True,
-            ).start()
+            _ingest_executor.submit(self._run_ocr_stage, version_id, file_path, source_pdf_hash, source_kind, doc_type)
 
     def _run_visual_stage(self, version_id: str, file_path: str, source_pdf_hash: str):
         """Drawing ファイルをビジュアルベクトルとしてインデックスする。"""
@@ -1,13 +1,13 @@
 import os
 import json
 import logging
-import shutil
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, Any
 
 from classifier import DocumentClassifier
 from metadata_repository import MetadataRepository
+from utils.fs import move_replace
 from config import KNOWLEDGE_BASE_DIR, UNCATEGORIZED_FOLDER, ENABLE_AUTO_CATEGORIZE, PDF_STORAGE_DIR, PDF_STORAGE_MODE
 
 logger = logging.getLogger(__name__)
@@ -98,10 +98,8 @@ class MetadataEnricher:
             
             drive_file_id = None
             if new_pdf_path.resolve() != Path(filepath).resolve():
-                if new_pdf_path.exists():
-                    new_pdf_path.unlink()
                 if Path(filepath).exists():
-                    shutil.move(str(filepath), str(new_pdf_path))
+                    move_replace(filepath, new_pdf_path)
                     logger.info(f"[MetadataEnricher] Moved source PDF to {new_pdf_path}")
                 else:
                     logger.warning(f"[MetadataEnricher] Original file {filepath} not found for moving.")
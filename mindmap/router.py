@@ -1013,8 +1013,6 @@ async def upload_and_analyze(files: List[UploadFile] = File(...)):
 async def _analyze_with_gemini(file_contents: List[Dict[str, str]]) -> dict:
     """ファイル内容をGemini APIで分析し、マインドマップ構造を返す共通ロジック"""
     import json
-    from functools import lru_cache
-    from google import genai as _genai
     from google.genai import types as _types
 
     # Web設定からAPIキーとモデルを取得
@@ -1024,12 +1022,9 @@ async def _analyze_with_gemini(file_contents: List[Dict[str, str]]) -> dict:
     if not api_key:
         raise HTTPException(status_code=400, detail="APIキーが設定されていません。設定画面からGemini APIキーを入力してください。")
 
-    # APIキー・リクエストごとの新規インスタンス生成を回避（LRUキャッシュでキーごとに1度だけ作成）
-    @lru_cache(maxsize=4)
-    def _get_cached_client(key: str) -> "_genai.Client":
-        return _genai.Client(api_key=key)
-
-    _client = _get_cached_client(api_key)
+    # APIキー・リクエストごとの新規インスタンス生成を回避（キーごとに1度だけ作成）
+    from gemini_client import get_client_for_key
+    _client = get_client_for_key(api_key)
     files_text = ""
     for fc in file_contents:
         files_text += f"\n--- File: {fc['name']} ---\n{fc['content'][:5000]}\n"
@@ -1188,7 +1183,6 @@ async def _analyze_with_gemini(file_contents: List[Dict[str, str]]) -> dict:
 async def learn_rules(request: dict):
     """オリジナルと編集後のマインドマップを比較し、分析ルールを学習・保存する"""
     import json
-    from google import genai as _genai
     from config import GEMINI_API_KEY, PREVIEW_MODEL
 
     original_nodes = request.get("original_nodes", [])
@@ -1202,7 +1196,8 @@ async def learn_rules(request: dict):
     if not GEMINI_API_KEY:
         raise HTTPException(status_code=500, detail="GEMINI_API_KEY not configured")
 
-    _client = _genai.Client(api_key=GEMINI_API_KEY)
+    from gemini_client import get_client_for_key
+    _client = get_client_for_key(GEMINI_API_KEY)
 
     # 差分を作りやすい形にシリアライズ
     orig_summary = json.dumps(
@@ -1432,7 +1427,6 @@ async def ai_action_endpoint(req: AIActionRequest):
     マインドマップ上のAIアクション（要約・拡張・RAG・調査）を実行する。
     Phase 2: RAGアクションにて統一メタデータ（version_id）を考慮する。
     """
-    from google import genai as _genai
     import json
 
     # 1. Configuration
@@ -1440,7 +1434,8 @@ async def ai_action_endpoint(req: AIActionRequest):
     if not api_key:
         raise HTTPException(status_code=400, detail="API Key not configured")
 
-    _client = _genai.Client(api_key=api_key)
+    from gemini_client import get_client_for_key
+    _client = get_client_for_key(api_key)
     model_name = api_settings.get_analysis_model() or "gemini-2.0-flash"
 
     try:
@@ -697,7 +697,6 @@ def finalize_processing(
         from metadata_repository import MetadataRepository
         repo = MetadataRepository()
         from config import PDF_STORAGE_DIR
-        import shutil
         from pathlib import Path
         import traceback
         import time
@@ -711,9 +710,8 @@ def finalize_processing(
         # 既存コードを大幅に変更せず、二重書きを避けるように調整
         # (ここでは一旦、結合版MDのFrontmatter付与と移動のみを維持)
         if not source_pdf_hash:
-            import hashlib
-            with open(filepath, 'rb') as f:
-                source_pdf_hash = hashlib.sha256(f.read()).hexdigest()
+            from utils.file_hash import cached_sha256_file
+            source_pdf_hash = cached_sha256_file(filepath)
 
         drive_file_id = ""
 
@@ -748,9 +746,8 @@ def finalize_processing(
         # PDFの移動実行
         pdf_moved = False
         if new_pdf_path.resolve() != Path(filepath).resolve():
-            if new_pdf_path.exists():
-                new_pdf_path.unlink()
-            shutil.move(filepath, new_pdf_path)
+            from utils.fs import move_replace
+            move_replace(filepath, new_pdf_path)
             pdf_moved = True
             
         if pdf_moved:
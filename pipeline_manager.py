@@ -1,4 +1,6 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Sequence, Tuple
 import logging
 from content_router import ContentRouter
 from ingestion_orchestrator import IngestionOrchestrator
@@ -72,3 +74,26 @@ def process_file_pipeline(file_path: str, source_pdf_hash: str = "", version_id:
     manager = PipelineManager()
     manager.process_file(Path(file_path), source_pdf_hash, version_id, project_id)
 
+
+# バッチ投入時に同時に分類（Gemini 呼び出し）を行うファイル数
+PIPELINE_BATCH_WORKERS = 4
+
+
+def process_files_pipeline_batch(jobs: Sequence[Tuple[str, str, str]], project_id: str = ""):
+    """
+    複数ファイルをまとめてパイプラインに投入する。jobs は (file_path, source_pdf_hash, version_id) の列。
+
+    PipelineManager（ContentRouter / IngestionOrchestrator）は 1 回だけ生成して使い回し、
+    ファイルごとの分類（Gemini 呼び出し）はスレッドで並列に行う。
+    """
+    jobs: List[Tuple[str, str, str]] = list(jobs)
+    if not jobs:
+        return
+    manager = PipelineManager()
+    if len(jobs) == 1:
+        file_path, source_pdf_hash, version_id = jobs[0]
+        manager.process_file(Path(file_path), source_pdf_hash, version_id, project_id)
+        return
+    with ThreadPoolExecutor(max_workers=min(PIPELINE_BATCH_WORKERS, len(jobs)),
+                            thread_name_prefix="pipeline_batch") as ex:
+        list(ex.map(lambda job: manager.process_file(Path(job[0]), job[1], job[2], project_id), jobs))
@@ -102,18 +102,16 @@ async def embed_research(
 
     # レポートのチャンク格納
     if report_markdown:
-        chunks = _chunk_text(report_markdown)
-        chunk_docs, chunk_ids, chunk_metas = [], [], []
-        completed_at = datetime.now(timezone.utc).isoformat()
-        for i, chunk in enumerate(chunks):
-            chunk_docs.append(chunk)
-            chunk_ids.append(f"{research_id}_report_{i}")
-            chunk_metas.append({
-                "research_id": research_id,
-                "question": question[:200],
-                "domain": "",
-                "completed_at": completed_at,
-            })
+        chunk_docs = _chunk_text(report_markdown)
+        chunk_ids = [f"{research_id}_report_{i}" for i in range(len(chunk_docs))]
+        # チャンク間で共通のメタデータは 1 度だけ組み立ててコピーする
+        base_meta = {
+            "research_id": research_id,
+            "question": question[:200],
+            "domain": "",
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        chunk_metas = [dict(base_meta) for _ in chunk_docs]
         try:
             embeddings = _embed_batch_with_retry(gemini, chunk_docs)
             if embeddings:
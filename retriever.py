@@ -5,11 +5,17 @@
 #                    parent_chunk_id からの親チャンク取得に対応
 
 import os
-import json
+import re
+import time
+import hashlib
 import logging
+import threading
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
-from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -20,24 +26,93 @@ from config import (
     COLLECTION_NAME,
     RERANK_THRESHOLD,
     RERANK_CANDIDATE_COUNT,
+    RERANK_SKIP_SCORE,
+    RERANK_SKIP_MIN_HITS,
+    QUERY_EXPANSION_MIN_CHARS,
+    VECTOR_QUERY_MODE,
+    GEMINI_NEGATIVE_CACHE_TTL_SEC,
 )
-from indexer import GeminiEmbeddingFunction, get_query_embedding, load_parent_chunk
+from indexer import GeminiEmbeddingFunction, get_query_embeddings_batch, load_parent_chunks_batch
 from dense_indexer import get_chroma_client
 from lexical_indexer import LexicalIndexer
 from gemini_client import get_client
 from utils.retry import sync_retry
+from utils import json_codec
 from google.genai import types
 
 
 # ─── Collection ────────────────────────────────────────────────────────────────
+# get_or_create_collection は呼ぶたびにバックエンドへ問い合わせるため、取得したハンドルを使い回す
+_collection = None
+_collection_lock = threading.Lock()
+
+
 def get_collection():
-    """ChromaDB コレクションを取得"""
-    client = get_chroma_client()
-    embedding_function = GeminiEmbeddingFunction()
-    return client.get_or_create_collection(
-        name=COLLECTION_NAME,
-        embedding_function=embedding_function,
-    )
+    """ChromaDB コレクションを取得（初回のみ問い合わせ、以降はキャッシュを返す）"""
+    global _collection
+    col = _collection
+    if col is not None:
+        return col
+    with _collection_lock:
+        if _collection is None:
+            client = get_chroma_client()
+            embedding_function = GeminiEmbeddingFunction()
+            _collection = client.get_or_create_collection(
+                name=COLLECTION_NAME,
+                embedding_function=embedding_function,
+            )
+        return _collection
+
+
+def invalidate_collection_cache():
+    """キャッシュ済みのコレクションハンドルを破棄する（コレクション再作成後に呼ぶ）"""
+    global _collection
+    with _collection_lock:
+        _collection = None
+
+
+# ChromaDB が空でないことを一度確認したらキャッシュし、以降の search() では count() を省略する。
+# インデックス削除・再構築後は indexer から invalidate_db_cache() が呼ばれ、次回に再確認する。
+_db_nonempty = False
+
+
+def invalidate_db_cache():
+    """「ChromaDB が空でない」キャッシュを破棄する"""
+    global _db_nonempty
+    _db_nonempty = False
+
+
+# ─── Gemini 失敗のネガティブキャッシュ ─────────────────────────────────────────
+# 失敗した入力 → 失敗時刻（monotonic）。TTL 内の同一入力は Gemini を呼ばずにフォールバックする
+_negative_cache: Dict[str, float] = {}
+_NEGATIVE_CACHE_MAX_ENTRIES = 1024
+
+
+def _negative_key(kind: str, *parts: str) -> str:
+    digest = hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return f"{kind}:{digest}"
+
+
+def _recently_failed(key: str) -> bool:
+    failed_at = _negative_cache.get(key)
+    if failed_at is None:
+        return False
+    if time.monotonic() - failed_at < GEMINI_NEGATIVE_CACHE_TTL_SEC:
+        return True
+    _negative_cache.pop(key, None)
+    return False
+
+
+def _record_failure(key: str):
+    now = time.monotonic()
+    if len(_negative_cache) >= _NEGATIVE_CACHE_MAX_ENTRIES:
+        # 期限切れを掃除し、それでも溢れる場合は全消去（障害時に無制限に増やさない）
+        for k, failed_at in list(_negative_cache.items()):
+            if now - failed_at >= GEMINI_NEGATIVE_CACHE_TTL_SEC:
+                _negative_cache.pop(k, None)
+        if len(_negative_cache) >= _NEGATIVE_CACHE_MAX_ENTRIES:
+            _negative_cache.clear()
+    _negative_cache[key] = now
 
 
 # ─── クエリ意図分類 + クエリ展開 ────────────────────────────────────────────────
@@ -83,14 +158,34 @@ def _call_gemini_json(prompt: str) -> Dict[str, Any]:
     if text.startswith("```"):
         text = "\n".join(text.split("\n")[1:])
         text = text.rsplit("```", 1)[0]
-    return json.loads(text)
+    return json_codec.loads(text)
+
+
+# 英数字のみの短いキーワード（規格番号・品番など）。展開しても検索精度が上がらない
+_KEYWORD_ONLY_RE = re.compile(r"[A-Za-z0-9_\-./\s]{1,15}")
+
+
+def _is_trivial_query(query: str) -> bool:
+    """クエリ展開する価値のない短い / キーワードのみのクエリか判定"""
+    q = query.strip()
+    return len(q) < QUERY_EXPANSION_MIN_CHARS or bool(_KEYWORD_ONLY_RE.fullmatch(q))
 
 
 def classify_and_expand(query: str) -> Tuple[Optional[str], List[str], str]:
     """
     クエリを分析して (doc_type_filter, expanded_queries, hypothetical_doc) を返す。
-    Gemini 呼び出しに失敗した場合はデフォルト値を返す。
+    短い / キーワードのみのクエリは Gemini を呼ばずにデフォルト値を返す（fast-path）。
+    Gemini 呼び出しに失敗した場合もデフォルト値を返す。
     """
+    if _is_trivial_query(query):
+        logger.info(f"classify_and_expand fast-path (trivial query, {len(query.strip())} chars): {query[:40]}")
+        return None, [query], ""
+
+    neg_key = _negative_key("classify", query)
+    if _recently_failed(neg_key):
+        logger.info("classify_and_expand skipped (recent failure cached), using fallback")
+        return None, [query], ""
+
     try:
         result = _call_gemini_json(query)
         doc_type_filter = result.get("doc_type_filter")
@@ -98,26 +193,58 @@ def classify_and_expand(query: str) -> Tuple[Optional[str], List[str], str]:
         hypo_doc  = result.get("hypothetical_doc", "")
         return doc_type_filter, expanded, hypo_doc
     except Exception as e:
+        _record_failure(neg_key)
         logger.warning(f"classify_and_expand failed, using fallback: {e}")
         return None, [query], ""
 
 
-# ─── 単一クエリ検索 ─────────────────────────────────────────────────────────────
-def _search_single(
-    query_text: str,
+# ─── ベクトル検索（一括クエリ） ─────────────────────────────────────────────────
+# コサイン距離 > 1.0 はコサイン類似度 < 0（ほぼ無関係）なので除外
+_MAX_VECTOR_DISTANCE = 1.0
+
+
+def _average_embedding(embeddings: List[List[float]]) -> List[float]:
+    """各ベクトルを L2 正規化してから平均し、再度正規化した 1 ベクトルを返す"""
+    embs = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embs, axis=1, keepdims=True)
+    embs = embs / np.where(norms > 0, norms, 1.0)
+    avg = embs.mean(axis=0)
+    avg_norm = np.linalg.norm(avg)
+    if avg_norm > 0:
+        avg /= avg_norm
+    return avg.tolist()
+
+
+def _search_vectors(
+    query_texts: List[str],
     collection,
     n: int = TOP_K_RESULTS,
     where: Optional[Dict] = None,
-    use_hyde_embedding: bool = False,
-) -> List[Dict[str, Any]]:
-    """単一クエリでフィルタ付きベクトル検索を実行し、ヒット一覧を返す"""
-    if collection.count() == 0:
+    average: bool = False,
+) -> List[List[Dict[str, Any]]]:
+    """
+    複数クエリの Embedding を一括取得し、ChromaDB に 1 回の query() でまとめて投げる。
+    戻り値はクエリごとのヒット一覧（query_texts と同順）。
+    average=True の場合は Embedding を平均した 1 ベクトルで検索し、ヒット一覧 1 件を返す。
+    """
+    if not query_texts:
         return []
 
-    query_embedding = get_query_embedding(query_text)
+    # 拡張クエリ + HyDE の Embedding を 1 回の API 呼び出しで取得
+    neg_key = _negative_key("embed", *query_texts)
+    if _recently_failed(neg_key):
+        logger.info("Vector search skipped (recent embedding failure cached)")
+        return []
+    try:
+        query_embeddings = get_query_embeddings_batch(query_texts)
+    except Exception:
+        _record_failure(neg_key)
+        raise
+    if average and len(query_embeddings) > 1:
+        query_embeddings = [_average_embedding(query_embeddings)]
 
     kwargs = {
-        "query_embeddings": [query_embedding],
+        "query_embeddings": query_embeddings,
         "n_results": n,
         "include": ["documents", "metadatas", "distances"],
     }
@@ -127,27 +254,28 @@ def _search_single(
     try:
         results = collection.query(**kwargs)
     except Exception as e:
-        logger.warning(f"ChromaDB query failed ({query_text[:40]}…): {e}")
+        logger.warning(f"ChromaDB batched query failed ({len(query_texts)} queries): {e}")
         return []
 
-    hits = []
-    docs = results.get("documents", [[]])[0]
-    metas = results.get("metadatas", [[]])[0]
-    dists = results.get("distances", [[]])[0]
+    docs_per_query = results.get("documents") or []
+    metas_per_query = results.get("metadatas") or []
+    dists_per_query = results.get("distances") or []
 
-    # コサイン距離 > 1.0 はコサイン類似度 < 0（ほぼ無関係）なので除外
-    _MAX_VECTOR_DISTANCE = 1.0
-    for doc, meta, dist in zip(docs, metas, dists):
-        if dist > _MAX_VECTOR_DISTANCE:
-            continue
-        hits.append({
-            "document":  doc,
-            "metadata":  meta,
-            "distance":  dist,
-            "score":     1.0 - dist,  # コサイン距離を類似度スコアに変換
-            "search_type": "vector"
-        })
-    return hits
+    hits_lists = []
+    for docs, metas, dists in zip(docs_per_query, metas_per_query, dists_per_query):
+        hits = []
+        for doc, meta, dist in zip(docs, metas, dists):
+            if dist > _MAX_VECTOR_DISTANCE:
+                continue
+            hits.append({
+                "document":  doc,
+                "metadata":  meta,
+                "distance":  dist,
+                "score":     1.0 - dist,  # コサイン距離を類似度スコアに変換
+                "search_type": "vector"
+            })
+        hits_lists.append(hits)
+    return hits_lists
 
 def _search_lexical(query_text: str, n: int = TOP_K_RESULTS) -> List[Dict[str, Any]]:
     """SQLite FTS5 による全文検索を実行し、ヒット一覧を返す"""
@@ -168,22 +296,74 @@ def _search_lexical(query_text: str, n: int = TOP_K_RESULTS) -> List[Dict[str, A
         return []
 
 
+# リランク入力の上限（UTF-8 バイト数。日本語 1 文字 ≒ 3 バイトで従来の 1000 文字相当）
+_RERANK_TEXT_MAX_BYTES = 3000
+
+
+def _truncate_utf8(text: str, max_bytes: int = _RERANK_TEXT_MAX_BYTES) -> str:
+    """UTF-8 で max_bytes 以内に切り詰める（マルチバイト文字の途中では切らない）"""
+    # 1 文字は 1 バイト以上なので、先頭 max_bytes 文字だけエンコードすれば十分
+    return text[:max_bytes].encode("utf-8")[:max_bytes].decode("utf-8", "ignore")
+
+
+# 複数の検索で重複ヒットしたチャンクへの加点係数（低い方のスコア × 係数を上乗せ）
+_DUP_SCORE_BONUS = 0.05
+
+
 def _merge_hits(hits_list: List[List[Dict[str, Any]]], top_k: int = RERANK_CANDIDATE_COUNT) -> List[Dict[str, Any]]:
-    """複数検索結果をマージし、スコアが高い上位 top_k 件を返す（重複除去）"""
-    dedup: Dict[str, Dict[str, Any]] = {}
+    """複数検索結果をマージし、スコアが高い上位 top_k 件を返す（重複除去）
+
+    重複ヒットは捨てずにスコアを統合する: max(s1, s2) + _DUP_SCORE_BONUS * min(s1, s2)。
+    本文・メタデータはスコアの高い方を採用し、ベクトル検索の個別スコアは
+    "vector_scores" に保持する（後段のリランクで "rerank_score" が別途付与される）。
+    重複除去は 1 パスで行い、上位 top_k の選択は NumPy の argpartition（O(M)）で
+    部分ソートしてから、選ばれた top_k 件だけをスコア降順に並べる。
+    """
+    merged: List[Dict[str, Any]] = []
+    index_by_key: Dict[str, int] = {}
     for hits in hits_list:
         for hit in hits:
             # chunk_id があればそれ、なければ rel_path + chunk_index でユニーク化
             meta = hit.get("metadata") or {}
             chunk_id = hit.get("chunk_id") or meta.get("chunk_id")
             if not chunk_id:
-                key = (meta.get("rel_path", ""), meta.get("chunk_index", 0))
-                chunk_id = f"{key[0]}::{key[1]}"
-            
-            if chunk_id not in dedup or hit["score"] > dedup[chunk_id]["score"]:
-                dedup[chunk_id] = hit
-    sorted_hits = sorted(dedup.values(), key=lambda x: x["score"], reverse=True)
-    return sorted_hits[:top_k]
+                chunk_id = f"{meta.get('rel_path', '')}::{meta.get('chunk_index', 0)}"
+
+            score = hit["score"]
+            idx = index_by_key.get(chunk_id)
+            if idx is None:
+                entry = dict(hit)
+                entry["vector_scores"] = []
+                index_by_key[chunk_id] = len(merged)
+                merged.append(entry)
+            else:
+                entry = merged[idx]
+                prev_score = entry["score"]
+                if score > prev_score:
+                    # 本文・メタデータ・search_type はスコアの高いヒット側を採用
+                    vector_scores = entry["vector_scores"]
+                    entry = merged[idx] = dict(hit)
+                    entry["vector_scores"] = vector_scores
+                entry["score"] = max(prev_score, score) + _DUP_SCORE_BONUS * min(prev_score, score)
+
+            if hit.get("search_type") == "vector":
+                entry["vector_scores"].append(score)
+
+    if not merged or top_k <= 0:
+        return []
+
+    scores = np.fromiter((h["score"] for h in merged), dtype=np.float64, count=len(merged))
+    if top_k < len(merged):
+        top_idx = np.argpartition(-scores, top_k)[:top_k]
+    else:
+        top_idx = np.arange(len(merged))
+    top_idx = top_idx[np.argsort(-scores[top_idx], kind="stable")]
+
+    top_hits = [merged[i] for i in top_idx]
+    # リランク入力を候補ごとに 1 回だけ作っておく
+    for hit in top_hits:
+        hit["rerank_text"] = _truncate_utf8(hit.get("document") or "")
+    return top_hits
 
 
 # ─── Gemini リランク ─────────────────────────────────────────────────────────────
@@ -198,11 +378,12 @@ _RERANK_PROMPT = """以下のコンテキストはユーザーの質問に対し
 
 @sync_retry(max_retries=2, base_wait=1.0)
 def _rerank_single(query: str, context: str) -> float:
+    """context は呼び出し側で切り詰め済み（hit["rerank_text"]）のものを渡す"""
     client = get_client()
     from config import GEMINI_MODEL_RAG
     response = client.models.generate_content(
         model=GEMINI_MODEL_RAG,
-        contents=[_RERANK_PROMPT.format(query=query, context=context[:1000])],
+        contents=[_RERANK_PROMPT.format(query=query, context=context)],
         config=types.GenerateContentConfig(temperature=0.0, max_output_tokens=8),
     )
     try:
@@ -215,12 +396,16 @@ def rerank_hits(query: str, hits: List[Dict[str, Any]], threshold: float = RERAN
     """Gemini でリランクし、threshold 以上のもの上位8件を返す。
     リランク評価は ThreadPoolExecutor で並列化（1序列ループ→約N倍高速化）。
     """
-    from concurrent.futures import ThreadPoolExecutor, as_completed
 
     def score_hit(hit: Dict[str, Any]):
+        rerank_text = hit.get("rerank_text") or _truncate_utf8(hit["document"])
+        neg_key = _negative_key("rerank", query, rerank_text)
+        if _recently_failed(neg_key):
+            return RERANK_THRESHOLD, hit
         try:
-            return _rerank_single(query, hit["document"]), hit
+            return _rerank_single(query, rerank_text), hit
         except Exception as e:
+            _record_failure(neg_key)
             logger.warning(f"rerank_single failed: {e}")
             return RERANK_THRESHOLD, hit
 
@@ -239,6 +424,18 @@ def rerank_hits(query: str, hits: List[Dict[str, Any]], threshold: float = RERAN
     return scored[:8]
 
 
+def _is_confident_without_rerank(hits: List[Dict[str, Any]]) -> bool:
+    """上位 RERANK_SKIP_MIN_HITS 件がすべて高類似度のベクトルヒットならリランク不要と判定。
+    全文検索ヒットのスコアは BM25 由来でスケールが異なるため判定対象にしない（含まれれば False）。
+    """
+    if len(hits) < RERANK_SKIP_MIN_HITS:
+        return False
+    return all(
+        h.get("search_type") == "vector" and h["score"] >= RERANK_SKIP_SCORE
+        for h in hits[:RERANK_SKIP_MIN_HITS]
+    )
+
+
 # ─── 親チャンク取得 ─────────────────────────────────────────────────────────────
 def _resolve_parent_chunks(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
@@ -246,17 +443,53 @@ def _resolve_parent_chunks(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     LLM 入力用コンテキストに置き換える。
     親チャンクが取得できない場合は元の小チャンクをそのまま使用。
     """
+    pids = [(hit.get("metadata") or {}).get("parent_chunk_id", "") for hit in hits]
+    parents = load_parent_chunks_batch(pids)
+
     resolved = []
-    for hit in hits:
-        meta = hit.get("metadata") or {}
-        pid = meta.get("parent_chunk_id", "")
-        parent_text = load_parent_chunk(pid) if pid else None
+    for hit, pid in zip(hits, pids):
         hit = dict(hit)
-        hit["context_text"] = parent_text if parent_text else hit["document"]
+        hit["context_text"] = parents.get(pid) or hit["document"]
         resolved.append(hit)
     return resolved
 
 
+# ─── ChromaDB where フィルタ ────────────────────────────────────────────────────
+# 期間フィルタ値 → 日数
+_DATE_RANGE_DAYS: Dict[str, int] = {"7d": 7, "1m": 30, "3m": 90}
+
+
+def _build_where_filter(
+    doc_type_filter: Optional[str],
+    filter_category: Optional[str],
+    filter_date_range: Optional[str],
+    filter_tags: Optional[List[str]],
+    tag_match_mode: str = "any",
+) -> Optional[Dict]:
+    """検索条件から ChromaDB の where 条件を構築（条件なしなら None）"""
+    where_conditions = []
+    if doc_type_filter and doc_type_filter not in ("md", "pdf"):
+        where_conditions.append({"doc_type": {"$eq": doc_type_filter}})
+    if filter_category:
+        where_conditions.append({"category": {"$eq": filter_category}})
+    days = _DATE_RANGE_DAYS.get(filter_date_range) if filter_date_range else None
+    if days:
+        start_date_iso = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        where_conditions.append({"modified_at": {"$gte": start_date_iso}})
+    if filter_tags:
+        tag_conds = [{"tags_str": {"$contains": t}} for t in filter_tags]
+        if tag_match_mode == "all":
+            where_conditions.extend(tag_conds)
+        else:
+            where_conditions.append({"$or": tag_conds} if len(tag_conds) > 1 else tag_conds[0])
+
+    if len(where_conditions) == 1:
+        return where_conditions[0]
+    if len(where_conditions) > 1:
+        return {"$and": where_conditions}
+    return None
+
+
 # ─── メイン検索関数 ─────────────────────────────────────────────────────────────
 def search(
     query: str,
@@ -272,19 +505,25 @@ def search(
     use_hyde: bool = True,
     use_rerank: bool = True,
     use_lexical: bool = True,
+    on_progress: Optional[Callable[[str], None]] = None,
 ) -> Dict[str, Any]:
     """
     v3 ハイブリッド検索:
     1. クエリ意図分類 + クエリ展開 + HyDE 仮説文書生成
-    2. 各展開クエリ + HyDE で ChromaDB を並列検索
+    2. 各展開クエリ + HyDE の平均ベクトルで ChromaDB を 1 回検索（全文検索と並列）
     3. スコアマージ（上位 15 件）
-    4. Gemini リランク（0.5 未満除外 → 上位 5 件）
+    4. Gemini リランク（0.5 未満除外 → 上位 5 件。上位が高類似度なら省略）
     5. parent_chunk_id から親チャンク取得
+
+    on_progress を渡すと、時間のかかる段階に入るたびに段階名（"reranking" など）で呼び出す。
     """
+    global _db_nonempty
     collection = get_collection()
 
-    if collection.count() == 0:
-        return {"documents": [], "metadatas": [], "distances": [], "hits": []}
+    if not _db_nonempty:
+        if collection.count() == 0:
+            return {"documents": [], "metadatas": [], "distances": [], "hits": []}
+        _db_nonempty = True
 
     # ─── Step 1: クエリ意図分類・展開・HyDE ────────────────────────────────────
     doc_type_filter = None
@@ -300,62 +539,43 @@ def search(
     # 後方互換フィルタが明示的に指定された場合は展開で得たフィルタより優先
     effective_doc_type_filter = filter_file_type or doc_type_filter
 
-    # ChromaDB where 条件
-    where: Optional[Dict] = None
-    where_conditions = []
-    if effective_doc_type_filter and effective_doc_type_filter not in ("md", "pdf"):
-        where_conditions.append({"doc_type": {"$eq": effective_doc_type_filter}})
-    if filter_category:
-        where_conditions.append({"category": {"$eq": filter_category}})
-    if filter_date_range:
-        from datetime import datetime, timedelta, timezone
-        now = datetime.now(timezone.utc)
-        delta_map = {"7d": 7, "1m": 30, "3m": 90}
-        days = delta_map.get(filter_date_range)
-        if days:
-            start_date = now - timedelta(days=days)
-            where_conditions.append({"modified_at": {"$gte": start_date.isoformat()}})
-    if filter_tags:
-        tag_conds = [{"tags_str": {"$contains": t}} for t in filter_tags]
-        if tag_match_mode == "all":
-            where_conditions.extend(tag_conds)
-        else:
-            where_conditions.append({"$or": tag_conds} if len(tag_conds) > 1 else tag_conds[0])
-
-    if len(where_conditions) == 1:
-        where = where_conditions[0]
-    elif len(where_conditions) > 1:
-        where = {"$and": where_conditions}
+    # ChromaDB where 条件（リクエストごとに 1 回だけ構築し、一括クエリ全体で共有）
+    where = _build_where_filter(
+        effective_doc_type_filter, filter_category, filter_date_range, filter_tags, tag_match_mode
+    )
 
-    # ─── Step 2: 並列検索（ThreadPoolExecutor で高速化） ─────────────────────
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+    # ─── Step 2: ベクトル一括検索 + 全文検索を並列実行 ─────────────────────
     all_hits_lists = []
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = []
-
-        # 拡張クエリで検索
-        if use_query_expansion:
-            for eq in expanded_queries:
-                futures.append(executor.submit(_search_single, eq, collection, n_results, where))
+    # 拡張クエリ（または元クエリ）+ HyDE 仮説文書を 1 回の ChromaDB query にまとめる
+    # VECTOR_QUERY_MODE="average" では Embedding を平均した 1 ベクトルで検索する
+    vector_queries = list(expanded_queries) if use_query_expansion else [query]
+    if use_hyde and hypo_doc:
+        vector_queries.append(hypo_doc)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        if VECTOR_QUERY_MODE == "average":
+            # 平均ベクトル 1 本で検索するため、マージ候補数ぶんを 1 回で取得する
+            vector_future = executor.submit(
+                _search_vectors, vector_queries, collection,
+                max(n_results, RERANK_CANDIDATE_COUNT), where, True,
+            )
         else:
-            futures.append(executor.submit(_search_single, query, collection, n_results, where))
-
-        # HyDE 検索
-        if use_hyde and hypo_doc:
-            futures.append(executor.submit(_search_single, hypo_doc, collection, n_results, where))
-
-        # Full-Text Search (Lexical)
-        if use_lexical:
-            futures.append(executor.submit(_search_lexical, query, n_results))
+            vector_future = executor.submit(_search_vectors, vector_queries, collection, n_results, where)
+        lexical_future = executor.submit(_search_lexical, query, n_results) if use_lexical else None
 
         failed_count = 0
-        for future in as_completed(futures):
+        try:
+            all_hits_lists.extend(vector_future.result())
+        except Exception as e:
+            failed_count += 1
+            logger.warning(f"Vector search task failed: {e}")
+        if lexical_future is not None:
             try:
-                all_hits_lists.append(future.result())
+                all_hits_lists.append(lexical_future.result())
             except Exception as e:
                 failed_count += 1
-                logger.warning(f"Parallel search task failed: {e}")
+                logger.warning(f"Lexical search task failed: {e}")
 
         if failed_count > 0 and not all_hits_lists:
             logger.error(f"All {failed_count} search tasks failed — returning empty results")
@@ -364,7 +584,13 @@ def search(
     merged_hits = _merge_hits(all_hits_lists, top_k=RERANK_CANDIDATE_COUNT)
 
     # ─── Step 4: Gemini リランク ─────────────────────────────────────────────
-    if use_rerank and merged_hits:
+    if use_rerank and _is_confident_without_rerank(merged_hits):
+        # ベクトル類似度だけで十分に確度が高い → Gemini リランクを省略
+        logger.info(f"Rerank skipped: top-{RERANK_SKIP_MIN_HITS} vector scores >= {RERANK_SKIP_SCORE}")
+        final_hits = merged_hits[:RERANK_SKIP_MIN_HITS]
+    elif use_rerank and merged_hits:
+        if on_progress:
+            on_progress("reranking")
         try:
             final_hits = rerank_hits(query, merged_hits, threshold=RERANK_THRESHOLD)
             if not final_hits:
@@ -511,52 +737,49 @@ def get_source_files(search_results: Dict[str, Any]) -> List[Dict[str, Any]]:
     }
     """
     metadatas = search_results.get("metadatas", [])
-    file_counter: Counter = Counter()
-    file_info_map: Dict[str, Dict] = {}
-    file_pages_map: Dict[str, set] = {}
+    # rel_path → 集計エントリ（初出時にファイル情報を確定し、以降はカウントとページのみ更新）
+    agg: Dict[str, Dict[str, Any]] = {}
 
     for meta in metadatas:
-        meta = meta or {}
+        if not meta:
+            continue
         rel_path = meta.get("rel_path", "")
         if not rel_path:
             continue
-        file_counter[rel_path] += 1
 
-        page_num = meta.get("page_no") or meta.get("page_number")
-        if rel_path not in file_pages_map:
-            file_pages_map[rel_path] = set()
-        if page_num is not None:
-            file_pages_map[rel_path].add(int(page_num))
-
-        if rel_path not in file_info_map:
-            category = meta.get("category", "")
-            doc_type  = meta.get("doc_type", "")
+        entry = agg.get(rel_path)
+        if entry is None:
             # source_pdf: メタデータ値 → rel_path が PDF なら rel_path をフォールバック
+            # .md の場合は空のまま（フロントがカード表示を切り替える）
             source_pdf_meta = meta.get("source_pdf", "")
-            source_pdf_hash = meta.get("source_pdf_hash", "")
-            if not source_pdf_meta:
-                if rel_path.lower().endswith(".pdf"):
-                    source_pdf_meta = rel_path
-                # .md の場合は空のまま（フロントがカード表示を切り替える）
-            file_info_map[rel_path] = {
-                "filename":        meta.get("filename", "不明"),
-                "source_pdf_name": meta.get("source_pdf_name", meta.get("filename", "不明")),
+            if not source_pdf_meta and rel_path.lower().endswith(".pdf"):
+                source_pdf_meta = rel_path
+            filename = meta.get("filename", "不明")
+            tags_str = meta.get("tags_str")
+            entry = agg[rel_path] = {
+                "filename":        filename,
+                "source_pdf_name": meta.get("source_pdf_name", filename),
                 "source_pdf":      source_pdf_meta,
-                "source_pdf_hash": source_pdf_hash,
+                "source_pdf_hash": meta.get("source_pdf_hash", ""),
                 "rel_path":        rel_path,
-                "category":        category,
-                "doc_type":        doc_type,
-                "tags":            meta.get("tags_str", "").split(",") if meta.get("tags_str") else [],
+                "category":        meta.get("category", ""),
+                "doc_type":        meta.get("doc_type", ""),
+                "tags":            tags_str.split(",") if tags_str else [],
+                "hit_count":       0,
+                "pages":           set(),
             }
 
-    source_files = []
-    for i, (rel_path, count) in enumerate(file_counter.most_common()):
-        info = file_info_map[rel_path].copy()
+        entry["hit_count"] += 1
+        page_num = meta.get("page_no") or meta.get("page_number")
+        if page_num is not None:
+            entry["pages"].add(int(page_num))
+
+    # ヒット数降順（同数は初出順: sorted は安定ソート）
+    source_files = sorted(agg.values(), key=lambda d: d["hit_count"], reverse=True)
+    for i, info in enumerate(source_files):
         info["source_id"]       = f"S{i + 1}"
-        info["hit_count"]       = count
-        info["relevance_count"] = count  # 後方互換エイリアス
-        info["pages"]           = sorted(list(file_pages_map.get(rel_path, set())))
-        source_files.append(info)
+        info["relevance_count"] = info["hit_count"]  # 後方互換エイリアス
+        info["pages"]           = sorted(info["pages"])
 
     return source_files
 
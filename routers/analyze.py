@@ -1,15 +1,20 @@
 # routers/analyze.py
 # 複数MDファイル結合・コンテキストシート生成エンドポイント（v2 — ContextSheet テーブル対応）
 
+import asyncio
 import json
 import logging
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional
 
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from starlette.concurrency import iterate_in_threadpool
+
+from utils.sse import sse_frame, SSE_ERROR_PREFIX, SSE_DONE
 
 from config import KNOWLEDGE_BASE_DIR, GEMINI_MODEL_RAG, MAX_TOKENS, TEMPERATURE
 from database import SessionLocal, ContextSheet
@@ -152,10 +157,44 @@ def save_context_sheet(
         session.close()
 
 
+# ストリーム中の細かいトークンをまとめて 1 フレームで送る条件（経過秒・文字数）
+_STREAM_FLUSH_INTERVAL_SEC = 0.05
+_STREAM_FLUSH_CHARS = 256
+
+
+def _coalesce_stream_text(
+    stream_iter: Iterable,
+    flush_interval: float = _STREAM_FLUSH_INTERVAL_SEC,
+    flush_chars: int = _STREAM_FLUSH_CHARS,
+) -> Iterator[str]:
+    """Gemini ストリームのチャンクテキストを束ねて返す。
+
+    前回の送出から flush_interval 秒以上経過したか、バッファが flush_chars 文字以上に
+    なった時点でまとめて yield する。SSE フレーム数（JSON エンコード・スレッド往復）を減らす。
+    """
+    buf: List[str] = []
+    buf_len = 0
+    last_flush = time.monotonic()
+    for chunk in stream_iter:
+        text = chunk.text
+        if not text:
+            continue
+        buf.append(text)
+        buf_len += len(text)
+        now = time.monotonic()
+        if buf_len >= flush_chars or now - last_flush >= flush_interval:
+            yield "".join(buf)
+            buf.clear()
+            buf_len = 0
+            last_flush = now
+    if buf:
+        yield "".join(buf)
+
+
 # ===== エンドポイント =====
 
 @router.post("/api/analyze/context-sheet")
-def generate_context_sheet(request: ContextSheetRequest):
+async def generate_context_sheet(request: ContextSheetRequest):
     """
     複数MDファイルを結合・分析しSSEストリームでコンテキストシートを返す。
     生成完了後、ContextSheet テーブルに保存する。
@@ -170,12 +209,12 @@ def generate_context_sheet(request: ContextSheetRequest):
         )
 
     # 対象ファイル収集
-    md_paths = collect_md_files(request.file_paths, request.folder_path)
+    md_paths = await asyncio.to_thread(collect_md_files, request.file_paths, request.folder_path)
     if not md_paths:
         raise HTTPException(status_code=400, detail="対象MDファイルが存在しません。")
 
     # MD結合・圧縮
-    combined, truncated = build_combined_md(md_paths, request.char_limit)
+    combined, truncated = await asyncio.to_thread(build_combined_md, md_paths, request.char_limit)
     file_count = len(md_paths)
 
     # プロンプト組み立て
@@ -183,13 +222,13 @@ def generate_context_sheet(request: ContextSheetRequest):
     if prompt is None:
         raise HTTPException(status_code=400, detail="プロンプト生成に失敗しました。")
 
-    def generate():
-        full_sheet = ""
+    async def generate():
+        sheet_parts: List[str] = []
 
         # 圧縮通知を先頭に送信
         if truncated:
             warning = f"⚠️ **文字数上限（{request.char_limit:,}文字）により一部省略されました。** {file_count}件のMDを結合した結果を先頭・中間・末尾からサンプリングして分析しています。\n\n"
-            yield f"data: {json.dumps({'type': 'truncation_warning', 'data': warning}, ensure_ascii=False)}\n\n"
+            yield sse_frame({'type': 'truncation_warning', 'data': warning})
 
         try:
             client = get_client()
@@ -204,19 +243,21 @@ def generate_context_sheet(request: ContextSheetRequest):
                     max_output_tokens=MAX_TOKENS,
                 ),
             )
-            for chunk in stream_iter:
-                if chunk.text:
-                    full_sheet += chunk.text
-                    yield f"data: {json.dumps({'type': 'answer', 'data': chunk.text}, ensure_ascii=False)}\n\n"
+            # 同期イテレータはスレッドプール上で回し、イベントループを塞がない
+            async for text in iterate_in_threadpool(_coalesce_stream_text(stream_iter)):
+                sheet_parts.append(text)
+                yield sse_frame({'type': 'answer', 'data': text})
 
         except Exception as e:
             logger.error(f"Context sheet stream error: {e}", exc_info=True)
-            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+            yield sse_frame({'error': str(e)}, SSE_ERROR_PREFIX)
             return
 
         # 生成完了後 → DB 保存
+        full_sheet = "".join(sheet_parts)
         if full_sheet:
-            sheet_id = save_context_sheet(
+            sheet_id = await asyncio.to_thread(
+                save_context_sheet,
                 role=request.role,
                 model=request.model,
                 file_paths=md_paths,
@@ -225,9 +266,9 @@ def generate_context_sheet(request: ContextSheetRequest):
                 content=full_sheet,
                 title=request.title,
             )
-            yield f"data: {json.dumps({'type': 'saved', 'id': sheet_id}, ensure_ascii=False)}\n\n"
+            yield sse_frame({'type': 'saved', 'id': sheet_id})
 
-        yield "data: [DONE]\n\n"
+        yield SSE_DONE
 
     return StreamingResponse(
         generate(),
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Depends
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from typing import Optional, List
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from starlette.concurrency import iterate_in_threadpool
+from typing import Any, Dict, Optional, List, AsyncIterator
 import logging
 import json
+import asyncio
 import concurrent.futures
 from datetime import datetime, timezone
 from retriever import search, build_context, get_source_files
@@ -11,6 +13,8 @@ from generator import generate_answer, generate_answer_stream, generate_answer_d
 from database import get_db, ChatSession, ChatMessage
 from sqlalchemy.orm import Session
 from backend.conversation_scope import ConversationScope
+from utils.sse import sse_frame, coalesce_answer_parts, SSE_ERROR_PREFIX, SSE_DONE
+import chat_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Chat"])
@@ -39,6 +43,9 @@ def _resolve_model(model: str, question: str, has_rag: bool) -> str:
         return GEMINI_MODEL_RAG
 
 class ChatRequest(BaseModel):
+    # リクエスト内容は回答キャッシュのスコープにも使うため、受け取った後は変更しない
+    model_config = ConfigDict(frozen=True)
+
     question: str
     category: Optional[str] = None
     file_type: Optional[str] = None
@@ -69,9 +76,24 @@ class ChatRequest(BaseModel):
     project_name: Optional[str] = None  # 課題グラフのプロジェクト名
 
 class ChatResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     answer: str
-    sources: List[dict]
-    web_sources: Optional[List[dict]] = None
+    sources: List[Dict[str, Any]]
+    web_sources: Optional[List[Dict[str, Any]]] = None
+
+
+def _chat_json_response(answer: str, sources: List[Dict[str, Any]],
+                        web_sources: Optional[List[Dict[str, Any]]] = None) -> Response:
+    """ChatResponse を pydantic のシリアライザで直接 JSON 化して返す
+
+    値はサーバー側で組み立てたものなので検証は省き（model_construct）、response_model 経由で
+    返したときの「dict 化 → 再検証 → エンコード」の往復も避ける。
+    """
+    body = ChatResponse.model_construct(
+        answer=answer, sources=sources, web_sources=web_sources
+    ).model_dump_json(exclude_none=True)
+    return Response(content=body, media_type="application/json")
 
 class SessionResponse(BaseModel):
     id: str
@@ -206,6 +228,19 @@ def persist_chat_message(session_id: str, user_query: str, assistant_response: s
     finally:
         db.close()
 
+def _answer_cache_scope(request: ChatRequest) -> Optional[tuple]:
+    """回答キャッシュのスコープ。会話履歴・ウェブ検索を伴う質問はキャッシュしない（None）"""
+    if request.history or request.use_web_search:
+        return None
+    scope = request.conversation_scope
+    return chat_cache.scope_key(
+        request.use_rag, request.category, request.file_type, request.date_range,
+        request.tags or (), request.tag_match_mode, request.quick_mode, request.model,
+        request.context_sheet, request.project_id, request.scope_mode,
+        scope.model_dump_json() if scope is not None else None,
+    )
+
+
 @router.post("/api/chat", response_model=ChatResponse, response_model_exclude_none=True)
 def chat(request: ChatRequest, background_tasks: BackgroundTasks, session_id: Optional[str] = None):
     """質問に対する回答を生成"""
@@ -219,6 +254,31 @@ def chat(request: ChatRequest, background_tasks: BackgroundTasks, session_id: Op
     answer = ""
     source_files = []
     web_sources = None
+
+    cache_scope = _answer_cache_scope(request)
+    if cache_scope is not None:
+        cached = chat_cache.lookup(request.question, cache_scope)
+        if cached is not None:
+            logger.info(f"Answer cache hit: {request.question}")
+            if effective_session_id:
+                background_tasks.add_task(
+                    persist_chat_message,
+                    session_id=effective_session_id,
+                    user_query=request.question,
+                    assistant_response=cached["answer"],
+                    sources=cached["sources"],
+                    model=request.model,
+                    web_sources=None
+                )
+            # Layer A Memory はキャッシュヒット時も生成時と同様に更新する（保存されるのは非空回答のみ）
+            background_tasks.add_task(
+                run_memory_pipeline,
+                user_message=request.question,
+                assistant_response=cached["answer"],
+                project_id=request.project_id
+            )
+            return _chat_json_response(cached["answer"], cached["sources"])
+    cache_epoch = chat_cache.current_epoch()
     
     try:
         if request.use_rag or request.use_web_search:
@@ -302,8 +362,13 @@ def chat(request: ChatRequest, background_tasks: BackgroundTasks, session_id: Op
                 assistant_response=answer,
                 project_id=request.project_id
             )
+            if cache_scope is not None:
+                background_tasks.add_task(
+                    chat_cache.store, request.question, cache_scope,
+                    {"answer": answer, "sources": source_files}, cache_epoch
+                )
         
-        return ChatResponse(answer=answer, sources=source_files, web_sources=web_sources)
+        return _chat_json_response(answer, source_files, web_sources)
 
     except RuntimeError as e:
         logger.error(f"Gemini API完全失敗: {e}", exc_info=True)
@@ -312,60 +377,90 @@ def chat(request: ChatRequest, background_tasks: BackgroundTasks, session_id: Op
         logger.error(f"Chat error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Chat processing failed")
 
+async def _search_with_progress(request: ChatRequest, use_advanced: bool) -> AsyncIterator[tuple]:
+    """
+    search() → build_context() → get_source_files() をワーカースレッドで実行し、
+    進捗を ("status", 段階名) として、最後に ("result", (context, source_files)) を yield する。
+    search() の on_progress はスレッドから呼ばれるため call_soon_threadsafe でキューに積む。
+    """
+    loop = asyncio.get_running_loop()
+    progress: asyncio.Queue = asyncio.Queue()
+
+    def on_progress(stage: str):
+        loop.call_soon_threadsafe(progress.put_nowait, stage)
+
+    def run_search():
+        search_results = search(
+            request.question,
+            filter_category=request.category,
+            filter_file_type=request.file_type,
+            filter_date_range=request.date_range,
+            filter_tags=request.tags,
+            tag_match_mode=request.tag_match_mode or "any",
+            use_query_expansion=use_advanced,
+            use_hyde=use_advanced,
+            use_rerank=use_advanced,
+            on_progress=on_progress,
+        )
+        return build_context(search_results), get_source_files(search_results)
+
+    search_task = asyncio.ensure_future(asyncio.to_thread(run_search))
+    while not search_task.done():
+        stage_task = asyncio.ensure_future(progress.get())
+        done, _ = await asyncio.wait({search_task, stage_task}, return_when=asyncio.FIRST_COMPLETED)
+        if stage_task in done:
+            yield "status", stage_task.result()
+        else:
+            stage_task.cancel()
+    yield "result", search_task.result()
+
+
 @router.post("/api/chat/stream")
-def chat_stream(request: ChatRequest, background_tasks: BackgroundTasks, session_id: Optional[str] = None):
-    """ストリーミング形式で回答を生成 (Phase 2: SSE対応)"""
+async def chat_stream(request: ChatRequest, background_tasks: BackgroundTasks, session_id: Optional[str] = None):
+    """ストリーミング形式で回答を生成 (Phase 2: SSE対応)
+
+    検索・リランクはストリーム開始後にワーカースレッドで実行し、その間は
+    {'type': 'status'} フレームで進捗を送出する（TTFB を検索時間から切り離す）。
+    """
     if not request.question.strip():
         raise HTTPException(status_code=400, detail="質問を入力してください")
     
     # session_id の正規化: body を優先、query は fallback とする (#23)
     effective_session_id = request.session_id or session_id
-    
-    try:
-        if request.use_rag or request.use_web_search:
-            # --- RAGあり または ウェブ検索あり ---
+    history = request.history
+
+    async def generate(sid):
+        # 状態管理の整理 (#30)
+        full_answer = ""
+        web_sources_collected = []
+        done_sent = False
+        error_sent = False
+        context = ""
+        source_files = []
+        capture_future = None
+
+        try:
             if request.use_rag:
                 # ストリームでもデフォルト quick_mode=False（精度優先: クエリ展開・HyDE・リランク実行）
                 effective_quick = request.quick_mode if request.quick_mode is not None else False
                 use_advanced = not effective_quick
-                search_results = search(
-                    request.question,
-                    filter_category=request.category,
-                    filter_file_type=request.file_type,
-                    filter_date_range=request.date_range,
-                    filter_tags=request.tags,
-                    tag_match_mode=request.tag_match_mode or "any",
-                    use_query_expansion=use_advanced,
-                    use_hyde=use_advanced,
-                    use_rerank=use_advanced,
-                )
-                context = build_context(search_results)
-                source_files = get_source_files(search_results)
-            else:
+                yield sse_frame({'type': 'status', 'data': 'searching'})
+                async for kind, payload in _search_with_progress(request, use_advanced):
+                    if kind == "status":
+                        yield sse_frame({'type': 'status', 'data': payload})
+                    else:
+                        context, source_files = payload
+            elif request.use_web_search:
                 # ウェブ検索のみ（RAGなし）
                 logger.info(f"Web search direct stream query: {request.question}")
-                context = ""
-                source_files = []
-        else:
-            # --- RAGなし かつ ウェブ検索なし（LLM直接回答） ---
-            logger.info(f"Direct stream query (no RAG, no Web Search): {request.question}")
-            context = ""
-            source_files = []
-
-        history = request.history
+            else:
+                # RAGなし かつ ウェブ検索なし（LLM直接回答）
+                logger.info(f"Direct stream query (no RAG, no Web Search): {request.question}")
 
-        def generate(sid):
-            # 状態管理の整理 (#30)
-            full_answer = ""
-            web_sources_collected = []
-            done_sent = False
-            error_sent = False
-            
             # 初期情報の送出
-            yield f"data: {json.dumps({'type': 'sources', 'data': source_files}, ensure_ascii=False)}\n\n"
+            yield sse_frame({'type': 'sources', 'data': source_files})
 
             # 課題キャプチャをメインストリームと並列で開始（ラグ解消）
-            capture_future = None
             if (request.capture_issues and request.project_name and
                     any(kw in request.question for kw in ISSUE_KEYWORDS)):
                 capture_future = _capture_executor.submit(
@@ -374,96 +469,96 @@ def chat_stream(request: ChatRequest, background_tasks: BackgroundTasks, session
                     request.project_name,
                 )
 
-            try:
-                # generator の呼び出し整理 (#33)
-                if request.use_rag or request.use_web_search:
-                    stream_gen = generate_answer_stream(
-                        request.question, context, source_files,
-                        history=history,
-                        model=_resolve_model(request.model, request.question, bool(context)),
-                        context_sheet=request.context_sheet,
-                        project_id=request.project_id,
-                        scope_mode=request.scope_mode,
-                        use_web_search=request.use_web_search,
-                    )
-                else:
-                    stream_gen = generate_answer_stream_direct(
-                        request.question,
-                        history=history,
-                        model=_resolve_model(request.model, request.question, False),
-                        context_sheet=request.context_sheet,
-                        use_web_search=request.use_web_search,
-                    )
-                
-                # チャンク送出と累積の責務分離 (#33)
-                for part in stream_gen:
-                    if part["type"] == "answer":
-                        chunk = part["data"]
-                        full_answer += chunk
-                        yield f"data: {json.dumps({'type': 'answer', 'data': chunk}, ensure_ascii=False)}\n\n"
-                    elif part["type"] == "web_sources":
-                        web_sources_collected = part["data"]
-                        yield f"data: {json.dumps({'type': 'web_sources', 'data': web_sources_collected}, ensure_ascii=False)}\n\n"
-                
-                # 課題キャプチャ結果を取得（並列実行済みのため待機時間 ≈ 0）
-                if capture_future is not None and full_answer.strip():
-                    try:
-                        capture_result = capture_future.result(timeout=15)
-                        if capture_result:
-                            yield f"data: {json.dumps({'type': 'issue_capture', 'data': capture_result}, ensure_ascii=False)}\n\n"
-                    except concurrent.futures.TimeoutError:
-                        logger.warning("Issue capture timed out after 15s, skipping")
-                    except Exception as e:
-                        logger.error(f"Issue capture future failed: {e}", exc_info=True)
-
-                # 正常終了時の後継タスク登録（副作用の分離） (#31, #35)
-                # 空回答時 (#29) は memory pipeline をスキップ
-                if full_answer.strip():
-                    if sid:
-                        background_tasks.add_task(
-                            persist_chat_message,
-                            session_id=sid,
-                            user_query=request.question,
-                            assistant_response=full_answer,
-                            sources=source_files,
-                            model=request.model,
-                            web_sources=web_sources_collected
-                        )
+            # generator の呼び出し整理 (#33)
+            if request.use_rag or request.use_web_search:
+                model = await asyncio.to_thread(_resolve_model, request.model, request.question, bool(context))
+                stream_gen = generate_answer_stream(
+                    request.question, context, source_files,
+                    history=history,
+                    model=model,
+                    context_sheet=request.context_sheet,
+                    project_id=request.project_id,
+                    scope_mode=request.scope_mode,
+                    use_web_search=request.use_web_search,
+                )
+            else:
+                model = await asyncio.to_thread(_resolve_model, request.model, request.question, False)
+                stream_gen = generate_answer_stream_direct(
+                    request.question,
+                    history=history,
+                    model=model,
+                    context_sheet=request.context_sheet,
+                    use_web_search=request.use_web_search,
+                )
 
+            # チャンク送出と累積の責務分離 (#33)
+            # Gemini ストリームは同期イテレータのためスレッドプール上で回す。
+            # トークン単位の細かいチャンクは短い時間窓でまとめ、フレーム（送信）数を減らす
+            async for part in coalesce_answer_parts(iterate_in_threadpool(stream_gen)):
+                if part["type"] == "answer":
+                    chunk = part["data"]
+                    full_answer += chunk
+                    yield sse_frame({'type': 'answer', 'data': chunk})
+                elif part["type"] == "web_sources":
+                    web_sources_collected = part["data"]
+                    yield sse_frame({'type': 'web_sources', 'data': web_sources_collected})
+
+            # 課題キャプチャ結果を取得（並列実行済みのため待機時間 ≈ 0）
+            if capture_future is not None and full_answer.strip():
+                try:
+                    capture_result = await asyncio.wait_for(asyncio.wrap_future(capture_future), timeout=15)
+                    if capture_result:
+                        yield sse_frame({'type': 'issue_capture', 'data': capture_result})
+                except asyncio.TimeoutError:
+                    logger.warning("Issue capture timed out after 15s, skipping")
+                except Exception as e:
+                    logger.error(f"Issue capture future failed: {e}", exc_info=True)
+
+            # 正常終了時の後継タスク登録（副作用の分離） (#31, #35)
+            # 空回答時 (#29) は memory pipeline をスキップ
+            if full_answer.strip():
+                if sid:
                     background_tasks.add_task(
-                        run_memory_pipeline,
-                        user_message=request.question,
+                        persist_chat_message,
+                        session_id=sid,
+                        user_query=request.question,
                         assistant_response=full_answer,
-                        project_id=request.project_id
+                        sources=source_files,
+                        model=request.model,
+                        web_sources=web_sources_collected
                     )
 
-            except Exception as e:
-                # キャプチャ未完了なら中断
-                if capture_future is not None:
-                    capture_future.cancel()
-                # エラーイベントの多重送信防止・排他制御 (#32, #34, #31)
-                if not error_sent and not done_sent:
-                    logger.error(f"Stream generation exception: {e}", exc_info=True)
-                    yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
-                    error_sent = True
-            finally:
-                # 終端通知の統一と確実な [DONE] 送出 (#24, #32, #36)
-                if not done_sent and not error_sent:
-                    yield "data: [DONE]\n\n"
-                    done_sent = True
-        
-        return StreamingResponse(
-            generate(effective_session_id), 
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-            }
-        )
-        
-    except Exception as e:
-        logger.error(f"Stream routing error: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Stream initialization failed")
+                background_tasks.add_task(
+                    run_memory_pipeline,
+                    user_message=request.question,
+                    assistant_response=full_answer,
+                    project_id=request.project_id
+                )
+
+        except Exception as e:
+            # キャプチャ未完了なら中断
+            if capture_future is not None:
+                capture_future.cancel()
+            # エラーイベントの多重送信防止・排他制御 (#32, #34, #31)
+            if not error_sent and not done_sent:
+                logger.error(f"Stream generation exception: {e}", exc_info=True)
+                yield sse_frame({'error': str(e)}, SSE_ERROR_PREFIX)
+                error_sent = True
+        finally:
+            # 終端通知の統一と確実な [DONE] 送出 (#24, #32, #36)
+            if not done_sent and not error_sent:
+                yield SSE_DONE
+                done_sent = True
+
+    return StreamingResponse(
+        generate(effective_session_id), 
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
 
 
 # --- Chat History Endpoints ---
@@ -4,9 +4,22 @@ from pydantic import BaseModel
 import logging
 import traceback
 
+from config import KNOWLEDGE_BASE_DIR
+
+# ハンドラ内で毎回 import しないよう起動時に一度だけ読み込む（Google API ライブラリが無い環境では None）
+try:
+    import drive_sync as drive_sync_lib
+except ImportError:
+    drive_sync_lib = None
+
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Google Drive Sync"])
 
+def _drive():
+    if drive_sync_lib is None:
+        raise ImportError("drive_sync")
+    return drive_sync_lib
+
 class DriveSyncRequest(BaseModel):
     folder_name: str = "建築意匠ナレッジDB"
 
@@ -14,8 +27,7 @@ class DriveSyncRequest(BaseModel):
 def drive_status():
     """Google Drive認証状態を確認"""
     try:
-        from drive_sync import get_auth_status
-        return get_auth_status()
+        return _drive().get_auth_status()
     except ImportError:
         return {"authenticated": False, "message": "drive_sync モジュールがありません"}
     except Exception as e:
@@ -26,8 +38,8 @@ def drive_status():
 def drive_auth(request: Request):
     """Google Drive認証URLを取得"""
     try:
-        from drive_sync import get_auth_url
-        
+        drive = _drive()
+
         origin = request.headers.get("origin")
         if not origin:
             scheme = request.headers.get("x-forwarded-proto", request.url.scheme)
@@ -36,7 +48,7 @@ def drive_auth(request: Request):
             
         redirect_uri = f"{origin}/api/drive/callback"
         
-        url = get_auth_url(redirect_uri=redirect_uri)
+        url = drive.get_auth_url(redirect_uri=redirect_uri)
         return {"success": True, "auth_url": url}
     except FileNotFoundError as e:
         logger.warning(f"Drive auth file not found: {e}", exc_info=True)
@@ -49,14 +61,14 @@ def drive_auth(request: Request):
 def drive_callback(request: Request, code: str, state: str = None):
     """Googleからのリダイレクトを受け取り認証完了"""
     try:
-        from drive_sync import save_credentials_from_code
-        
+        drive = _drive()
+
         scheme = request.headers.get("x-forwarded-proto", request.url.scheme)
         host = request.headers.get("x-forwarded-host", request.url.netloc)
         origin = f"{scheme}://{host}"
         
         redirect_uri = f"{origin}/api/drive/callback"
-        save_credentials_from_code(code, redirect_uri=redirect_uri, state=state)
+        drive.save_credentials_from_code(code, redirect_uri=redirect_uri, state=state)
         
         return RedirectResponse(url=f"{origin}/?auth=success")
     except Exception as e:
@@ -67,8 +79,7 @@ def drive_callback(request: Request, code: str, state: str = None):
 async def drive_upload(background_tasks: BackgroundTasks):
     """Google Driveへバックアップ"""
     try:
-        from drive_sync import backup_to_drive
-        background_tasks.add_task(backup_to_drive)
+        background_tasks.add_task(_drive().backup_to_drive)
         return {"status": "success", "message": "バックアップを開始しました"}
     except Exception as e:
         logger.error(f"Drive backup start failed: {e}", exc_info=True)
@@ -78,16 +89,16 @@ async def drive_upload(background_tasks: BackgroundTasks):
 async def drive_sync(request: DriveSyncRequest):
     """Google Driveフォルダを同期"""
     try:
-        from drive_sync import find_folder_by_name, sync_drive_folder
-        
-        folder_id = find_folder_by_name(request.folder_name)
+        drive = _drive()
+
+        folder_id = drive.find_folder_by_name(request.folder_name)
         if not folder_id:
             raise HTTPException(
                 status_code=404,
                 detail=f"フォルダ '{request.folder_name}' が見つかりません"
             )
         
-        stats = sync_drive_folder(folder_id, request.folder_name)
+        stats = drive.sync_drive_folder(folder_id, request.folder_name)
         return {
             "success": True,
             "folder_name": request.folder_name,
@@ -103,9 +114,9 @@ async def drive_sync(request: DriveSyncRequest):
 async def drive_list_folders(parent_id: str = "root"):
     """Google Driveのフォルダ一覧を取得"""
     try:
-        from drive_sync import get_drive_service, list_drive_folders
-        service = get_drive_service()
-        folders = list_drive_folders(service, parent_id)
+        drive = _drive()
+        service = drive.get_drive_service()
+        folders = drive.list_drive_folders(service, parent_id)
         return {"folders": folders}
     except Exception as e:
         logger.error(f"Failed to list drive folders: {e}", exc_info=True)
@@ -116,17 +127,14 @@ async def sync_to_drive():
     """ローカルの整理済みフォルダをGoogle Driveに同期（Local -> Drive Mirror Upload）"""
     try:
         folder_name = "建築意匠ナレッジDB"
-        
-        from drive_sync import find_folder_by_name, create_folder, get_drive_service
-        from config import KNOWLEDGE_BASE_DIR
-        
-        service = get_drive_service()
-        folder_id = find_folder_by_name(folder_name)
+        drive = _drive()
+
+        service = drive.get_drive_service()
+        folder_id = drive.find_folder_by_name(folder_name)
         if not folder_id:
-            folder_id = create_folder(service, folder_name)
-            
-        from drive_sync import upload_mirror_to_drive
-        result = upload_mirror_to_drive(str(KNOWLEDGE_BASE_DIR), folder_id)
+            folder_id = drive.create_folder(service, folder_name)
+
+        result = drive.upload_mirror_to_drive(str(KNOWLEDGE_BASE_DIR), folder_id)
         
         return result
     except ImportError:
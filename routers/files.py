@@ -1,42 +1,170 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File, Request
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from pathlib import Path
 import os
+import re
+import stat
+import asyncio
+import concurrent.futures
+import hashlib
 import time
 import logging
 import traceback
 import json
 import subprocess
-import tempfile
+import threading
+
+import yaml
+
+from config import UPLOAD_CONCURRENCY  # 1 リクエスト内で同時に処理するファイル数
+from utils.file_hash import remember_sha256
+from utils.fs import resolved_root, safe_join
+import pipeline_manager
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Files & Upload"])
 
-AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a"}
-VIDEO_EXTENSIONS = {".mp4", ".mov"}
+AUDIO_EXTENSIONS = frozenset({".mp3", ".wav", ".m4a"})
+VIDEO_EXTENSIONS = frozenset({".mp4", ".mov"})
+TEXT_EXTENSIONS = frozenset({".md", ".txt"})
+IMAGE_UPLOAD_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg"})
+# アップロード後に OCR / 文字起こしパイプラインへ回す拡張子
+PIPELINE_EXTENSIONS = frozenset({".pdf"}) | IMAGE_UPLOAD_EXTENSIONS | AUDIO_EXTENSIONS | VIDEO_EXTENSIONS
+_AUDIO_MIME = {".mp3": "audio/mpeg", ".wav": "audio/wav", ".m4a": "audio/mp4"}
+ALLOWED_EXTENSIONS = frozenset({".pdf", ".png", ".jpg", ".jpeg", ".md", ".txt",
+                                ".mp3", ".wav", ".m4a", ".mp4", ".mov"})
+MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+
+# ファイル名として使えない文字
+_UNSAFE_FN_RE = re.compile(r'[/\\:*?"<>|]')
 AUDIO_MAX_DURATION_SEC = 7200  # 2時間（会議録音対応）
 VIDEO_MAX_DURATION_SEC = 120
 
 
-def _get_media_duration(content: bytes, ext: str) -> Optional[float]:
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MiB ずつ読み書きしてピークメモリを抑える
+
+
+# アップロードのディスク書き込み専用スレッドプール。
+# 既定の executor（asyncio.to_thread）を大量アップロードで埋めて、チャット等の to_thread を待たせないよう分離する
+_upload_io_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=UPLOAD_CONCURRENCY, thread_name_prefix="upload_io"
+)
+
+
+class _UploadTooLarge(Exception):
+    """アップロードサイズが上限を超えた"""
+
+
+async def _stream_upload_to_disk(file: UploadFile, dest: Path, max_size: int) -> Tuple[int, str]:
+    """UploadFile をチャンク単位で dest に書き出し、(サイズ, SHA-256) を返す。
+
+    コピー全体を 1 回のスレッド実行で行い、チャンクごとのスレッド往復を避ける。
+    上限超過時は書きかけのファイルを削除して _UploadTooLarge を送出する。
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_upload_io_executor, _copy_upload, file.file, dest, max_size)
+
+
+def _copy_upload(src, dest: Path, max_size: int) -> Tuple[int, str]:
+    """src を dest にコピーしながらサイズと SHA-256 を求める（同期）
+
+    読み込みは使い回しのバッファへの readinto で行い、チャンクごとの bytes 確保をしない。
+    src がディスクに溢れた一時ファイルなら fstat で残りサイズが分かるので、上限超過は書き込み前に弾く。
+    """
+    remaining = _remaining_size(src)
+    if remaining is not None and remaining > max_size:
+        raise _UploadTooLarge()
+    size = 0
+    hasher = hashlib.sha256()
+    buf = bytearray(UPLOAD_CHUNK_SIZE)
+    view = memoryview(buf)
+    readinto = getattr(src, "readinto", None)
+    try:
+        with open(dest, "wb") as out:
+            while True:
+                if readinto is not None:
+                    n = readinto(buf)
+                    chunk = view[:n]
+                else:
+                    chunk = src.read(UPLOAD_CHUNK_SIZE)
+                    n = len(chunk)
+                if not n:
+                    break
+                size += n
+                if size > max_size:
+                    raise _UploadTooLarge()
+                hasher.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        dest.unlink(missing_ok=True)
+        raise
+    return size, hasher.hexdigest()
+
+
+async def _stream_request_to_disk(request: Request, dest: Path, max_size: int) -> Tuple[int, str]:
+    """リクエストボディを一時ファイルを介さず dest に書き出し、(サイズ, SHA-256) を返す。
+
+    受信チャンクは UPLOAD_CHUNK_SIZE まで溜めてから、書き込み・ハッシュ更新をアップロード用スレッドで行う。
+    上限超過時は書きかけのファイルを削除して _UploadTooLarge を送出する。
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_size:
+        raise _UploadTooLarge()
+
+    loop = asyncio.get_running_loop()
+    hasher = hashlib.sha256()
+    size = 0
+    buf = bytearray()
+
+    def _write(data: bytes):
+        hasher.update(data)
+        out.write(data)
+
+    out = await loop.run_in_executor(_upload_io_executor, open, dest, "wb")
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > max_size:
+                raise _UploadTooLarge()
+            buf += chunk
+            if len(buf) >= UPLOAD_CHUNK_SIZE:
+                await loop.run_in_executor(_upload_io_executor, _write, bytes(buf))
+                buf.clear()
+        if buf:
+            await loop.run_in_executor(_upload_io_executor, _write, bytes(buf))
+        await loop.run_in_executor(_upload_io_executor, out.close)
+    except BaseException:
+        out.close()
+        dest.unlink(missing_ok=True)
+        raise
+    return size, hasher.hexdigest()
+
+
+def _remaining_size(src) -> Optional[int]:
+    """src が通常ファイルを指していれば、現在位置から末尾までのバイト数を返す（不明なら None）"""
+    try:
+        st = os.fstat(src.fileno())
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return st.st_size - src.tell()
+    except (AttributeError, OSError, ValueError):
+        # メモリ上の SpooledTemporaryFile / BytesIO などは fileno を持たない
+        return None
+
+
+def _get_media_duration(path: Path) -> Optional[float]:
     """ffprobeでメディアの長さ（秒）を取得する。ffprobeが利用不可の場合はNoneを返す。"""
     try:
-        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
-            tmp.write(content)
-            tmp_path = tmp.name
-        try:
-            result = subprocess.run(
-                ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", tmp_path],
-                capture_output=True, text=True, timeout=30
-            )
-            if result.returncode == 0:
-                info = json.loads(result.stdout)
-                duration = info.get("format", {}).get("duration")
-                return float(duration) if duration else None
-        finally:
-            os.unlink(tmp_path)
+        result = subprocess.run(
+            ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", str(path)],
+            capture_output=True, text=True, timeout=30
+        )
+        if result.returncode == 0:
+            info = json.loads(result.stdout)
+            duration = info.get("format", {}).get("duration")
+            return float(duration) if duration else None
     except FileNotFoundError:
         logger.warning("ffprobe not found; skipping duration validation")
     except Exception as e:
@@ -50,166 +178,269 @@ class DeleteFileRequest(BaseModel):
 class BulkDeleteRequest(BaseModel):
     file_paths: List[str]
 
-@router.post("/api/upload/multiple")
-async def upload_multiple_files(
-    background_tasks: BackgroundTasks,
-    files: List[UploadFile] = File(...),
-    project_id: Optional[str] = None,
-):
-    """Web画面から複数ファイルを一括アップロードし、file_storeに登録する"""
-    # project_id が未指定の場合、アクティブプロジェクトから解決
-    if not project_id:
-        try:
-            from backend.scope_resolver import get_setting
-            project_id = get_setting("active_project_id") or ""
-        except Exception:
-            project_id = ""
-    ALLOWED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".md", ".txt",
-                          ".mp3", ".wav", ".m4a", ".mp4", ".mov"}
-    MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
-    
+def _finalize_text_upload(part_path: Path, final_md_path: Path, source_pdf_hash: str, version_id) -> Path:
+    """KB 内に直接書き込んだ .md/.txt を最終名に確定し、必要ならフロントマターを付与する
+
+    書き込みは同じディレクトリの一時ファイルに行っているため、確定は rename のみでコピーは発生しない。
+    フロントマターを書き足さなかった場合だけ、受信時に計算したハッシュを最終パスで登録する
+    （書き足した場合は内容が変わるので登録しない）。
+    """
+    os.replace(part_path, final_md_path)
+
+    # source_pdf_hash がフロントマターにない場合は付与してからインデックス
+    _md_text = final_md_path.read_text(encoding="utf-8")
+    _has_fm = _md_text.startswith("---")
+    if not _has_fm or "source_pdf_hash" not in _md_text[:500]:
+        _fm_data = {"source_pdf_hash": source_pdf_hash, "version_id": version_id}
+        if _has_fm:
+            _parts = _md_text.split("---", 2)
+            if len(_parts) >= 3:
+                _existing = yaml.safe_load(_parts[1]) or {}
+                _existing.update(_fm_data)
+                _md_text = "---\n" + yaml.dump(_existing, allow_unicode=True) + "---" + _parts[2]
+            else:
+                _md_text = "---\n" + yaml.dump(_fm_data, allow_unicode=True) + "---\n" + _md_text
+        else:
+            _md_text = "---\n" + yaml.dump(_fm_data, allow_unicode=True) + "---\n" + _md_text
+        final_md_path.write_text(_md_text, encoding="utf-8")
+    else:
+        remember_sha256(final_md_path, source_pdf_hash)
+    return final_md_path
+
+
+def _resolve_upload_project_id(project_id: Optional[str]) -> str:
+    """project_id が未指定の場合、アクティブプロジェクトから解決"""
+    if project_id:
+        return project_id
+    try:
+        from backend.scope_resolver import get_setting
+        return get_setting("active_project_id") or ""
+    except Exception:
+        return ""
+
+
+def _prepare_upload_dirs() -> Tuple[Path, Path]:
+    """(input/, KB の未分類フォルダ) を作成して返す"""
     from config import BASE_DIR, KNOWLEDGE_BASE_DIR, UNCATEGORIZED_FOLDER
     input_dir = Path(BASE_DIR) / "input"
     input_dir.mkdir(parents=True, exist_ok=True)
 
     pdf_dir = Path(KNOWLEDGE_BASE_DIR) / UNCATEGORIZED_FOLDER
     pdf_dir.mkdir(parents=True, exist_ok=True)
+    return input_dir, pdf_dir
 
-    from metadata_repository import MetadataRepository
-    repo = MetadataRepository()
-    
-    results = []
-    errors = []
-    
-    for file in files:
-        filename = file.filename or "unknown"
-        filename = os.path.basename(filename)
-        ext = os.path.splitext(filename)[1].lower()
-        
-        if ext not in ALLOWED_EXTENSIONS:
-            errors.append({"filename": filename, "error": f"Unsupported file type: {ext}"})
-            continue
-            
-        import re
-        safe_filename = re.sub(r'[/\\:*?"<>|]', '_', filename).strip()
-        if not safe_filename or safe_filename == ext or safe_filename.lstrip('.') == '':
-            safe_filename = f"file_{int(time.time())}_{len(results)}{ext}"
-        if not safe_filename.lower().endswith(ext):
-            safe_filename = safe_filename + ext
-            
+
+async def _save_and_register_upload(index: int, filename: Optional[str], save, input_dir: Path, pdf_dir: Path,
+                                    repo, claimed: set):
+    """1 ファイル分の保存・登録。(成功可否, 結果 or エラー, 後続タスク) を返す
+
+    save(dest, max_size) は本体を dest に書き出して (サイズ, SHA-256) を返すコルーチン関数。
+    """
+    filename = os.path.basename(filename or "unknown")
+    ext = os.path.splitext(filename)[1].lower()
+
+    if ext not in ALLOWED_EXTENSIONS:
+        return False, {"filename": filename, "error": f"Unsupported file type: {ext}"}, None
+
+    safe_filename = _UNSAFE_FN_RE.sub('_', filename).strip()
+    if not safe_filename or safe_filename == ext or safe_filename.lstrip('.') == '':
+        safe_filename = f"file_{int(time.time())}_{index}{ext}"
+    if not safe_filename.lower().endswith(ext):
+        safe_filename = safe_filename + ext
+
+    if ext in TEXT_EXTENSIONS:
+        # テキストは input/ を経由せず KB に直接書き込む（同名ファイルは従来どおり上書き）。
+        # 書き込み中は隠し一時ファイルに置き、登録後に rename で確定する
+        file_path = pdf_dir / safe_filename
+        write_path = pdf_dir / f".{safe_filename}.{index}.part"
+    else:
         base_name = Path(safe_filename).stem
         file_path = input_dir / safe_filename
         timestamp = int(time.time())
-        if file_path.exists():
-            file_path = input_dir / f"{base_name}_{timestamp}_{len(results)}{ext}"
-            
+        # 並行処理中の同名ファイルとも衝突しないよう、このリクエスト内で確保済みのパスも避ける
+        if file_path in claimed or file_path.exists():
+            file_path = input_dir / f"{base_name}_{timestamp}_{index}{ext}"
+        claimed.add(file_path)
+        write_path = file_path
+
+    try:
         try:
-            content = await file.read()
-            if len(content) > MAX_FILE_SIZE:
-                errors.append({"filename": filename, "error": f"File too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB"})
-                continue
-                
-            import hashlib
-            source_pdf_hash = hashlib.sha256(content).hexdigest()
-
-            # 音声・動画ファイルの長さチェック
-            if ext in AUDIO_EXTENSIONS:
-                duration = _get_media_duration(content, ext)
-                if duration is not None and duration > AUDIO_MAX_DURATION_SEC:
-                    errors.append({"filename": filename, "error": f"Audio too long: {duration:.1f}s (max {AUDIO_MAX_DURATION_SEC}s)"})
-                    continue
-                _audio_mime = {".mp3": "audio/mpeg", ".wav": "audio/wav", ".m4a": "audio/mp4"}
-                content_type = _audio_mime.get(ext, "audio/mpeg")
-                source_kind = "audio"
-            elif ext in VIDEO_EXTENSIONS:
-                duration = _get_media_duration(content, ext)
-                if duration is not None and duration > VIDEO_MAX_DURATION_SEC:
-                    errors.append({"filename": filename, "error": f"Video too long: {duration:.1f}s (max {VIDEO_MAX_DURATION_SEC}s)"})
-                    continue
-                content_type = f"video/{'mp4' if ext == '.mp4' else 'quicktime'}"
-                source_kind = "video"
-            elif ext == ".pdf":
-                content_type = "application/pdf"
-                source_kind = "pdf"
-            elif ext in {'.png', '.jpg', '.jpeg'}:
-                content_type = f"image/{ext[1:]}"
-                source_kind = "image"
-            else:
-                content_type = "text/plain"
-                source_kind = "document"
-
-            # Phase 2: MetadataRepositoryへの登録 (file_storeの代替)
-            from metadata_repository import MetadataRepository
-            repo = MetadataRepository()
-            
-            repo_res = repo.create_document_version(
-                filename=filename,
-                file_path=str(file_path),
-                source_pdf_hash=source_pdf_hash,
-                mime_type=content_type,
-                file_size=len(content),
-                source_kind=source_kind
-            )
-            
-            file_id = repo_res["legacy_id"] # file_storeのidの代わりに一時的に利用
-            version_id = repo_res["version_id"]
-            
-            with open(file_path, "wb") as buffer:
-                buffer.write(content)
-
-            logger.info(f"File uploaded: {file_path}, Size: {len(content)} bytes, ID: {file_id}")
-
-            if ext in (".pdf", ".png", ".jpg", ".jpeg", ".mp3", ".wav", ".m4a", ".mp4", ".mov"):
-                from pipeline_manager import process_file_pipeline
-                background_tasks.add_task(process_file_pipeline, str(file_path), source_pdf_hash, version_id, project_id)
-                logger.info(f"パイプライン処理をバックグラウンドタスクに登録: {file_path} (hash: {source_pdf_hash}, version: {version_id}, project: {project_id})")
-            elif ext in [".md", ".txt"]:
-                from config import KNOWLEDGE_BASE_DIR as _KB, UNCATEGORIZED_FOLDER as _UF
-                final_md_dir = Path(_KB) / _UF
-                final_md_dir.mkdir(parents=True, exist_ok=True)
-                final_md_path = final_md_dir / safe_filename
-
-                import shutil
-                shutil.move(str(file_path), str(final_md_path))
-
-                # source_pdf_hash がフロントマターにない場合は付与してからインデックス
-                import yaml as _yaml
-                _md_text = final_md_path.read_text(encoding="utf-8")
-                _has_fm = _md_text.startswith("---")
-                if not _has_fm or "source_pdf_hash" not in _md_text[:500]:
-                    _fm_data = {"source_pdf_hash": source_pdf_hash, "version_id": version_id}
-                    if _has_fm:
-                        _parts = _md_text.split("---", 2)
-                        if len(_parts) >= 3:
-                            _existing = _yaml.safe_load(_parts[1]) or {}
-                            _existing.update(_fm_data)
-                            _md_text = "---\n" + _yaml.dump(_existing, allow_unicode=True) + "---" + _parts[2]
-                        else:
-                            _md_text = "---\n" + _yaml.dump(_fm_data, allow_unicode=True) + "---\n" + _md_text
-                    else:
-                        _md_text = "---\n" + _yaml.dump(_fm_data, allow_unicode=True) + "---\n" + _md_text
-                    final_md_path.write_text(_md_text, encoding="utf-8")
-
-                from indexer import index_file
-                background_tasks.add_task(index_file, str(final_md_path))
-                
-            results.append({
-                "filename": file_path.name,
-                "status": "queued",
-                "path": str(file_path),
-                "file_id": file_id,
-                "version_id": version_id,
+            file_size, source_pdf_hash = await save(write_path, MAX_FILE_SIZE)
+        except _UploadTooLarge:
+            return False, {"filename": filename, "error": f"File too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB"}, None
+        # 書き込み中に計算したハッシュを登録し、下流（OCR 完了処理・PDF 配信）での再ハッシュを避ける。
+        # テキストの一時ファイルは確定時に rename されるため、_finalize_text_upload 側で最終パスに登録する
+        if write_path == file_path:
+            remember_sha256(file_path, source_pdf_hash)
+
+        # 音声・動画ファイルの長さチェック
+        if ext in AUDIO_EXTENSIONS:
+            duration = await asyncio.to_thread(_get_media_duration, file_path)
+            if duration is not None and duration > AUDIO_MAX_DURATION_SEC:
+                file_path.unlink(missing_ok=True)
+                return False, {"filename": filename, "error": f"Audio too long: {duration:.1f}s (max {AUDIO_MAX_DURATION_SEC}s)"}, None
+            content_type = _AUDIO_MIME.get(ext, "audio/mpeg")
+            source_kind = "audio"
+        elif ext in VIDEO_EXTENSIONS:
+            duration = await asyncio.to_thread(_get_media_duration, file_path)
+            if duration is not None and duration > VIDEO_MAX_DURATION_SEC:
+                file_path.unlink(missing_ok=True)
+                return False, {"filename": filename, "error": f"Video too long: {duration:.1f}s (max {VIDEO_MAX_DURATION_SEC}s)"}, None
+            content_type = f"video/{'mp4' if ext == '.mp4' else 'quicktime'}"
+            source_kind = "video"
+        elif ext == ".pdf":
+            content_type = "application/pdf"
+            source_kind = "pdf"
+        elif ext in IMAGE_UPLOAD_EXTENSIONS:
+            content_type = f"image/{ext[1:]}"
+            source_kind = "image"
+        else:
+            content_type = "text/plain"
+            source_kind = "document"
+
+        # Phase 2: MetadataRepositoryへの登録 (file_storeの代替)
+        repo_res = await asyncio.to_thread(
+            repo.create_document_version,
+            filename=filename,
+            file_path=str(file_path),
+            source_pdf_hash=source_pdf_hash,
+            mime_type=content_type,
+            file_size=file_size,
+            source_kind=source_kind
+        )
+
+        if repo_res.get("skipped"):
+            # 同じ内容の版が処理中: 今回の書き込みは破棄し、パイプラインにも再投入しない
+            write_path.unlink(missing_ok=True)
+            logger.info(f"Upload skipped (already {repo_res['status']}): {filename}")
+            return True, {
+                "filename": filename,
+                "status": repo_res["status"],
+                "skipped": True,
+                "version_id": repo_res["version_id"],
                 "original_name": filename,
                 "source_pdf_hash": source_pdf_hash
-            })
-            
-        except Exception as e:
-            logger.error(f"Upload error for {filename}: {e}", exc_info=True)
-            errors.append({"filename": filename, "error": str(e)})
-            
+            }, None
+
+        file_id = repo_res["legacy_id"] # file_storeのidの代わりに一時的に利用
+        version_id = repo_res["version_id"]
+
+        logger.info(f"File uploaded: {file_path}, Size: {file_size} bytes, ID: {file_id}")
+
+        follow_up = None
+        if ext in PIPELINE_EXTENSIONS:
+            follow_up = ("pipeline", (str(file_path), source_pdf_hash, version_id))
+        elif ext in TEXT_EXTENSIONS:
+            final_md_path = await asyncio.to_thread(
+                _finalize_text_upload, write_path, file_path, source_pdf_hash, version_id
+            )
+            follow_up = ("index", str(final_md_path))
+
+        return True, {
+            "filename": file_path.name,
+            "status": "queued",
+            "path": str(file_path),
+            "file_id": file_id,
+            "version_id": version_id,
+            "original_name": filename,
+            "source_pdf_hash": source_pdf_hash
+        }, follow_up
+
+    except Exception as e:
+        logger.error(f"Upload error for {filename}: {e}", exc_info=True)
+        if write_path != file_path:
+            write_path.unlink(missing_ok=True)
+        return False, {"filename": filename, "error": str(e)}, None
+
+
+
+def _finish_uploads(outcomes, background_tasks: BackgroundTasks, project_id: str) -> dict:
+    """保存結果を集計し、OCR パイプライン・インデックスの後続タスクを入力順に登録する"""
+    from indexer import index_files
+
+    results = []
+    errors = []
+    # OCR パイプライン・テキストのインデックスはそれぞれまとめて 1 タスクで投入する
+    pending_pipeline: List[Tuple[str, str, str]] = []
+    pending_index: List[str] = []
+    for ok, item, follow_up in outcomes:
+        if not ok:
+            errors.append(item)
+            continue
+        results.append(item)
+        if follow_up is None:
+            continue
+        kind, payload = follow_up
+        if kind == "pipeline":
+            file_path_str, source_pdf_hash, version_id = payload
+            pending_pipeline.append(payload)
+            logger.info(f"パイプライン処理をバックグラウンドタスクに登録: {file_path_str} (hash: {source_pdf_hash}, version: {version_id}, project: {project_id})")
+        else:
+            pending_index.append(payload)
+
+    if pending_pipeline:
+        background_tasks.add_task(pipeline_manager.process_files_pipeline_batch, pending_pipeline, project_id)
+    if pending_index:
+        background_tasks.add_task(index_files, pending_index)
+    if results:
+        invalidate_tree_cache()
     return {"uploaded": results, "errors": errors, "message": f"{len(results)} files uploaded successfully."}
 
 
+@router.post("/api/upload/multiple")
+async def upload_multiple_files(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    project_id: Optional[str] = None,
+):
+    """Web画面から複数ファイルを一括アップロードし、file_storeに登録する"""
+    project_id = _resolve_upload_project_id(project_id)
+    input_dir, pdf_dir = _prepare_upload_dirs()
+
+    from metadata_repository import MetadataRepository
+    repo = MetadataRepository()
+    
+    claimed: set = set()
+    sem = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+    async def _bound(index: int, file: UploadFile):
+        async with sem:
+            return await _save_and_register_upload(
+                index, file.filename,
+                lambda dest, max_size: _stream_upload_to_disk(file, dest, max_size),
+                input_dir, pdf_dir, repo, claimed,
+            )
+
+    # ファイルごとのディスク書き込み・ハッシュ・登録を並行実行（同時数はセマフォで制限）
+    outcomes = await asyncio.gather(*(_bound(i, f) for i, f in enumerate(files)))
+    return _finish_uploads(outcomes, background_tasks, project_id)
+
+
+@router.post("/api/upload/stream")
+async def upload_stream(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    filename: str,
+    project_id: Optional[str] = None,
+):
+    """リクエストボディ（ファイル本体そのもの）を 1 ファイルとしてアップロードする
+
+    multipart の UploadFile は 1MiB を超えると一時ファイルに退避されるため、大きなファイルでは
+    一時ファイルへの書き込みと最終パスへのコピーで 2 回書き込むことになる。こちらは受信したチャンクを
+    そのまま最終パスに書き出す。レスポンス形式は /api/upload/multiple と同じ。
+    """
+    project_id = _resolve_upload_project_id(project_id)
+    input_dir, pdf_dir = _prepare_upload_dirs()
+
+    from metadata_repository import MetadataRepository
+    outcome = await _save_and_register_upload(
+        0, filename,
+        lambda dest, max_size: _stream_request_to_disk(request, dest, max_size),
+        input_dir, pdf_dir, MetadataRepository(), set(),
+    )
+    return _finish_uploads([outcome], background_tasks, project_id)
+
+
 @router.get("/api/files")
 def list_files():
     """アップロード済みファイル一覧"""
@@ -222,64 +453,98 @@ def list_files():
         raise HTTPException(status_code=500, detail="Failed to retrieve file list")
 
 
+def _safe_kb_join(rel_path: str) -> Optional[str]:
+    """KNOWLEDGE_BASE_DIR と相対パスを結合した絶対パスを返す。KB 外を指す場合は None。"""
+    from config import KNOWLEDGE_BASE_DIR
+    return safe_join(KNOWLEDGE_BASE_DIR, rel_path)
+
+
+# インライン表示するファイル種別（それ以外は添付ファイルとしてダウンロード）
+_VIEW_INLINE_MEDIA_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".md": "text/markdown; charset=utf-8",
+    ".txt": "text/plain; charset=utf-8",
+}
+
+
+def _stat_regular_file(path: Path) -> Optional[os.stat_result]:
+    """通常ファイルなら stat 結果を返す（存在しない・ディレクトリ等は None）"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+def _resolve_view_target(file_path: str) -> Tuple[Path, os.stat_result]:
+    """閲覧対象のパスとその stat 結果を解決する（ファイルシステムアクセスを含む同期処理）"""
+    from config import BASE_DIR
+
+    # パストラバーサル防止: KNOWLEDGE_BASE_DIR 配下か検証
+    target = _safe_kb_join(file_path)
+    if target is None:
+        raise HTTPException(status_code=403, detail="Access denied")
+    target_path = Path(target)
+
+    # KNOWLEDGE_BASE_DIR にない場合は input/ ディレクトリにフォールバック
+    st = _stat_regular_file(target_path)
+    if st is None:
+        # input/ 側も KB と同じく文字列正規化で配下判定する（リクエストごとの resolve() を避ける）
+        fallback = safe_join(os.path.join(BASE_DIR, "input"), file_path)
+        st = _stat_regular_file(Path(fallback)) if fallback is not None else None
+        if st is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        target_path = Path(fallback)
+    return target_path, st
+
+
+# 同名ファイルの上書き（テキスト再アップロード・OCR 結果の更新）があるため、ブラウザには毎回 ETag で
+# 再検証させる。変わっていなければ本文を送らず 304 で返す。認証付きなので共有キャッシュには載せない
+_VIEW_CACHE_CONTROL = "private, no-cache"
+
+
+def _file_etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match（カンマ区切り・弱い ETag・* を含みうる）が etag に一致するか"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
 @router.get("/api/files/view/{file_path:path}")
-async def view_file(file_path: str):
+async def view_file(file_path: str, request: Request):
     """ファイルを閲覧・ダウンロード"""
     try:
-        from config import KNOWLEDGE_BASE_DIR, BASE_DIR
-        kb_root = Path(KNOWLEDGE_BASE_DIR).resolve()
-        target_path = (kb_root / file_path).resolve()
-        
-        # パストラバーサル防止: KNOWLEDGE_BASE_DIR 配下か検証
-        try:
-            target_path.relative_to(kb_root)
-        except ValueError:
-            raise HTTPException(status_code=403, detail="Access denied")
-           
-        # KNOWLEDGE_BASE_DIR にない場合は input/ ディレクトリにフォールバック
-        if not target_path.exists():
-            input_path = (Path(BASE_DIR) / "input" / file_path).resolve()
-            if input_path.exists():
-                target_path = input_path
-            else:
-                raise HTTPException(status_code=404, detail="File not found")
-            
-        IMAGE_MIMES = {
-            ".png": "image/png",
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".gif": "image/gif",
-            ".webp": "image/webp",
-        }
-        headers = {}
-        suffix = target_path.suffix.lower()
-        if suffix == ".pdf":
-            media_type = "application/pdf"
-            from urllib.parse import quote
-            safe_name = quote(target_path.name)
-            headers["Content-Disposition"] = f"inline; filename*=utf-8''{safe_name}"
-        elif suffix in IMAGE_MIMES:
-            media_type = IMAGE_MIMES[suffix]
-            from urllib.parse import quote
-            safe_name = quote(target_path.name)
-            headers["Content-Disposition"] = f"inline; filename*=utf-8''{safe_name}"
-        elif suffix == ".md":
-            media_type = "text/markdown; charset=utf-8"
-            from urllib.parse import quote
-            safe_name = quote(target_path.name)
-            headers["Content-Disposition"] = f"inline; filename*=utf-8''{safe_name}"
-        elif suffix == ".txt":
-            media_type = "text/plain; charset=utf-8"
-            from urllib.parse import quote
-            safe_name = quote(target_path.name)
-            headers["Content-Disposition"] = f"inline; filename*=utf-8''{safe_name}"
-        else:
-            media_type = "application/octet-stream"
-
-        if headers:
-            return FileResponse(target_path, media_type=media_type, headers=headers)
-        else:
-            return FileResponse(target_path, media_type=media_type, filename=target_path.name)
+        # resolve/stat はディスクアクセスを伴うためイベントループ外で実行
+        target_path, st = await asyncio.to_thread(_resolve_view_target, file_path)
+
+        etag = _file_etag(st)
+        headers = {"ETag": etag, "Cache-Control": _VIEW_CACHE_CONTROL}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        # stat 済みの結果を渡し、FileResponse 側での再 stat を省く（Range リクエストは FileResponse が処理）
+        media_type = _VIEW_INLINE_MEDIA_TYPES.get(target_path.suffix.lower())
+        return FileResponse(
+            target_path,
+            media_type=media_type or "application/octet-stream",
+            filename=target_path.name,
+            content_disposition_type="inline" if media_type else "attachment",
+            stat_result=st,
+            headers=headers,
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -287,20 +552,25 @@ async def view_file(file_path: str):
         raise HTTPException(status_code=404, detail="File viewing failed")
 
 
+def _delete_file_sync(file_path: str) -> dict:
+    """単一ファイルの削除本体（パス検証・物理削除・インデックス削除）"""
+    target = _safe_kb_join(file_path)
+    if target is None:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    if not os.path.exists(target):
+         raise HTTPException(status_code=404, detail="File not found")
+
+    from indexer import delete_file_completely
+    return delete_file_completely(str(file_path))
+
+
 @router.delete("/api/files/delete")
 async def delete_file(request: DeleteFileRequest):
     """ファイルを削除（物理ファイル＋インデックス）"""
     try:
-        from config import KNOWLEDGE_BASE_DIR
-        target_path = Path(KNOWLEDGE_BASE_DIR) / request.file_path
-        if not target_path.resolve().is_relative_to(Path(KNOWLEDGE_BASE_DIR).resolve()):
-            raise HTTPException(status_code=403, detail="Access denied")
-            
-        if not target_path.exists():
-             raise HTTPException(status_code=404, detail="File not found")
-        
-        from indexer import delete_file_completely
-        result = delete_file_completely(str(request.file_path))
+        result = await asyncio.to_thread(_delete_file_sync, request.file_path)
+        invalidate_tree_cache()
 
         if result["errors"]:
             logger.warning(f"Delete completed with errors: {result['errors']}")
@@ -320,30 +590,45 @@ async def delete_file(request: DeleteFileRequest):
         raise HTTPException(status_code=500, detail="Delete operation failed")
 
 
-@router.delete("/api/files/bulk-delete")
-async def bulk_delete_files(request: BulkDeleteRequest):
-    """複数ファイルを一括削除"""
+def _bulk_delete_sync(file_paths: List[str]) -> Tuple[int, List[str]]:
+    """複数ファイル削除の本体。(削除件数, エラーメッセージ一覧) を返す"""
+    from config import COLLECTION_NAME
+    from indexer import delete_file_completely, get_chroma_client
+    deleted_count = 0
+    errors = []
+
+    # コレクションはバッチ全体で一度だけ取得して使い回す
     try:
-        from config import KNOWLEDGE_BASE_DIR
-        from indexer import delete_file_completely
-        deleted_count = 0
-        errors = []
+        collection = get_chroma_client().get_or_create_collection(name=COLLECTION_NAME)
+    except Exception as e:
+        logger.warning(f"ChromaDB collection unavailable for bulk delete: {e}")
+        collection = None
 
-        for file_path in request.file_paths:
-            try:
-                target_path = Path(KNOWLEDGE_BASE_DIR) / file_path
-                if not target_path.resolve().is_relative_to(Path(KNOWLEDGE_BASE_DIR).resolve()):
-                    errors.append(f"{file_path}: Access denied")
-                    continue
+    for file_path in file_paths:
+        try:
+            if _safe_kb_join(file_path) is None:
+                errors.append(f"{file_path}: Access denied")
+                continue
+
+            result = delete_file_completely(str(file_path), collection=collection)
+            if result["errors"]:
+                logger.warning(f"Delete errors for {file_path}: {result['errors']}")
+            deleted_count += 1
+
+        except Exception as e:
+            logger.error(f"Failed to delete {file_path}: {e}", exc_info=True)
+            errors.append(f"{file_path}: {str(e)}")
 
-                result = delete_file_completely(str(file_path))
-                if result["errors"]:
-                    logger.warning(f"Delete errors for {file_path}: {result['errors']}")
-                deleted_count += 1
+    return deleted_count, errors
 
-            except Exception as e:
-                logger.error(f"Failed to delete {file_path}: {e}", exc_info=True)
-                errors.append(f"{file_path}: {str(e)}")
+
+@router.delete("/api/files/bulk-delete")
+async def bulk_delete_files(request: BulkDeleteRequest):
+    """複数ファイルを一括削除"""
+    try:
+        deleted_count, errors = await asyncio.to_thread(_bulk_delete_sync, request.file_paths)
+        if deleted_count:
+            invalidate_tree_cache()
 
         status = "success" if not errors else "partial"
         return {
@@ -356,46 +641,68 @@ async def bulk_delete_files(request: BulkDeleteRequest):
         raise HTTPException(status_code=500, detail="Bulk delete operation failed")
 
 
-def build_tree_recursive(current_path: Path, root_path: Path, ocr_progress_data: dict, supported_exts: set):
-    """ディレクトリツリーを再帰的に構築"""
-    rel_path = str(current_path.relative_to(root_path)) if current_path != root_path else ""
-    node = {
-        "name": current_path.name,
+_TREE_IMAGE_EXTS = frozenset({".png", ".jpg", ".jpeg", ".gif", ".webp"})
+
+
+# ディレクトリ走査（scandir / stat）を並列化するためのスレッドプール。
+# 同時に開くディレクトリ FD の上限も兼ねる
+_TREE_WALK_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+_tree_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=_TREE_WALK_WORKERS, thread_name_prefix="tree_walk"
+)
+
+
+def _new_tree_dir_node(name: str, rel_path: str) -> dict:
+    return {
+        "name": name,
         "type": "directory",
         "path": rel_path,
         "children": []
     }
-    
+
+
+def _scan_tree_level(current_path: str, node: dict, ocr_progress_data: dict, supported_exts: set) -> List[Tuple[str, dict]]:
+    """1 階層分を走査して node["children"] を埋め、未走査のサブディレクトリ (パス, ノード) を返す
+
+    os.scandir の DirEntry を使い、種別判定をディレクトリ読み取り時の情報で済ませる。
+    OCR 済み判定（同名 .md の有無）も同じ一覧から引くため、ファイルごとの追加 stat を行わない。
+    ディレクトリへのシンボリックリンクはたどらない（indexer の rglob と同じ扱い。循環リンクで走査が終わらなくなるのも防ぐ）。
+    """
+    rel_path = node["path"]
+    subdirs: List[Tuple[str, dict]] = []
     try:
-        if not current_path.exists():
-            return node
-            
-        items = sorted(current_path.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower()))
-        for item in items:
-            if item.name.startswith('.') or item.name == '__pycache__' or item.name == 'chroma_db':
-                continue
-                
-            if item.is_dir():
-                node["children"].append(build_tree_recursive(item, root_path, ocr_progress_data, supported_exts))
+        try:
+            with os.scandir(current_path) as it:
+                entries = list(it)
+        except FileNotFoundError:
+            return subdirs
+
+        names = {e.name for e in entries}
+        entries = [e for e in entries
+                   if not (e.name.startswith('.') or e.name == '__pycache__' or e.name == 'chroma_db')]
+        entries.sort(key=lambda e: (not e.is_dir(follow_symlinks=False), e.name.lower()))
+        for entry in entries:
+            name = entry.name
+            item_rel_path = os.path.join(rel_path, name) if rel_path else name
+            if entry.is_dir(follow_symlinks=False):
+                # 並び順を保つため、空ノードを先に置いておき後で中身を埋める
+                child = _new_tree_dir_node(name, item_rel_path)
+                node["children"].append(child)
+                subdirs.append((entry.path, child))
             else:
-                ext = item.suffix.lower()
-                IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
-                if ext not in supported_exts and ext != '.md' and ext not in IMAGE_EXTS: 
+                stem, ext = os.path.splitext(name)
+                ext = ext.lower()
+                if ext not in supported_exts and ext != '.md' and ext not in _TREE_IMAGE_EXTS: 
+                    continue
+                if not entry.is_file():  # ディレクトリへのシンボリックリンク・リンク切れ
                     continue
                 
-                item_rel_path = str(item.relative_to(root_path))
                 ocr_status = "none"
                 ocr_progress = None
                 
-                if ext == '.pdf':
-                    md_path = item.with_suffix('.md')
-                    if md_path.exists():
-                        ocr_status = "completed"
-                elif ext in IMAGE_EXTS:
-                    # 画像ファイルの場合、同名.mdがあればOCR完了
-                    md_path = item.with_suffix('.md')
-                    if md_path.exists():
-                        ocr_status = "completed"
+                # PDF・画像ファイルの場合、同名.mdがあればOCR完了
+                if (ext == '.pdf' or ext in _TREE_IMAGE_EXTS) and stem + '.md' in names:
+                    ocr_status = "completed"
                 
                 # DB のステータス参照（PDF・画像共通）
                 if item_rel_path in ocr_progress_data:
@@ -413,53 +720,181 @@ def build_tree_recursive(current_path: Path, root_path: Path, ocr_progress_data:
                             ocr_progress = {"error": progress_info.get("error")}
 
                 node["children"].append({
-                    "name": item.name,
+                    "name": name,
                     "type": "file",
                     "path": item_rel_path,
-                    "size": item.stat().st_size,
+                    "size": entry.stat().st_size,
                     "ocr_status": ocr_status,
                     "ocr_progress": ocr_progress
                 })
     except Exception as e:
         logger.error(f"Tree build error at {current_path}: {e}", exc_info=True)
-        
+    return subdirs
+
+
+def _fill_tree(pending: List[Tuple[str, dict]], ocr_progress_data: dict, supported_exts: set) -> None:
+    """明示的なスタックで pending 以下を深さ優先に走査する（再帰しないので深いツリーでもフレームを積まない）"""
+    stack = list(pending)
+    while stack:
+        path, node = stack.pop()
+        stack.extend(_scan_tree_level(path, node, ocr_progress_data, supported_exts))
+
+
+def _fill_tree_parallel(pending: List[Tuple[str, dict]], ocr_progress_data: dict, supported_exts: set,
+                        executor: concurrent.futures.Executor) -> None:
+    """pending 以下の各ディレクトリを 1 階層ずつ executor に投入して走査する
+
+    見つかったサブディレクトリはその場で次のタスクとして投入するため、特定のカテゴリだけが
+    巨大・深いツリーでも走査が 1 スレッドに偏らない。各タスクは自分のノードの children だけを
+    書き換え、並び順は親が置いた空ノードで保たれる。
+    """
+    def submit(path, node):
+        return executor.submit(_scan_tree_level, path, node, ocr_progress_data, supported_exts)
+
+    running = {submit(path, node) for path, node in pending}
+    while running:
+        done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+        for f in done:
+            running.update(submit(path, node) for path, node in f.result())
+
+
+def build_tree_recursive(current_path: Path, root_path: Path, ocr_progress_data: dict, supported_exts: set,
+                         executor: Optional[concurrent.futures.Executor] = None):
+    """ディレクトリツリーを構築
+
+    executor を渡すと、配下の各ディレクトリの走査を並列に実行する。
+    executor のスレッド上からは呼ばないこと（完了待ちでワーカーを塞ぐ）。
+    """
+    # config.SUPPORTED_EXTENSIONS はリストなので、ファイルごとの所属判定用に一度だけ frozenset にしておく
+    supported_exts = frozenset(supported_exts)
+    rel_path = str(current_path.relative_to(root_path)) if current_path != root_path else ""
+    node = _new_tree_dir_node(current_path.name, rel_path)
+    subdirs = _scan_tree_level(os.fspath(current_path), node, ocr_progress_data, supported_exts)
+    if executor is None:
+        _fill_tree(subdirs, ocr_progress_data, supported_exts)
+    else:
+        _fill_tree_parallel(subdirs, ocr_progress_data, supported_exts, executor)
     return node
 
 
+# ファイルツリーのキャッシュ: {"key": fingerprint, "ts": monotonic, "body": JSON bytes}
+# アップロード・削除時は _TREE_CACHE_EPOCH を進めて無効化する
+_TREE_CACHE: dict = {}
+_TREE_CACHE_EPOCH = 0
+_TREE_CACHE_LOCK = threading.Lock()
+# 同時に来たキャッシュミスのリクエストが揃って全走査しないよう、再構築は 1 本に絞る
+_TREE_BUILD_LOCK = threading.Lock()
+
+
+def invalidate_tree_cache():
+    """ファイルツリー・PDF 一覧のキャッシュを破棄（ファイル追加・削除後に呼ぶ）"""
+    global _TREE_CACHE_EPOCH
+    with _TREE_CACHE_LOCK:
+        _TREE_CACHE_EPOCH += 1
+        _TREE_CACHE.clear()
+    from routers.pdf import invalidate_pdf_list_cache
+    invalidate_pdf_list_cache()
+
+
+def _kb_dir_stamp(kb_root: Path) -> Optional[tuple]:
+    """KB ルートと直下ディレクトリ（カテゴリフォルダ）の mtime の組
+
+    OCR 結果の .md やドライブ同期のファイルはカテゴリフォルダ内に作られ、ルートの mtime は変わらないため、
+    1 階層下までの mtime を見てアップロード・削除以外の経路での追加も検知する。
+    """
+    try:
+        stamps = [("", kb_root.stat().st_mtime_ns)]
+        with os.scandir(kb_root) as it:
+            for entry in it:
+                if entry.is_dir():
+                    stamps.append((entry.name, entry.stat().st_mtime_ns))
+                else:
+                    stamps.append((entry.name, None))
+    except OSError:
+        return None
+    stamps.sort()
+    return tuple(stamps)
+
+
+def _tree_fingerprint(kb_root: Path, session) -> tuple:
+    """ツリー再構築が必要かを判定する安価な指紋（KB ルート・カテゴリフォルダの mtime と DB の最終更新）"""
+    from sqlalchemy import func
+    from database import DocumentVersion
+
+    root_stamp = _kb_dir_stamp(kb_root)
+    db_stamp = session.query(
+        func.max(DocumentVersion.updated_at), func.count(DocumentVersion.id)
+    ).one()
+    return (_TREE_CACHE_EPOCH, root_stamp, tuple(db_stamp))
+
+
+def _cached_tree_body(key: tuple) -> Optional[bytes]:
+    """指紋が一致し TTL 内のキャッシュ済みツリー JSON。無ければ None"""
+    from config import FILE_TREE_CACHE_TTL_SEC
+
+    cached = _TREE_CACHE.get("entry")
+    if cached and cached["key"] == key and time.monotonic() - cached["ts"] < FILE_TREE_CACHE_TTL_SEC:
+        return cached["body"]
+    return None
+
+
 @router.get("/api/files/tree")
 def get_files_tree():
     """ファイルツリーを取得"""
     try:
         from config import KNOWLEDGE_BASE_DIR, SUPPORTED_EXTENSIONS
+        from utils import json_codec
         # 新体系では Artifact から現在のストレージ上のパスとステータスの対応を取得
         from database import get_session, DocumentVersion, Artifact as DbArtifact
+        kb_root = Path(resolved_root(str(KNOWLEDGE_BASE_DIR)))
         session = get_session()
-        
-        # Artifact と DocumentVersion を結合して、original タイプのアーティファクトのステータスを取得
-        # storage_path は絶対パスなので注意
-        artifacts = session.query(DbArtifact, DocumentVersion).join(
-            DocumentVersion, DbArtifact.version_id == DocumentVersion.id
-        ).filter(DbArtifact.artifact_type == 'original').all()
-        
-        progress_data = {}
-        kb_root = Path(KNOWLEDGE_BASE_DIR).resolve()
-        for art, ver in artifacts:
+        try:
+            key = _tree_fingerprint(kb_root, session)
+        finally:
+            session.close()
+        body = _cached_tree_body(key)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
+
+        with _TREE_BUILD_LOCK:
+            # 待っている間に別リクエストが同じ指紋で構築済みならそれを返す
+            body = _cached_tree_body(key)
+            if body is not None:
+                return Response(content=body, media_type="application/json")
+
+            # storage_path は未解決の KB パスで保存されていることがあるため、実パスと両方で照合する
+            kb_prefixes = {str(kb_root) + os.sep, os.path.abspath(KNOWLEDGE_BASE_DIR) + os.sep}
+            session = get_session()
             try:
-                # storage_path を knowledge_base からの相対パスに変換
-                art_path = Path(art.storage_path).resolve()
-                rel_path = str(art_path.relative_to(kb_root))
-                progress_data[rel_path] = {
-                    "status": ver.ingest_status,
-                    "processed_pages": ver.processed_pages,
-                    "total_pages": ver.total_pages,
-                    "error": ver.error_message
-                }
-            except ValueError:
-                # KNOWLEDGE_BASE_DIR配下でないものはスキップ
-                continue
-                
-        session.close()
-        return build_tree_recursive(kb_root, kb_root, progress_data, SUPPORTED_EXTENSIONS)
+                # Artifact と DocumentVersion を結合して、original タイプのアーティファクトのステータスを取得
+                # storage_path は絶対パスなので注意
+                artifacts = session.query(DbArtifact, DocumentVersion).join(
+                    DocumentVersion, DbArtifact.version_id == DocumentVersion.id
+                ).filter(DbArtifact.artifact_type == 'original').all()
+
+                progress_data = {}
+                for art, ver in artifacts:
+                    # storage_path を knowledge_base からの相対パスに変換（KNOWLEDGE_BASE_DIR配下でないものはスキップ）
+                    art_path = os.path.abspath(art.storage_path)
+                    prefix = next((p for p in kb_prefixes if art_path.startswith(p)), None)
+                    if prefix is None:
+                        continue
+                    progress_data[art_path[len(prefix):]] = {
+                        "status": ver.ingest_status,
+                        "processed_pages": ver.processed_pages,
+                        "total_pages": ver.total_pages,
+                        "error": ver.error_message
+                    }
+            finally:
+                session.close()
+
+            tree = build_tree_recursive(kb_root, kb_root, progress_data, SUPPORTED_EXTENSIONS, executor=_tree_executor)
+            body = json_codec.dumps_bytes(tree)
+            with _TREE_CACHE_LOCK:
+                # 構築中に無効化された場合は古い指紋のまま保存しない
+                if key[0] == _TREE_CACHE_EPOCH:
+                    _TREE_CACHE["entry"] = {"key": key, "ts": time.monotonic(), "body": body}
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         logger.error(f"Failed to generate file tree: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="File tree generation failed")
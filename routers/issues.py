@@ -13,8 +13,8 @@ routers/issues.py — 課題因果グラフ API
 """
 import json
 import logging
+import re
 import uuid
-from datetime import datetime, timezone
 from typing import Literal, Optional
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
@@ -24,10 +24,25 @@ from sqlalchemy import text
 from database import get_db
 from config import ISSUE_MEMOS_DIR, ISSUE_ATTACHMENTS_DIR
 from issue_memo_indexer import IssueMemoIndexer
+from utils.timestamps import utc_now_iso
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Issues"])
 
+# Gemini 応答のマークダウンフェンス除去・キーワード分割用（リクエストごとにコンパイルしない）
+_CODE_FENCE_OPEN_RE = re.compile(r'^```(?:json)?\s*')
+_CODE_FENCE_CLOSE_RE = re.compile(r'\s*```$')
+_KEYWORD_SPLIT_RE = re.compile(r"[\s\u3000、。，．,.\-／/\(\)「」【】！？!?]+")
+_KEYWORD_STOPWORDS = frozenset({
+    "の","に","は","を","が","で","と","も","な","や","へ","から","まで","です",
+    "ます","した","して","します","ある","あり","いる","この","その","こと","もの",
+})
+
+
+def _strip_code_fence(raw: str) -> str:
+    """Gemini 応答の前後の ```json フェンスを除去する"""
+    return _CODE_FENCE_CLOSE_RE.sub('', _CODE_FENCE_OPEN_RE.sub('', raw)).strip()
+
 UPDATABLE_FIELDS = {
     "status", "priority", "action_next", "is_collapsed",
     "pos_x", "pos_y", "project_name", "title", "description",
@@ -97,7 +112,7 @@ class MemberCreateRequest(BaseModel):
 # ---------- ヘルパー ----------
 
 def _now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+    return utc_now_iso()
 
 
 def _render_issue_markdown(issue: dict, edges: list, db) -> str:
@@ -272,12 +287,8 @@ def _call_gemini_capture(raw_input: str, existing_issues: list) -> dict:
         config=config,
     )
 
-    raw = response.text.strip()
-
     # マークダウンフェンスを除去
-    import re as _re
-    raw = _re.sub(r'^```(?:json)?\s*', '', raw)
-    raw = _re.sub(r'\s*```$', '', raw).strip()
+    raw = _strip_code_fence(response.text.strip())
 
     # 先頭の { から末尾の } を切り出す（余計なテキストが前後にある場合の対策）
     start = raw.find('{')
@@ -425,10 +436,7 @@ def _generate_triage_questions(project_name: str, template_id: str, db) -> dict:
         config=config,
     )
 
-    import re as _re
-    raw = response.text.strip()
-    raw = _re.sub(r'^```(?:json)?\s*', '', raw)
-    raw = _re.sub(r'\s*```$', '', raw).strip()
+    raw = _strip_code_fence(response.text.strip())
     start = raw.find('{')
     end = raw.rfind('}')
     if start != -1 and end != -1:
@@ -698,13 +706,8 @@ def get_triage_questions(project_name: str, raw_input: str = "", db=Depends(get_
     # raw_input が渡されたとき、キーワードマッチで既存課題候補を動的に追加
     related_issues_options = []
     if raw_input.strip():
-        import re as _re
-        _STOP = frozenset({
-            "の","に","は","を","が","で","と","も","な","や","へ","から","まで","です",
-            "ます","した","して","します","ある","あり","いる","この","その","こと","もの",
-        })
-        tokens = _re.split(r"[\s\u3000、。，．,.\-／/\(\)「」【】！？!?]+", raw_input.strip())
-        keywords = [t for t in tokens if len(t) >= 2 and t not in _STOP][:8]
+        tokens = _KEYWORD_SPLIT_RE.split(raw_input.strip())
+        keywords = [t for t in tokens if len(t) >= 2 and t not in _KEYWORD_STOPWORDS][:8]
         if keywords:
             like_conds = " OR ".join(
                 [f"(title LIKE :kw{i} OR description LIKE :kw{i})" for i in range(len(keywords))]
@@ -1373,10 +1376,7 @@ def ai_infer_causation(req: AIInferCausationRequest, db=Depends(get_db)):
             future = executor.submit(call_gemini)
             response = future.result(timeout=30)
 
-        import re as _re
-        raw = response.text.strip()
-        raw = _re.sub(r'^```(?:json)?\s*', '', raw)
-        raw = _re.sub(r'\s*```$', '', raw).strip()
+        raw = _strip_code_fence(response.text.strip())
         start = raw.find('[')
         end = raw.rfind(']')
         if start != -1 and end != -1:
@@ -1478,10 +1478,7 @@ def health_check(project_name: str, db=Depends(get_db)):
             with concurrent.futures.ThreadPoolExecutor() as executor:
                 future = executor.submit(call_gemini)
                 response = future.result(timeout=30)
-            import re as _re
-            raw = response.text.strip()
-            raw = _re.sub(r'^```(?:json)?\s*', '', raw)
-            raw = _re.sub(r'\s*```$', '', raw).strip()
+            raw = _strip_code_fence(response.text.strip())
             s, e2 = raw.find('['), raw.rfind(']')
             if s != -1 and e2 != -1:
                 raw = raw[s:e2+1]
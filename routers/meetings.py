@@ -9,7 +9,6 @@ routers/meetings.py — 会議文字起こし API
   POST   /api/meetings/{id}/finalize    全チャンクを Gemini でサマリー生成
 """
 import logging
-from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
@@ -20,6 +19,8 @@ from sqlalchemy import text
 import config
 from database import get_db
 from gemini_client import get_client
+from utils.timestamps import utc_now_iso
+from routers.transcribe import read_audio_upload
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Meetings"])
@@ -28,7 +29,7 @@ router = APIRouter(tags=["Meetings"])
 # ===== ヘルパー =====
 
 def _now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+    return utc_now_iso()
 
 
 def _row_to_dict(row: Any) -> Dict[str, Any]:
@@ -124,9 +125,7 @@ async def receive_chunk(
     if not session:
         raise HTTPException(status_code=404, detail="会議セッションが見つかりません")
 
-    audio_bytes = await file.read()
-    if not audio_bytes:
-        raise HTTPException(status_code=400, detail="音声データが空です")
+    audio_bytes = await read_audio_upload(file)
 
     mime_type = file.content_type or "audio/webm"
 
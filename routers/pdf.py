@@ -1,11 +1,29 @@
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse, Response
 from pathlib import Path
+import asyncio
 import logging
+import os
+import re
+import stat
+import time
+import urllib.parse
+from typing import Optional
+
+from utils.fs import safe_join
+
+# ハンドラ内で毎回 import しないよう起動時に一度だけ読み込む（Google API ライブラリが無い環境では None）
+try:
+    import drive_sync as drive_sync_lib
+except ImportError:
+    drive_sync_lib = None
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["PDF"])
 
+# file_id（ハッシュ）として受け付ける形式
+_FILE_ID_RE = re.compile(r"^[a-zA-Z0-9_\-]{8,64}$")
+
 # 画像拡張子とMIMEタイプのマッピング
 IMAGE_MIME_TYPES = {
     ".png": "image/png",
@@ -20,22 +38,99 @@ def _get_media_type(path: Path) -> str:
     suffix = path.suffix.lower()
     return IMAGE_MIME_TYPES.get(suffix, "application/pdf")
 
+
+def _stat_file(path) -> Optional[os.stat_result]:
+    """通常ファイルなら stat 結果、存在しない・ディレクトリ等なら None（exists() + 再 stat の代わり）"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+def _file_response(path: Path, media_type: str, headers: dict = None,
+                   st: Optional[os.stat_result] = None) -> FileResponse:
+    """stat 結果を添えた FileResponse を返す
+
+    FileResponse に stat_result を渡すと、送信時のスレッドプール経由の再 stat を省ける。
+    存在確認で取得済みの stat があれば st に渡して使い回す。
+    Range リクエスト（PDF ビューアの部分取得）は FileResponse がそのまま処理する。
+    """
+    if st is None:
+        st = os.stat(path)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=st)
+
+
+# PDF ページ数キャッシュ: パス → (mtime_ns, size, ページ数)
+_PAGE_COUNT_CACHE: dict = {}
+_PAGE_COUNT_CACHE_MAX = 1024
+
+
+def _pdf_page_count(path: Path, st) -> int:
+    """PDF のページ数を返す（PyMuPDF → pypdf フォールバック）
+
+    同じファイル（mtime・サイズが一致）への再問い合わせはキャッシュから返す。
+    """
+    key = str(path)
+    cached = _PAGE_COUNT_CACHE.get(key)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+
+    try:
+        import fitz  # PyMuPDF
+        with fitz.open(key) as doc:
+            count = doc.page_count
+    except Exception as e:
+        logger.warning(f"PyMuPDF page count failed for {path}: {e}. Trying pypdf fallback.")
+        import pypdf
+        count = len(pypdf.PdfReader(key).pages)
+
+    if len(_PAGE_COUNT_CACHE) >= _PAGE_COUNT_CACHE_MAX:
+        _PAGE_COUNT_CACHE.clear()
+    _PAGE_COUNT_CACHE[key] = (st.st_mtime_ns, st.st_size, count)
+    return count
+
 # ─── 重要: 静的パスを動的パス /{file_id} より先に定義する ──────────────────────
 # FastAPI はルートを登録順にマッチするため、
 # /api/pdf/list, /api/pdf/by-path, /api/pdf/metadata/{file_id} を先に定義しないと
 # "list", "by-path", "metadata" が {file_id} として解釈されてしまう
 
+# /api/pdf/list の結果キャッシュ: {"key": (max(updated_at), 件数), "ts": monotonic, "items": list}
+_PDF_LIST_CACHE: dict = {}
+_PDF_LIST_TTL = 30.0
+
+
+def invalidate_pdf_list_cache():
+    """PDF 一覧キャッシュを破棄（アップロード・削除後に呼ぶ）"""
+    _PDF_LIST_CACHE.clear()
+
+
 @router.get("/api/pdf/list")
 def list_pdfs():
-    """保存済みPDFの一覧を取得"""
+    """保存済みPDFの一覧を取得
+
+    ポーリングで繰り返し呼ばれるため、対象行の (最終更新時刻, 件数) が変わらず
+    TTL 内であれば前回の一覧をそのまま返す。
+    """
+    from sqlalchemy import func
     from database import get_session, LegacyDocument
     session = get_session()
     try:
-        docs = session.query(LegacyDocument).filter(
+        pdf_filter = (
             LegacyDocument.source_pdf_hash.isnot(None),
-            LegacyDocument.file_type == "pdf"
-        ).all()
-        return [{"file_id": d.source_pdf_hash, "filename": d.filename} for d in docs]
+            LegacyDocument.file_type == "pdf",
+        )
+        key = tuple(session.query(
+            func.max(LegacyDocument.updated_at), func.count(LegacyDocument.id)
+        ).filter(*pdf_filter).one())
+        cached = _PDF_LIST_CACHE.get("entry")
+        if cached and cached["key"] == key and time.monotonic() - cached["ts"] < _PDF_LIST_TTL:
+            return cached["items"]
+
+        rows = session.query(LegacyDocument.source_pdf_hash, LegacyDocument.filename).filter(*pdf_filter).all()
+        items = [{"file_id": file_id, "filename": filename} for file_id, filename in rows]
+        _PDF_LIST_CACHE["entry"] = {"key": key, "ts": time.monotonic(), "items": items}
+        return items
     except Exception as e:
         logger.error(f"Failed to list PDFs: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="PDF list retrieval failed")
@@ -47,48 +142,44 @@ def list_pdfs():
 async def get_pdf_by_path(p: str):
     """パス指定によるPDF/画像の配信（パストラバーサル防止措置付き）"""
     from config import KNOWLEDGE_BASE_DIR, PDF_STORAGE_DIR
-    import urllib.parse
 
     decoded_path = urllib.parse.unquote(p)
-    kb_dir = Path(KNOWLEDGE_BASE_DIR).resolve()
-    target_path = (kb_dir / decoded_path).resolve()
-
-    # パストラバーサル防止: KNOWLEDGE_BASE_DIR配下か検証
-    try:
-        target_path.relative_to(kb_dir)
-    except ValueError:
+    # パストラバーサル防止: KNOWLEDGE_BASE_DIR配下か検証（ルートは解決済みのものを使い回し、文字列正規化で判定）
+    target = safe_join(KNOWLEDGE_BASE_DIR, decoded_path)
+    if target is None:
         raise HTTPException(status_code=403, detail="Forbidden path access")
 
     # PDF と画像ファイルのみ許可
     allowed_suffixes = {".pdf"} | set(IMAGE_MIME_TYPES.keys())
+    target_path = Path(target)
     if target_path.suffix.lower() not in allowed_suffixes:
         raise HTTPException(status_code=400, detail="Only PDF or image files are allowed")
 
-    if not target_path.exists():
-        # PDF_STORAGE_DIR からもフォールバック検索
-        storage_path = Path(PDF_STORAGE_DIR) / decoded_path
-        if storage_path.exists():
-            target_path = storage_path
-        else:
+    st = _stat_file(target_path)
+    if st is None:
+        # PDF_STORAGE_DIR からもフォールバック検索（こちらも配下のみ）
+        storage_path = safe_join(PDF_STORAGE_DIR, decoded_path)
+        st = _stat_file(storage_path) if storage_path is not None else None
+        if st is None:
             raise HTTPException(status_code=404, detail="File not found")
+        target_path = Path(storage_path)
 
     filename = urllib.parse.quote(target_path.name)
     media_type = _get_media_type(target_path)
-    return FileResponse(
+    return _file_response(
         target_path,
-        media_type=media_type,
-        headers={"Content-Disposition": f"inline; filename*=UTF-8''{filename}"}
+        media_type,
+        headers={"Content-Disposition": f"inline; filename*=UTF-8''{filename}"},
+        st=st,
     )
 
 
 @router.get("/api/pdf/metadata/{file_id}")
 async def get_pdf_metadata(file_id: str):
     """PDFメタデータ取得"""
-    import pypdf
-    import re
     from config import PDF_STORAGE_DIR
 
-    if not re.match(r"^[a-zA-Z0-9_\-]{8,64}$", file_id):
+    if not _FILE_ID_RE.match(file_id):
         raise HTTPException(status_code=400, detail="Invalid file_id format")
 
     target_path = Path(PDF_STORAGE_DIR) / f"{file_id}.pdf"
@@ -124,11 +215,12 @@ async def get_pdf_metadata(file_id: str):
         }
 
     try:
-        reader = pypdf.PdfReader(str(target_path))
+        st = target_path.stat()
+        page_count = await asyncio.to_thread(_pdf_page_count, target_path, st)
         return {
             "file_id": file_id,
-            "page_count": len(reader.pages),
-            "size_bytes": target_path.stat().st_size
+            "page_count": page_count,
+            "size_bytes": st.st_size
         }
     except Exception as e:
         logger.error(f"PDF metadata error for {file_id}: {e}", exc_info=True)
@@ -147,8 +239,7 @@ async def get_pdf(file_id: str):
       5. LegacyDocument.file_path から直接サーブ
       6. input/ ディレクトリを検索（アップロード直後）
     """
-    import re
-    if not re.match(r"^[a-zA-Z0-9_\-]{8,64}$", file_id):
+    if not _FILE_ID_RE.match(file_id):
         raise HTTPException(status_code=400, detail="Invalid file_id format")
 
     from database import get_session, Artifact, DocumentVersion, LegacyDocument
@@ -172,25 +263,26 @@ async def get_pdf(file_id: str):
                 drive_id = artifact.drive_file_id
 
                 # ローカルに実体あり（PDF・画像どちらも対応）
-                if local_path.exists():
-                    return FileResponse(local_path, media_type=_get_media_type(local_path))
+                st = _stat_file(local_path)
+                if st is not None:
+                    return _file_response(local_path, _get_media_type(local_path), st=st)
 
                 # キャッシュ確認（PDF）
                 cache_path = Path(PDF_CACHE_DIR) / f"{file_id}.pdf"
-                if cache_path.exists():
-                    return FileResponse(cache_path, media_type="application/pdf")
+                st = _stat_file(cache_path)
+                if st is not None:
+                    return _file_response(cache_path, "application/pdf", st=st)
 
                 # Google Drive からダウンロード
-                if drive_id:
+                if drive_id and drive_sync_lib is not None:
                     try:
-                        from drive_sync import get_drive_service, download_file
-                        service = get_drive_service()
+                        service = drive_sync_lib.get_drive_service()
                         logger.info(f"Downloading PDF from Drive: {file_id} (DriveID: {drive_id})")
-                        content = download_file(service, drive_id, f"{file_id}.pdf")
+                        content = drive_sync_lib.download_file(service, drive_id, f"{file_id}.pdf")
                         cache_path.parent.mkdir(parents=True, exist_ok=True)
                         with open(cache_path, "wb") as f:
                             f.write(content)
-                        return FileResponse(cache_path, media_type="application/pdf")
+                        return _file_response(cache_path, "application/pdf")
                     except Exception as e:
                         logger.error(f"Drive download failed for {file_id}: {e}")
                         # Drive 失敗はフォールバックに任せる
@@ -198,15 +290,17 @@ async def get_pdf(file_id: str):
         # ── 解決策2: PDF_STORAGE_DIR 直下のハッシュ名ファイル（PDF・画像両対応）──
         # まず .pdf を試す
         legacy_pdf_path = Path(PDF_STORAGE_DIR) / f"{file_id}.pdf"
-        if legacy_pdf_path.exists():
-            return FileResponse(legacy_pdf_path, media_type="application/pdf")
+        st = _stat_file(legacy_pdf_path)
+        if st is not None:
+            return _file_response(legacy_pdf_path, "application/pdf", st=st)
 
         # 次に画像拡張子を試す
         for img_ext, img_mime in IMAGE_MIME_TYPES.items():
             img_path = Path(PDF_STORAGE_DIR) / f"{file_id}{img_ext}"
-            if img_path.exists():
+            st = _stat_file(img_path)
+            if st is not None:
                 logger.info(f"Found image file in storage: {img_path}")
-                return FileResponse(img_path, media_type=img_mime)
+                return _file_response(img_path, img_mime, st=st)
 
         # ── 解決策3: LegacyDocument から file_path を直接検索 ────────────────
         # source_pdf_hash = file_id で登録されているケース
@@ -215,15 +309,17 @@ async def get_pdf(file_id: str):
         ).first()
         if legacy_doc and legacy_doc.file_path:
             legacy_doc_path = Path(legacy_doc.file_path)
-            if legacy_doc_path.exists():
-                return FileResponse(legacy_doc_path, media_type=_get_media_type(legacy_doc_path))
+            st = _stat_file(legacy_doc_path)
+            if st is not None:
+                return _file_response(legacy_doc_path, _get_media_type(legacy_doc_path), st=st)
             # ファイルパスが存在しない場合、元ファイル名で input/ を探す
             if legacy_doc.filename:
                 from config import BASE_DIR
                 input_path = Path(BASE_DIR) / "input" / legacy_doc.filename
-                if input_path.exists():
+                st = _stat_file(input_path)
+                if st is not None:
                     logger.info(f"Found file in input dir: {input_path}")
-                    return FileResponse(input_path, media_type=_get_media_type(input_path))
+                    return _file_response(input_path, _get_media_type(input_path), st=st)
 
         # ── 解決策4: input/ ディレクトリを検索（アップロード直後でパイプライン未完了の場合）─
         from config import KNOWLEDGE_BASE_DIR, BASE_DIR
@@ -231,14 +327,14 @@ async def get_pdf(file_id: str):
         if input_dir.exists():
             # PDF と画像両方を検索
             search_extensions = ["*.pdf"] + [f"*{ext}" for ext in IMAGE_MIME_TYPES.keys()]
-            import hashlib
+            from utils.file_hash import cached_sha256_file
             for pattern in search_extensions:
                 for found_file in input_dir.glob(pattern):
                     try:
-                        h = hashlib.sha256(found_file.read_bytes()).hexdigest()
+                        h = cached_sha256_file(found_file)
                         if h == file_id or h.startswith(file_id) or file_id.startswith(h[:16]):
                             logger.info(f"Found file in input dir by hash: {found_file}")
-                            return FileResponse(found_file, media_type=_get_media_type(found_file))
+                            return _file_response(found_file, _get_media_type(found_file))
                     except Exception:
                         pass
 
@@ -247,11 +343,11 @@ async def get_pdf(file_id: str):
         for search_dir in [Path(PDF_STORAGE_DIR), Path(KNOWLEDGE_BASE_DIR)]:
             for pdf_file in search_dir.rglob(f"*{file_id}*.pdf"):
                 if pdf_file.exists():
-                    return FileResponse(pdf_file, media_type="application/pdf")
+                    return _file_response(pdf_file, "application/pdf")
             for img_ext in IMAGE_MIME_TYPES.keys():
                 for img_file in search_dir.rglob(f"*{file_id}*{img_ext}"):
                     if img_file.exists():
-                        return FileResponse(img_file, media_type=_get_media_type(img_file))
+                        return _file_response(img_file, _get_media_type(img_file))
 
     finally:
         session.close()
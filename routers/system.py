@@ -1,11 +1,27 @@
 from fastapi import APIRouter, Request, HTTPException, UploadFile, File
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import os
+import re
 import time
+import asyncio
+import concurrent.futures
 import logging
+import stat
+import tempfile
+import threading
 import traceback
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+from utils.json_response import FastJSONResponse
+
+# ヘルスチェックのたびに import しないよう起動時に一度だけ読み込む（Google API ライブラリが無い環境では None）
+try:
+    import drive_sync as drive_sync_lib
+except ImportError:
+    drive_sync_lib = None
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["System & Settings"])
@@ -28,93 +44,129 @@ class GeminiKeyRequest(BaseModel):
 
 # ========== エンドポイント ==========
 
-@router.get("/api/health")
-def health_check():
-    """
-    外形監視用ヘルスチェック。
-    ChromaDB・SQLite・Gemini API・Google Drive・ファイルストレージの疎通を確認する。
+# ---------- ヘルスチェック用プローブ ----------
+# 監視ツールから高頻度で叩かれるため、サブシステムごとに結果を TTL キャッシュする。
+# Gemini の embed は API クォータを消費するので長め、ローカル DB は短めに設定。
+_HEALTH_TTLS = {
+    "chromadb": 5.0,
+    "sqlite": 5.0,
+    "gemini_api": 60.0,
+    "google_drive": 30.0,
+    "file_storage": 30.0,
+}
+# name -> (取得時刻 monotonic, ステータス文字列)
+_HEALTH_CACHE: Dict[str, Tuple[float, str]] = {}
+# name -> 直近の正常ステータス（プローブ失敗時の stale フォールバック用）
+_HEALTH_LAST_GOOD: Dict[str, str] = {}
+_HEALTH_LOCK = threading.Lock()
+
+
+def _check_chromadb() -> str:
+    from retriever import get_collection
+    count = get_collection().count()
+    return f"ok ({count} chunks)"
+
+
+def _check_sqlite() -> str:
+    # ORM Session を作らず、プールから接続を借りて SELECT 1 を投げるだけにする
+    from database import engine
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+    return "ok"
+
+
+def _check_gemini() -> str:
+    """軽量リクエスト（'ping' の embed）で疎通確認"""
+    from gemini_client import get_client
+    from config import EMBEDDING_MODEL
+    get_client().models.embed_content(model=EMBEDDING_MODEL, contents='ping')
+    return "ok"
+
+
+def _check_drive() -> str:
+    if drive_sync_lib is None:
+        return "not available: drive_sync モジュールがありません"
+    drive_info = drive_sync_lib.get_auth_status_cached()
+    if drive_info.get("authenticated"):
+        expires_h = drive_info.get("expires_in_hours")
+        expires_str = f", expires_in={expires_h}h" if expires_h is not None else ""
+        return f"ok{expires_str}"
+    return f"not authenticated: {drive_info.get('message', '')}"
+
+
+def _check_file_storage() -> str:
+    # 件数だけ必要なので、メタデータ付きのリストを作る scan_files() ではなく数えるだけにする
+    from indexer import count_md_files
+    return f"ok ({count_md_files()} files)"
+
+
+async def _probe(name: str, fn: Callable[[], str], ttl: float) -> str:
+    """TTL 内ならキャッシュ値を返し、期限切れなら fn() をワーカースレッドで実行して更新する。
+
+    fn() が例外を出した場合、過去の正常値があれば "degraded (stale: ...)" を返す。
     """
-    from datetime import datetime as _dt, timezone
-    import sys
-
-    print("HEALTH CHECK STARTING...", file=sys.stderr)
-
-    status = {
-        "server": "ok",
-        "chromadb": "unknown",
-        "sqlite": "unknown",
-        "gemini_api": "unknown",
-        "google_drive": "unknown",
-        "file_storage": "unknown",
-    }
+    now = time.monotonic()
+    with _HEALTH_LOCK:
+        cached = _HEALTH_CACHE.get(name)
+    if cached and now - cached[0] < ttl:
+        return cached[1]
 
-    # 1. ChromaDB確認
-    from retriever import get_collection
     try:
-        print("Checking ChromaDB...", file=sys.stderr)
-        collection = get_collection()
-        count = collection.count()
-        status["chromadb"] = f"ok ({count} chunks)"
-        print("ChromaDB OK", file=sys.stderr)
+        value = await asyncio.to_thread(fn)
+        with _HEALTH_LOCK:
+            _HEALTH_LAST_GOOD[name] = value
     except Exception as e:
-        status["chromadb"] = f"error: {e}"
+        logger.warning(f"[health] {name} probe failed: {e}")
+        with _HEALTH_LOCK:
+            last_good = _HEALTH_LAST_GOOD.get(name)
+        value = f"degraded (stale: {last_good}; error: {e})" if last_good else f"error: {e}"
 
-    # 2. SQLite確認
-    from database import get_session
-    try:
-        print("Checking SQLite...", file=sys.stderr)
-        session = get_session()
-        from sqlalchemy import text
-        session.execute(text("SELECT 1"))
-        session.close()
-        status["sqlite"] = "ok"
-        print("SQLite OK", file=sys.stderr)
-    except Exception as e:
-        status["sqlite"] = f"error: {e}"
+    with _HEALTH_LOCK:
+        _HEALTH_CACHE[name] = (time.monotonic(), value)
+    return value
 
-    # 3. Gemini API確認（軽量リクエスト）
-    try:
-        print("Checking Gemini API...", file=sys.stderr)
-        from gemini_client import get_client
-        from config import EMBEDDING_MODEL
-        client = get_client()
-        client.models.embed_content(
-            model=EMBEDDING_MODEL,
-            contents='ping'
-        )
-        status["gemini_api"] = "ok"
-        print("Gemini API OK", file=sys.stderr)
-    except Exception as e:
-        status["gemini_api"] = f"error: {e}"
 
-    # 4. Google Drive認証確認
-    try:
-        print("Checking Google Drive...", file=sys.stderr)
-        from drive_sync import get_auth_status
-        drive_info = get_auth_status()
-        if drive_info.get("authenticated"):
-            expires_h = drive_info.get("expires_in_hours")
-            expires_str = f", expires_in={expires_h}h" if expires_h is not None else ""
-            status["google_drive"] = f"ok{expires_str}"
-        else:
-            status["google_drive"] = f"not authenticated: {drive_info.get('message', '')}"
-        print("Google Drive OK", file=sys.stderr)
-    except Exception as e:
-        status["google_drive"] = f"error: {e}"
+_HEALTH_PROBES = (
+    ("chromadb", _check_chromadb),
+    ("sqlite", _check_sqlite),
+    ("gemini_api", _check_gemini),
+    ("google_drive", _check_drive),
+    ("file_storage", _check_file_storage),
+)
 
-    # 5. ファイルストレージ確認
-    try:
-        print("Checking File Storage...", file=sys.stderr)
-        from indexer import scan_files
-        files = scan_files()
-        status["file_storage"] = f"ok ({len(files)} files)"
-        print("File Storage OK", file=sys.stderr)
-    except Exception as e:
-        status["file_storage"] = f"error: {e}"
+
+@router.get("/api/livez")
+def liveness():
+    """
+    liveness プローブ用。プロセスが応答できることだけを返し、外部依存には一切触れない。
+    （通常は server.py の ASGI ショートカットが先に応答するため、ここには到達しない）
+    """
+    return {"status": "ok"}
+
+
+@router.get("/api/readyz")
+@router.get("/api/health")
+async def health_check():
+    """
+    readiness / 外形監視用ヘルスチェック（/api/health は互換のため残す）。
+    ChromaDB・SQLite・Gemini API・Google Drive・ファイルストレージの疎通を確認する。
+    各プローブの結果は _HEALTH_TTLS の秒数だけキャッシュされる。
+    """
+    # 各プローブは I/O 待ちが中心なので並行実行し、所要時間を合計ではなく最大値に抑える
+    results = await asyncio.gather(
+        *(_probe(name, fn, _HEALTH_TTLS[name]) for name, fn in _HEALTH_PROBES),
+        return_exceptions=True,
+    )
+    status = {"server": "ok"}
+    for (name, _), res in zip(_HEALTH_PROBES, results):
+        status[name] = f"error: {res}" if isinstance(res, BaseException) else res
 
     # 全体ステータス判定
     error_count = sum(1 for v in status.values() if str(v).startswith("error"))
-    warn_count = sum(1 for v in status.values() if "not authenticated" in str(v) or v == "unknown")
+    warn_count = sum(
+        1 for v in status.values()
+        if "not authenticated" in str(v) or str(v).startswith("degraded") or v == "unknown"
+    )
     if error_count > 0:
         overall = "error"
     elif warn_count > 0:
@@ -125,11 +177,12 @@ def health_check():
     result = {
         "status": overall,
         "services": status,
-        "timestamp": _dt.now(timezone.utc).isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
     }
 
     all_ok = overall == "ok"
-    return JSONResponse(
+    # 明示的に返すレスポンスは default_response_class を通らないため、json_codec 版を直接使う
+    return FastJSONResponse(
         content=result,
         status_code=200 if all_ok or overall == "degraded" else 503
     )
@@ -171,7 +224,18 @@ def get_ocr_status():
             # エラー系: 30分以内のみ表示
             ERROR_STATUSES = ["failed", "enrichment_failed"]
 
-            docs = session.query(LegacyDocument).filter(
+            # ORM オブジェクトではなく表示に必要な列だけを取得する
+            docs = session.query(
+                LegacyDocument.file_path,
+                LegacyDocument.filename,
+                LegacyDocument.status,
+                LegacyDocument.source_pdf_hash,
+                LegacyDocument.processed_pages,
+                LegacyDocument.total_pages,
+                LegacyDocument.error_message,
+                LegacyDocument.estimated_remaining,
+                LegacyDocument.updated_at,
+            ).filter(
                 or_(
                     # 本当に処理中のステータスは時間制限なし
                     LegacyDocument.status.in_(TRULY_ACTIVE_STATUSES),
@@ -183,25 +247,36 @@ def get_ocr_status():
                 )
             ).order_by(LegacyDocument.updated_at.desc()).limit(20).all()
 
+            # DocumentVersion は 1 回の IN クエリでまとめて引く（行ごとの問い合わせをしない）
+            hashes = {doc.source_pdf_hash for doc in docs if doc.source_pdf_hash}
+            versions = {}
+            if hashes:
+                versions = {
+                    vh: (ingest_status, dv_error)
+                    for vh, ingest_status, dv_error in session.query(
+                        DocumentVersion.version_hash,
+                        DocumentVersion.ingest_status,
+                        DocumentVersion.error_message,
+                    ).filter(DocumentVersion.version_hash.in_(hashes))
+                }
+
             jobs = []
             for doc in docs:
                 # DocumentVersion から詳細ステージを補完
                 ingest_status = doc.status
                 error_message = doc.error_message
-                if doc.source_pdf_hash:
-                    dv = session.query(DocumentVersion).filter(
-                        DocumentVersion.version_hash == doc.source_pdf_hash
-                    ).first()
-                    if dv:
-                        # ingest_status が LegacyDocument より詳細な場合は優先
-                        if dv.ingest_status not in (None, "accepted", "searchable"):
-                            ingest_status = dv.ingest_status
-                        if dv.error_message and not error_message:
-                            error_message = dv.error_message
+                dv = versions.get(doc.source_pdf_hash) if doc.source_pdf_hash else None
+                if dv:
+                    dv_status, dv_error = dv
+                    # ingest_status が LegacyDocument より詳細な場合は優先
+                    if dv_status not in (None, "accepted", "searchable"):
+                        ingest_status = dv_status
+                    if dv_error and not error_message:
+                        error_message = dv_error
 
                 jobs.append({
                     "file_path":          doc.file_path,
-                    "filename":           doc.filename if hasattr(doc, 'filename') else Path(doc.file_path).name,
+                    "filename":           doc.filename or Path(doc.file_path).name,
                     "status":             ingest_status,
                     "processed_pages":    doc.processed_pages or 0,
                     "total_pages":        doc.total_pages or 1,
@@ -261,63 +336,265 @@ def dismiss_ocr_status(file_path: str):
         logger.error(f"Failed to dismiss OCR status for {file_path}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to dismiss OCR status")
 
+# インデックス再構築の多重実行抑止。
+# 同じ force 指定の再構築が実行中なら新たに走らせずその結果を共有し、異なる指定同士は直列に実行する
+_INDEX_RUN_LOCK = threading.Lock()
+_INDEX_INFLIGHT_LOCK = threading.Lock()
+_INDEX_INFLIGHT: Dict[bool, "concurrent.futures.Future"] = {}
+
+
+def _build_index_single_flight(force: bool) -> dict:
+    """build_index を実行する。同じ force の実行が進行中ならその結果を待って返す"""
+    with _INDEX_INFLIGHT_LOCK:
+        fut = _INDEX_INFLIGHT.get(force)
+        owner = fut is None
+        if owner:
+            fut = concurrent.futures.Future()
+            _INDEX_INFLIGHT[force] = fut
+    if owner:
+        try:
+            from indexer import build_index
+            with _INDEX_RUN_LOCK:
+                fut.set_result(build_index(force_rebuild=force))
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with _INDEX_INFLIGHT_LOCK:
+                _INDEX_INFLIGHT.pop(force, None)
+    return fut.result()
+
+
 @router.post("/api/index", response_model=IndexResponse)
 def rebuild_index(force: bool = False):
     """インデックスを再構築"""
     try:
-        from indexer import build_index
-        stats = build_index(force_rebuild=force)
+        stats = _build_index_single_flight(force)
         return IndexResponse(**stats)
     except Exception as e:
         logger.error(f"Failed to rebuild index: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Index rebuild failed")
 
-@router.get("/api/system/export-source")
-async def export_source():
-    """ソースコード一式をZIPでダウンロード"""
-    try:
-        import zipfile
-        from io import BytesIO
-        from datetime import datetime
-        
-        EXCLUDE_DIRS = {
-            'node_modules', 'venv', '.git', '__pycache__', 
-            'knowledge_base', 'chroma_db', '.next', '.idea', '.vscode',
-            'brain', '.gemini', 'artifacts'
-        }
-        EXCLUDE_FILES = {
-            '.DS_Store', 'ocr_progress.json', 'file_index.json', 'credentials.json'
-        }
-        
-        zip_buffer = BytesIO()
-        # routers ディレクトリの親をベースディレクトリにする
-        base_dir = Path(__file__).parent.parent.resolve()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(base_dir):
-                dirs[:] = [d for d in dirs if d not in EXCLUDE_DIRS]
-                
-                for file in files:
-                    if file in EXCLUDE_FILES or file.endswith('.webp') or file.endswith('.png'):
+_EXPORT_EXCLUDE_DIRS = frozenset({
+    'node_modules', 'venv', '.git', '__pycache__',
+    'knowledge_base', 'chroma_db', '.next', '.idea', '.vscode',
+    'brain', '.gemini', 'artifacts'
+})
+_EXPORT_EXCLUDE_FILES = frozenset({
+    '.DS_Store', 'ocr_progress.json', 'file_index.json', 'credentials.json'
+})
+_EXPORT_CHUNK_SIZE = 1024 * 1024
+# 開発者向けダウンロードなので圧縮率より CPU を優先（level 1 は level 6 の数分の一の CPU で済む）
+_EXPORT_COMPRESSLEVEL = 1
+_EXPORT_YIELD_MIN = 64 * 1024  # これ以上溜まったらクライアントへ送る
+# このサイズ以下の deflate 対象はスレッドプールで並列に圧縮する（丸ごとメモリに載せるため上限を設ける）
+_EXPORT_PARALLEL_MAX_BYTES = 4 * 1024 * 1024
+_EXPORT_DEFLATE_WORKERS = min(4, os.cpu_count() or 1)
+# エクスポートごとにプールを作ると同時ダウンロード数 × ワーカー数のスレッドが CPU を奪い合うため、全リクエストで共有する
+_export_deflate_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=_EXPORT_DEFLATE_WORKERS, thread_name_prefix="export_deflate"
+)
+# 既に圧縮済みの形式は deflate しても縮まないので無圧縮で格納する
+_EXPORT_STORED_EXTS = frozenset({'.jpg', '.jpeg', '.gif', '.pdf', '.zip', '.gz', '.whl', '.mp3', '.mp4', '.mov', '.woff2'})
+
+
+class _ZipChunkSink:
+    """ZipFile の書き込み先。書かれたバイト列を溜め、drain() で取り出す（シーク不可ストリーム扱い）"""
+
+    def __init__(self):
+        self._chunks: list = []
+        self.pending = 0
+
+    def write(self, data) -> int:
+        # 圧縮済みエントリ（最大 _EXPORT_PARALLEL_MAX_BYTES）は bytes のまま受け取るのでコピーしない。
+        # memoryview 等は呼び出し側がバッファを使い回すため、ここで固定する
+        self._chunks.append(data if type(data) is bytes else bytes(data))
+        self.pending += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = self._chunks[0] if len(self._chunks) == 1 else b"".join(self._chunks)
+        self._chunks.clear()
+        self.pending = 0
+        return out
+
+
+# 拡張子の判定は小文字化した拡張子の集合引き（.PNG 等の大文字も同じ扱い）
+_EXPORT_EXCLUDE_EXTS = frozenset({'.webp', '.png'})
+
+
+def _iter_export_files(base_dir: Path):
+    """エクスポート対象ファイルの (DirEntry, ZIP 内パス) を列挙する
+
+    os.walk + ファイルごとの endswith 連鎖の代わりに os.scandir のスタック走査を使い、
+    d_type による is_dir() 判定と拡張子の集合引きで syscall と分岐を減らす。
+    """
+    base = os.fspath(base_dir)
+    stack = [(base, "")]
+    while stack:
+        dir_path, prefix = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError as e:
+            logger.warning(f"Source export: cannot list {dir_path}: {e}")
+            continue
+        for entry in entries:
+            name = entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in _EXPORT_EXCLUDE_DIRS:
+                        stack.append((entry.path, f"{prefix}{name}/"))
+                elif entry.is_file():
+                    if name in _EXPORT_EXCLUDE_FILES or os.path.splitext(name)[1].lower() in _EXPORT_EXCLUDE_EXTS:
                         continue
-                        
-                    file_path = Path(root) / file
-                    arcname = file_path.relative_to(base_dir)
-                    zf.write(file_path, arcname)
-                    
-        zip_buffer.seek(0)
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-        filename = f"antigravity_source_{timestamp}.zip"
-        
-        return StreamingResponse(
-            iter([zip_buffer.getvalue()]), 
-            media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
-    except Exception as e:
-        logger.error(f"Source export error: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Export failed")
+                    yield entry, prefix + name
+            except OSError:
+                continue
+
+
+def _export_zipinfo(arcname: str, st: os.stat_result):
+    """ZipInfo.from_file と同じ内容を、scandir がキャッシュした stat から組み立てる"""
+    import zipfile
+
+    date_time = time.localtime(st.st_mtime)[:6]
+    if date_time[0] < 1980:  # ZIP の日付は 1980 年以降しか表現できない
+        date_time = (1980, 1, 1, 0, 0, 0)
+    zinfo = zipfile.ZipInfo(arcname, date_time)
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    zinfo.file_size = st.st_size
+    if os.path.splitext(arcname)[1].lower() in _EXPORT_STORED_EXTS:
+        zinfo.compress_type = zipfile.ZIP_STORED
+    else:
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        # ZipInfo を渡す open() では ZipFile 側の compresslevel が使われないため個別に指定する。
+        # 属性名は 3.13 で compress_level に変わった。どちらも無ければ zlib の既定レベルになるだけ
+        for attr in ("compress_level", "_compresslevel"):
+            if hasattr(zinfo, attr):
+                setattr(zinfo, attr, _EXPORT_COMPRESSLEVEL)
+                break
+    return zinfo
+
+
+def _deflate_file(path: str) -> Tuple[bytes, int, int]:
+    """ファイル全体を raw deflate する（zlib は GIL を解放するのでスレッド並列で効く）。(圧縮データ, CRC32, 元サイズ)"""
+    import zlib
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+    co = zlib.compressobj(_EXPORT_COMPRESSLEVEL, zlib.DEFLATED, -15)
+    return co.compress(raw) + co.flush(), zlib.crc32(raw), len(raw)
+
+
+# _write_precompressed が使う ZipFile の内部属性（公開 API には圧縮済みデータを書く手段がない）
+_ZIPFILE_PRECOMPRESSED_ATTRS = ("_writecheck", "_didModify", "start_dir", "fp", "filelist", "NameToInfo")
+
+
+def _zip_supports_precompressed(zf) -> bool:
+    """zf が _write_precompressed の前提とする内部属性を持つか
+
+    CPython の実装変更で欠けていれば、並列圧縮をやめて公開 API（ZipFile.open）での書き込みに切り替える。
+    """
+    return all(hasattr(zf, attr) for attr in _ZIPFILE_PRECOMPRESSED_ATTRS)
+
+
+def _write_precompressed(zf, zinfo, data: bytes, crc: int, size: int) -> None:
+    """deflate 済みのデータをそのままエントリとして書き込む（ZipFile.open 経由だと再圧縮されるため）
+
+    CRC とサイズが先に分かっているのでデータディスクリプタは使わず、ローカルヘッダに直接書く。
+    ZipFile の内部属性に依存するため、呼び出し前に _zip_supports_precompressed() で確認すること。
+    """
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = len(data)
+    zf._writecheck(zinfo)
+    zf._didModify = True
+    zinfo.header_offset = zf.fp.tell()
+    zf.fp.write(zinfo.FileHeader(False))
+    zf.fp.write(data)
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+    zf.start_dir = zf.fp.tell()
+
+
+def _iter_source_zip(base_dir: Path):
+    """base_dir 以下を ZIP 化しながらバイト列を逐次 yield する
+
+    _EXPORT_PARALLEL_MAX_BYTES 以下の deflate 対象は先読みしてスレッドプールで並列に圧縮し、
+    列挙順に書き込む（先読みは _EXPORT_DEFLATE_WORKERS * 2 件までなのでメモリは一定）。
+    それより大きいファイルと無圧縮形式は従来どおりチャンク単位でストリーミングする。
+    ZipFile の内部属性が使えない Python では、全エントリを ZipFile.open でストリーミングする。
+    """
+    import zipfile
+    from collections import deque
+
+    sink = _ZipChunkSink()
+    window = deque()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED, compresslevel=_EXPORT_COMPRESSLEVEL) as zf:
+        parallel_max = _EXPORT_PARALLEL_MAX_BYTES if _zip_supports_precompressed(zf) else -1
+
+        def _emit(item):
+            entry, zinfo, fut = item
+            try:
+                if fut is not None:
+                    _write_precompressed(zf, zinfo, *fut.result())
+                else:
+                    with open(entry.path, 'rb') as src, zf.open(zinfo, 'w') as dst:
+                        while chunk := src.read(_EXPORT_CHUNK_SIZE):
+                            dst.write(chunk)
+                            if sink.pending >= _EXPORT_YIELD_MIN:
+                                yield sink.drain()
+            except OSError as e:
+                logger.warning(f"Source export: skipped {entry.path}: {e}")
+            # 小さいファイルが続く場合はある程度溜めてから送る（送信・スレッド往復の回数を減らす）
+            if sink.pending >= _EXPORT_YIELD_MIN:
+                yield sink.drain()
+
+        try:
+            for entry, arcname in _iter_export_files(base_dir):
+                try:
+                    st = entry.stat()
+                except OSError as e:
+                    logger.warning(f"Source export: skipped {entry.path}: {e}")
+                    continue
+                zinfo = _export_zipinfo(arcname, st)
+                fut = None
+                if zinfo.compress_type == zipfile.ZIP_DEFLATED and st.st_size <= parallel_max:
+                    fut = _export_deflate_pool.submit(_deflate_file, entry.path)
+                window.append((entry, zinfo, fut))
+                if len(window) > _EXPORT_DEFLATE_WORKERS * 2:
+                    yield from _emit(window.popleft())
+            while window:
+                yield from _emit(window.popleft())
+        finally:
+            # クライアント切断などで途中終了した場合、共有プールに残った先読み分を取り消す
+            for _, _, fut in window:
+                if fut is not None:
+                    fut.cancel()
+    # セントラルディレクトリ
+    data = sink.drain()
+    if data:
+        yield data
+
+
+@router.get("/api/system/export-source")
+def export_source():
+    """ソースコード一式をZIPでダウンロード（生成しながらストリーミング）"""
+    from datetime import datetime, timezone
+
+    # routers ディレクトリの親をベースディレクトリにする
+    base_dir = Path(__file__).parent.parent.resolve()
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    filename = f"antigravity_source_{timestamp}.zip"
+
+    # 同期ジェネレータなので StreamingResponse がスレッドプールで回し、イベントループを塞がない
+    return StreamingResponse(
+        _iter_source_zip(base_dir),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 # ========== 設定関連 ==========
 
@@ -335,6 +612,44 @@ async def get_gemini_key():
         
     return {"api_key": masked, "configured": True}
 
+_ENV_WRITE_LOCK = asyncio.Lock()
+
+
+def _write_env_var(env_path: Path, name: str, value: str) -> None:
+    """.env の name=... 行を置換（無ければ追記）し、一時ファイル + os.replace で原子的に書き戻す
+
+    一時ファイルは mkstemp で一意に作り（既定 0600）、既存の .env があればそのパーミッションを引き継ぐ
+    （API キーを含むファイルが umask 既定の 0644 に広がらないようにする）。
+    """
+    try:
+        old_mode = stat.S_IMODE(os.stat(env_path).st_mode)
+        old_text = env_path.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        old_mode = None
+        old_text = ""
+    line = f"{name}={value}"
+    new_text, n = re.subn(rf'^[ \t]*{re.escape(name)}=.*$', lambda _m: line, old_text, flags=re.M)
+    if n == 0:
+        if new_text and not new_text.endswith('\n'):
+            new_text += '\n'
+        new_text += line + '\n'
+
+    fd, tmp_path = tempfile.mkstemp(dir=env_path.parent, prefix=f".{env_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            if old_mode is not None:
+                os.fchmod(f.fileno(), old_mode)
+            f.write(new_text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, env_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
 @router.post("/api/settings/gemini-key")
 async def set_gemini_key(request: GeminiKeyRequest):
     """Gemini APIキーを設定・保存"""
@@ -343,27 +658,9 @@ async def set_gemini_key(request: GeminiKeyRequest):
         raise HTTPException(status_code=400, detail="APIキーが空です")
     
     env_path = Path(__file__).parent.parent / ".env"
-    lines = []
-    if env_path.exists():
-        with open(env_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            
-    key_exists = False
-    new_lines = []
-    for line in lines:
-        if line.strip().startswith("GEMINI_API_KEY="):
-            new_lines.append(f"GEMINI_API_KEY={new_key}\n")
-            key_exists = True
-        else:
-            new_lines.append(line)
-            
-    if not key_exists:
-        if new_lines and not new_lines[-1].endswith('\n'):
-            new_lines[-1] += '\n'
-        new_lines.append(f"GEMINI_API_KEY={new_key}\n")
-        
-    with open(env_path, 'w', encoding='utf-8') as f:
-        f.writelines(new_lines)
+    # 同時リクエストで読み書きが交錯しないよう直列化する
+    async with _ENV_WRITE_LOCK:
+        await asyncio.to_thread(_write_env_var, env_path, "GEMINI_API_KEY", new_key)
         
     os.environ["GEMINI_API_KEY"] = new_key
     import config
@@ -385,7 +682,9 @@ async def test_gemini_key():
         from google.genai import types as _types
         from gemini_client import get_client as _get_client
         _client = _get_client()
-        _response = _client.models.generate_content(
+        # 同期 API なのでワーカースレッドで実行し、イベントループを塞がない
+        _response = await asyncio.to_thread(
+            _client.models.generate_content,
             model="gemini-3-flash-preview",
             contents="Hello, this is a connection test.",
         )
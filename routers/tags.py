@@ -1,41 +1,62 @@
 from fastapi import APIRouter
+from fastapi.responses import Response
 import logging
 from pathlib import Path
+from typing import Optional, Tuple
+
+from utils import json_codec
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Tags & Categories"])
 
+_CATEGORIES = (
+    {"value": None, "label": "全て（横断検索）"},
+    {"value": "01_カタログ", "label": "01 カタログ"},
+    {"value": "02_図面", "label": "02 図面"},
+    {"value": "03_技術基準", "label": "03 技術基準"},
+    {"value": "04_リサーチ成果物", "label": "04 リサーチ成果物"},
+    {"value": "05_法規", "label": "05 法規"},
+    {"value": "06_設計マネジメント", "label": "06 設計マネジメント"},
+    {"value": "07_コストマネジメント", "label": "07 コストマネジメント"},
+    {"value": "00_未分類", "label": "00 未分類"},
+)
+# 内容は固定なので、レスポンス本文は起動時に一度だけ JSON 化しておく
+_CATEGORIES_JSON = json_codec.dumps_bytes({"categories": list(_CATEGORIES)})
+
+# server.pyは architectural_rag 直下にいるため base_dir は同じになるように
+_RULES_PATH = Path(__file__).parent.parent.resolve() / "classification_rules.yaml"
+
+# ((mtime_ns, size), available_tags) — YAML を編集するまでは再パースしない
+_TAGS_CACHE: Optional[Tuple[Tuple[int, int], dict]] = None
+
+
 @router.get("/api/categories")
 async def list_categories():
     """利用可能なカテゴリ一覧"""
-    categories = [
-        {"value": None, "label": "全て（横断検索）"},
-        {"value": "01_カタログ", "label": "01 カタログ"},
-        {"value": "02_図面", "label": "02 図面"},
-        {"value": "03_技術基準", "label": "03 技術基準"},
-        {"value": "04_リサーチ成果物", "label": "04 リサーチ成果物"},
-        {"value": "05_法規", "label": "05 法規"},
-        {"value": "06_設計マネジメント", "label": "06 設計マネジメント"},
-        {"value": "07_コストマネジメント", "label": "07 コストマネジメント"},
-        {"value": "00_未分類", "label": "00 未分類"},
-    ]
-    return {"categories": categories}
+    return Response(content=_CATEGORIES_JSON, media_type="application/json")
 
 @router.get("/api/tags")
 def get_tags():
-    """利用可能なタグ一覧を取得"""
+    """利用可能なタグ一覧を取得（classification_rules.yaml の mtime が変わるまでキャッシュ）"""
+    global _TAGS_CACHE
     try:
-        import yaml
-        # server.pyは architectural_rag 直下にいるため base_dir は同じになるように
-        base_dir = Path(__file__).parent.parent.resolve()
-        rules_path = base_dir / "classification_rules.yaml"
-        if not rules_path.exists():
+        try:
+            st = _RULES_PATH.stat()
+        except FileNotFoundError:
             return {}
-            
-        with open(rules_path, 'r', encoding='utf-8') as f:
-            rules = yaml.safe_load(f)
-            
-        return rules.get("available_tags", {})
+        key = (st.st_mtime_ns, st.st_size)
+        cached = _TAGS_CACHE
+        if cached and cached[0] == key:
+            return cached[1]
+
+        import yaml
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # libyaml があれば C 実装で読む
+        with open(_RULES_PATH, 'r', encoding='utf-8') as f:
+            rules = yaml.load(f, Loader=loader)
+
+        tags = rules.get("available_tags", {})
+        _TAGS_CACHE = (key, tags)
+        return tags
     except Exception as e:
         logger.error(f"Failed to load tags: {e}", exc_info=True)
         return {}
@@ -25,6 +25,7 @@ from sqlalchemy import text
 
 from config import GEMINI_MODEL_RAG
 from database import get_db
+from utils.timestamps import utc_now_iso
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Tasks"])
@@ -33,7 +34,7 @@ router = APIRouter(tags=["Tasks"])
 # ===== ヘルパー =====
 
 def _now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+    return utc_now_iso()
 
 
 def _upsert_auto_reminder(task_id: int, task_title: str, due_date: str, db) -> None:
@@ -16,13 +16,35 @@ from gemini_client import get_client
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Transcribe"])
 
+_AUDIO_READ_CHUNK = 1024 * 1024
+
+
+async def read_audio_upload(file: UploadFile) -> bytes:
+    """音声アップロードを上限付きで読み込む
+
+    Gemini へは inline_data で送るためメモリに載せる必要があるが、丸ごと read() せず 1 MiB ずつ読み、
+    TRANSCRIBE_MAX_AUDIO_BYTES を超えた時点で 413 を返す（巨大ファイルでメモリを使い切らない）。
+    """
+    limit = config.TRANSCRIBE_MAX_AUDIO_BYTES
+    too_large = HTTPException(status_code=413, detail=f"音声ファイルが大きすぎます（上限 {limit // (1024 * 1024)}MB）")
+    if file.size is not None and file.size > limit:
+        raise too_large
+    chunks = []
+    total = 0
+    while chunk := await file.read(_AUDIO_READ_CHUNK):
+        total += len(chunk)
+        if total > limit:
+            raise too_large
+        chunks.append(chunk)
+    if not total:
+        raise HTTPException(status_code=400, detail="音声データが空です")
+    return b"".join(chunks)
+
 
 @router.post("/api/transcribe")
 async def transcribe_audio(file: UploadFile = File(...)):
     """音声ファイルを Gemini で文字起こし"""
-    audio_bytes = await file.read()
-    if not audio_bytes:
-        raise HTTPException(status_code=400, detail="音声データが空です")
+    audio_bytes = await read_audio_upload(file)
 
     # ブラウザの MediaRecorder は audio/webm を送ってくる
     mime_type = file.content_type or "audio/webm"
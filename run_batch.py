@@ -1,12 +1,37 @@
+import os
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
 from indexer import get_chroma_client, COLLECTION_NAME, GeminiEmbeddingFunction, _index_single_file_info, _infer_doc_type, _should_exclude
-from database import init_db, get_session, Document as DbDocument
+from database import init_db, get_session, LegacyDocument as DbDocument
 from config import SEARCH_MD_DIR
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
+_STATUS_FLUSH_EVERY = 16  # 完了ステータスをまとめて書き込む件数
+_BATCH_WORKERS = 4        # 同時にインデックスするファイル数（Gemini のレート制限内に収める）
+
+def _iter_pdf_entries(base_dir: str):
+    """base_dir 以下の .pdf を (DirEntry, base_dir からの相対パス) で列挙する（os.scandir の再帰）"""
+    stack = [(base_dir, "")]
+    while stack:
+        dir_path, prefix = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            logging.warning(f"Cannot scan {dir_path}: {e}")
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append((entry.path, f"{prefix}{entry.name}{os.sep}"))
+            elif entry.name.endswith(".pdf") and entry.is_file():
+                yield entry, prefix + entry.name
+        # 名前順に処理されるよう逆順で積む
+        stack.extend(reversed(subdirs))
+
 def scan_only_pdfs(base_dir: Path):
     """knowledge_base内のPDFのみを抽出 (MD優先ロジックを無視)"""
     files = []
@@ -14,26 +39,30 @@ def scan_only_pdfs(base_dir: Path):
     if not base_path.exists():
         return files
 
-    for filepath in base_path.rglob("*.pdf"):
-        if filepath.is_dir() or _should_exclude(filepath, base_path):
+    # ファイルごとに SELECT せず、drive_file_id を 1 クエリでまとめて取得しておく
+    session = get_session()
+    try:
+        drive_ids = dict(
+            session.query(DbDocument.file_path, DbDocument.drive_file_id)
+            .filter(DbDocument.drive_file_id.isnot(None), DbDocument.drive_file_id != "")
+        )
+    finally:
+        session.close()
+
+    for entry, rel in _iter_pdf_entries(str(base_path)):
+        filepath = Path(entry.path)
+        if _should_exclude(filepath, base_path):
             continue
 
-        rel_path = filepath.relative_to(base_path)
+        st = entry.stat()  # DirEntry は stat 結果をキャッシュするので 1 回の syscall で済む
+        rel_path = Path(rel)
         parts = rel_path.parts
         category = parts[0] if len(parts) > 1 else "未分類"
         subcategory = parts[1] if len(parts) > 2 else ""
         sub_subcategory = parts[2] if len(parts) > 3 else ""
         doc_type = _infer_doc_type(category, filepath.name)
 
-        from database import get_session, Document as DbDocument
-        drive_file_id = ""
-        session = get_session()
-        try:
-            doc = session.query(DbDocument).filter(DbDocument.file_path == str(rel_path)).first()
-            if doc and doc.drive_file_id:
-                drive_file_id = doc.drive_file_id
-        finally:
-            session.close()
+        drive_file_id = drive_ids.get(str(rel_path)) or ""
 
         files.append({
             "filename":       filepath.name,
@@ -43,8 +72,8 @@ def scan_only_pdfs(base_dir: Path):
             "subcategory":    subcategory,
             "sub_subcategory": sub_subcategory,
             "file_type":      "pdf",
-            "file_size_kb":   round(filepath.stat().st_size / 1024, 2),
-            "modified_at":    datetime.fromtimestamp(filepath.stat().st_mtime).isoformat(),
+            "file_size_kb":   round(st.st_size / 1024, 2),
+            "modified_at":    datetime.fromtimestamp(st.st_mtime).isoformat(),
             "doc_type":       doc_type,
             "drive_file_id":  drive_file_id,
         })
@@ -64,45 +93,68 @@ def run_batch(limit=5):
     
     stats = {"total_files": len(files), "indexed": 0, "skipped": 0, "errors": 0, "chunks": 0}
     
-    # SQLite で completed のものをスキップ
+    # 1 セッションを使い回し、完了ステータスは _STATUS_FLUSH_EVERY 件ごとにまとめて UPDATE する
     session = get_session()
+    processed_rels = []
+
+    def _flush_completed():
+        if not processed_rels:
+            return
+        session.query(DbDocument).filter(
+            DbDocument.file_path.in_(processed_rels)
+        ).update({"status": "completed"}, synchronize_session=False)
+        session.commit()
+        processed_rels.clear()
+
     try:
-        completed_docs = session.query(DbDocument).filter(DbDocument.status == 'completed').all()
-        indexed_rels = {doc.file_path for doc in completed_docs}
+        # SQLite で completed のものをスキップ
+        # ORM オブジェクト全体ではなく file_path 列だけを取得する
+        indexed_rels = {
+            file_path for (file_path,) in
+            session.query(DbDocument.file_path).filter(DbDocument.status == 'completed')
+        }
+
+        # 今回のバッチで処理するファイルを先に選ぶ
+        targets = []
+        for file_info in files:
+            if file_info["rel_path"] in indexed_rels:
+                stats["skipped"] += 1
+                continue
+
+            if len(targets) >= limit:
+                logging.info(f"Reached batch limit of {limit}. Stopping.")
+                break
+            targets.append(file_info)
+
+        def _index_one(file_info):
+            """1 ファイル分をインデックスし、ワーカー固有の stats 差分を返す"""
+            logging.info(f"OCR Indexing PDF: {file_info['filename']}")
+            local_stats = {"indexed": 0, "skipped": 0, "errors": 0, "chunks": 0}
+            _index_single_file_info(file_info, collection, local_stats)
+            return local_stats
+
+        # OCR・埋め込みは Gemini API 待ちが大半なので、ファイル単位で並行実行する
+        with ThreadPoolExecutor(max_workers=_BATCH_WORKERS) as executor:
+            futures = {executor.submit(_index_one, fi): fi["rel_path"] for fi in targets}
+            for future in as_completed(futures):
+                rel_path = futures[future]
+                try:
+                    local_stats = future.result()
+                except Exception as e:
+                    logging.error(f"Error ({rel_path}): {e}")
+                    stats["errors"] += 1
+                    continue
+                for key, value in local_stats.items():
+                    stats[key] = stats.get(key, 0) + value
+                # DB 更新はメインスレッドのセッションでのみ行う
+                processed_rels.append(rel_path)
+                if len(processed_rels) >= _STATUS_FLUSH_EVERY:
+                    _flush_completed()
+
+        _flush_completed()
     finally:
         session.close()
 
-    count = 0
-    for file_info in files:
-        rel_path = file_info["rel_path"]
-        if rel_path in indexed_rels:
-            stats["skipped"] += 1
-            continue
-        
-        if count >= limit:
-            logging.info(f"Reached batch limit of {limit}. Stopping.")
-            break
-    
-        logging.info(f"OCR Indexing PDF: {file_info['filename']}")
-        try:
-            _index_single_file_info(file_info, collection, stats)
-            
-            # Explicitly mark as completed in SQLite
-            session = get_session()
-            try:
-                doc = session.query(DbDocument).filter(DbDocument.file_path == rel_path).first()
-                if doc:
-                    doc.status = 'completed'
-                    session.commit()
-            finally:
-                session.close()
-                
-            count += 1
-        except Exception as e:
-            logging.error(f"Error ({rel_path}): {e}")
-            stats["errors"] += 1
-            count += 1
-    
     logging.info(f"Batch completed: {stats}")
 
 if __name__ == '__main__':
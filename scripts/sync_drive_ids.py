@@ -15,12 +15,15 @@ BASE_DIR = Path(__file__).parent.parent
 sys.path.append(str(BASE_DIR))
 
 from drive_sync import get_drive_service
-from database import get_session, Document as DbDocument
+from database import get_session, LegacyDocument as DbDocument
 from indexer import get_chroma_client, COLLECTION_NAME
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+DB_COMMIT_BATCH = 100        # SQLite のコミット間隔（件）
+CHROMA_UPDATE_BATCH = 5000   # ChromaDB update 1 回あたりの最大チャンク数
+
 def get_file_id_by_name(service, filename: str, folder_id: str = None) -> str:
     """Drive APIを用いてファイル名で検索し、ファイルIDを返す。serviceがNoneの場合はダミー値を返す。"""
     if service is None:
@@ -43,6 +46,32 @@ def get_file_id_by_name(service, filename: str, folder_id: str = None) -> str:
         logger.error(f"Error searching for {filename}: {e}")
     return ""
 
+def build_name_index(service, folder_id: str = None) -> dict:
+    """Drive 上のファイル一覧をページ単位（1000 件）で取得し、{ファイル名: ファイルID} を作る。
+
+    ファイルごとに files.list を呼ぶ代わりに、N 件を ceil(N/1000) 回の API 呼び出しで解決する。
+    同名ファイルが複数ある場合は最初に見つかったものを採用する（従来の files[0] と同じ扱い）。
+    """
+    index = {}
+    query = "trashed = false"
+    if folder_id:
+        query += f" and '{folder_id}' in parents"
+    page_token = None
+    while True:
+        resp = service.files().list(
+            q=query,
+            spaces='drive',
+            pageSize=1000,
+            pageToken=page_token,
+            fields='nextPageToken, files(id, name)',
+        ).execute()
+        for f in resp.get('files', []):
+            index.setdefault(f['name'], f['id'])
+        page_token = resp.get('nextPageToken')
+        if not page_token:
+            break
+    return index
+
 def main():
     logger.info("Starting Drive ID sync...")
     
@@ -69,45 +98,66 @@ def main():
     
     updated_db_count = 0
     updated_chroma_count = 0
-    
+
+    # Drive のファイル名→ID 対応を一括取得（失敗時は従来どおり 1 件ずつ検索）
+    name_index = None
+    if service is not None and any(not doc.drive_file_id for doc in docs):
+        try:
+            name_index = build_name_index(service)
+            logger.info(f"Indexed {len(name_index)} file names on Google Drive.")
+        except Exception as e:
+            logger.warning(f"Failed to list Drive files in bulk: {e}. Falling back to per-file search.")
+
+    # source_pdf_hash -> drive_id（ChromaDB へはループ後にまとめて反映する）
+    hash_to_drive_id = {}
+
     for doc in docs:
         if not doc.drive_file_id:
             logger.info(f"Processing: {doc.filename}")
-            drive_id = get_file_id_by_name(service, doc.filename)
+            if name_index is not None:
+                drive_id = name_index.get(doc.filename, "")
+            else:
+                drive_id = get_file_id_by_name(service, doc.filename)
             
             if drive_id:
                 logger.info(f"  -> Found Drive ID: {drive_id}")
                 doc.drive_file_id = drive_id
-                session.commit()
                 updated_db_count += 1
-                
-                # ChromaDB内の該当ドキュメントチャンクのメタデータを更新
-                if collection and doc.source_pdf_hash:
-                    results = collection.get(
-                        where={"source_pdf_hash": doc.source_pdf_hash}
-                    )
-                    
-                    if results and results['ids']:
-                        ids = results['ids']
-                        metadatas = results['metadatas']
-                        
-                        logger.info(f"  -> Updating {len(ids)} chunks in ChromaDB for {doc.filename}...")
-                        
-                        # それぞれのメタデータ辞書に drive_file_id を追加
-                        updated_metadatas = []
-                        for m in metadatas:
-                            new_m = m.copy()
-                            new_m["drive_file_id"] = drive_id
-                            updated_metadatas.append(new_m)
-                            
-                        # 一括アップデート
-                        collection.update(
-                            ids=ids,
-                            metadatas=updated_metadatas
-                        )
-                        updated_chroma_count += len(ids)
+                # コミットは DB_COMMIT_BATCH 件ごとにまとめる
+                if updated_db_count % DB_COMMIT_BATCH == 0:
+                    session.commit()
+                if doc.source_pdf_hash:
+                    hash_to_drive_id[doc.source_pdf_hash] = drive_id
             else:
                 logger.warning(f"  -> Drive ID NOT found for {doc.filename}")
+    session.commit()
+
+    # ChromaDB内の該当ドキュメントチャンクのメタデータを更新（1 回の get で全ハッシュ分を取得）
+    if collection and hash_to_drive_id:
+        results = collection.get(
+            where={"source_pdf_hash": {"$in": list(hash_to_drive_id)}},
+            include=["metadatas"],
+        )
+        ids = []
+        updated_metadatas = []
+        for chunk_id, m in zip(results.get('ids') or [], results.get('metadatas') or []):
+            drive_id = hash_to_drive_id.get((m or {}).get("source_pdf_hash"))
+            if not drive_id:
+                continue
+            # get() が返した辞書は他で使わないので、コピーせずそのまま drive_file_id を追加する
+            m["drive_file_id"] = drive_id
+            ids.append(chunk_id)
+            updated_metadatas.append(m)
+
+        if ids:
+            logger.info(f"Updating {len(ids)} chunks in ChromaDB for {len(hash_to_drive_id)} documents...")
+            # Chroma の 1 リクエスト上限を超えないよう分割して一括アップデート
+            for i in range(0, len(ids), CHROMA_UPDATE_BATCH):
+                collection.update(
+                    ids=ids[i:i + CHROMA_UPDATE_BATCH],
+                    metadatas=updated_metadatas[i:i + CHROMA_UPDATE_BATCH],
+                )
+            updated_chroma_count += len(ids)
                 
     session.close()
     
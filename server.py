@@ -18,11 +18,13 @@ import logging
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, RedirectResponse, FileResponse, JSONResponse
+from fastapi.responses import StreamingResponse, RedirectResponse, FileResponse, JSONResponse, Response
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel
 import secrets
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
+import queue
 
 # Logging setup (Phase 6 — ログローテーション対応 #16)
 _log_handler = RotatingFileHandler(
@@ -40,7 +42,18 @@ console = logging.StreamHandler()
 console.setLevel(logging.INFO)
 console.setFormatter(_log_formatter)
 
-logging.basicConfig(level=logging.INFO, handlers=[_log_handler, console])
+# ファイル書き込み・コンソール出力は QueueListener のスレッドで行い、
+# リクエスト処理中の logger 呼び出しはキューへの投入だけで戻る（ディスク I/O の揺らぎを応答に載せない）
+_log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, _log_handler, console, respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+_queue_handler = QueueHandler(_log_queue)
+# 書式は listener 側のハンドラで付けるので、キューにはメッセージ本文（+ 例外のトレースバック）だけを載せる
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +69,8 @@ from ocr_processor import process_pdf_background
 from indexer import build_index, scan_files
 
 import gemini_client  # 共有クライアント初期化
+from utils import json_codec
+from utils.json_response import FastJSONResponse
 
 # Basic認証設定（ミドルウェアで全API保護）
 APP_PASSWORD = os.environ.get("APP_PASSWORD", "")
@@ -63,12 +78,11 @@ APP_PASSWORD = os.environ.get("APP_PASSWORD", "")
 if APP_PASSWORD:
     import base64
     from starlette.middleware.base import BaseHTTPMiddleware
-    from starlette.responses import Response
 
     class BasicAuthMiddleware(BaseHTTPMiddleware):
         """APP_PASSWORD設定時に全APIリクエストをBasic認証で保護"""
         # 認証不要のパス (Google Driveコールバック等は外部から直接リダイレクトされるため除外)
-        EXEMPT_PATHS = {"/api/health", "/docs", "/openapi.json", "/api/drive/callback"}
+        EXEMPT_PATHS = {"/api/health", "/api/livez", "/api/readyz", "/docs", "/openapi.json", "/api/drive/callback"}
 
         async def dispatch(self, request, call_next):
             path = request.url.path
@@ -120,6 +134,11 @@ async def lifespan(app: FastAPI):
     from sqlalchemy import text
     
     init_db()
+
+    # 同期ハンドラが使うスレッドプールの上限を設定（長い Gemini 呼び出しでヘルスチェック等が待たされないように）
+    from anyio import to_thread
+    from config import THREADPOOL_MAX_THREADS
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_MAX_THREADS
     
     # クラッシュ等による処理中ステータスの固着をリセット
     try:
@@ -161,7 +180,10 @@ async def lifespan(app: FastAPI):
         logger.warning(f"Issue memo reindex failed (non-fatal): {e}")
 
     yield
-    # シャットダウン時の処理（将来必要に応じて追加）
+    # シャットダウン時の処理
+    # 取り込みキューの待ちジョブを破棄する（残すと OCR 等が全て終わるまでプロセスが終了しない）
+    from ingestion_orchestrator import shutdown_ingest_executor
+    shutdown_ingest_executor()
 
 
 app = FastAPI(
@@ -169,6 +191,8 @@ app = FastAPI(
     description="建築PM/CM業務向けナレッジ検索・回答生成API",
     version="1.0.0",
     lifespan=lifespan,
+    # 既定の JSON エンコードを orjson（任意依存）に切り替える
+    default_response_class=FastJSONResponse,
 )
 
 # 認証ミドルウェアを登録
@@ -218,6 +242,32 @@ app.add_middleware(
 )
 
 
+class LivezShortCircuit:
+    """GET /api/livez をミドルウェア・ルーティングより手前で即応答する素の ASGI ラッパー
+
+    liveness プローブは高頻度で叩かれるため、CORS・認証・例外ハンドラ等を一切通さずに返す。
+    """
+    _BODY = b'{"status":"ok"}'
+    _HEADERS = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(_BODY)).encode()),
+    ]
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/api/livez" and scope["method"] in ("GET", "HEAD"):
+            await send({"type": "http.response.start", "status": 200, "headers": self._HEADERS})
+            await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else self._BODY})
+            return
+        await self.app(scope, receive, send)
+
+
+# 最後に追加したミドルウェアが最外層になる
+app.add_middleware(LivezShortCircuit)
+
+
 # ====== Routers マウント ======
 from routers import system, chat, pdf, drive, tags, files, personal_context, analyze, projects
 
@@ -243,26 +293,42 @@ app.include_router(meetings_module.router)
 from routers import documents as documents_module
 app.include_router(documents_module.router)
 
+_ROOT_JSON = json_codec.dumps_bytes({"message": "建築意匠ナレッジRAG API", "status": "running"})
+
+
 @app.get("/")
 async def root():
-    return {"message": "建築意匠ナレッジRAG API", "status": "running"}
+    return Response(content=_ROOT_JSON, media_type="application/json")
+
+
+# モデル・ロール一覧は固定なので、レスポンス本文は起動時に一度だけ JSON 化しておく
+from config import AVAILABLE_MODELS
+from prompts.context_sheet_roles import AVAILABLE_ROLES
+
+_MODELS_JSON = json_codec.dumps_bytes(AVAILABLE_MODELS)
+_ROLES_JSON = json_codec.dumps_bytes(AVAILABLE_ROLES)
 
 
 @app.get("/api/models", tags=["Meta"])
 async def list_models():
     """利用可能なモデル一覧を返す。フロントエンドのセレクター生成に使用。"""
-    from config import AVAILABLE_MODELS
-    return AVAILABLE_MODELS
+    return Response(content=_MODELS_JSON, media_type="application/json")
 
 
 @app.get("/api/roles", tags=["Meta"])
 async def list_roles():
     """利用可能なロール一覧を返す。フロントエンドのセレクター生成に使用。"""
-    from prompts.context_sheet_roles import AVAILABLE_ROLES
-    return AVAILABLE_ROLES
+    return Response(content=_ROLES_JSON, media_type="application/json")
 
 
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    # uvloop / httptools（uvicorn[standard] に同梱）があれば明示的に使い、無ければ標準実装に落とす。
+    # ワーカーは 1 プロセスのまま（ヘルスキャッシュや同期ロックがプロセス内状態のため）
+    _loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    _http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    logger.info(f"Starting uvicorn (loop={_loop}, http={_http})")
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop=_loop, http=_http)
 
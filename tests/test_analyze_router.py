@@ -0,0 +1,30 @@
+"""
+tests/test_analyze_router.py - routers/analyze.py のストリーム整形ヘルパーのテスト
+"""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from routers import analyze
+
+
+def _chunks(*texts):
+    return [SimpleNamespace(text=t) for t in texts]
+
+
+def test_coalesce_merges_chunks_within_interval():
+    """間隔内に届いた小さなチャンクは 1 つにまとめられ、末尾は必ず送出される"""
+    with patch("routers.analyze.time.monotonic", return_value=0.0):
+        out = list(analyze._coalesce_stream_text(_chunks("耐", None, "火", "被覆"), flush_interval=0.05, flush_chars=100))
+    assert out == ["耐火被覆"]
+
+
+def test_coalesce_flushes_on_size_and_interval():
+    clock = iter([0.0, 0.01, 0.02, 0.10, 0.11])
+    with patch("routers.analyze.time.monotonic", side_effect=lambda: next(clock)):
+        out = list(analyze._coalesce_stream_text(
+            _chunks("abc", "defg", "h", "i"), flush_interval=0.05, flush_chars=5
+        ))
+    # "abc"+"defg" で文字数上限、"h" は 0.05 秒経過で送出、"i" は末尾で送出
+    assert out == ["abcdefg", "h", "i"]
+    assert "".join(out) == "abcdefghi"
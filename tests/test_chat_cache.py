@@ -0,0 +1,86 @@
+"""
+tests/test_chat_cache.py - /api/chat 回答キャッシュのテスト
+
+Gemini の Embedding は呼ばず、chat_cache._embed を差し替える。
+"""
+
+import numpy as np
+import pytest
+
+import chat_cache
+import config
+
+
+@pytest.fixture(autouse=True)
+def _reset_cache(monkeypatch):
+    monkeypatch.setattr(config, "CHAT_SEMANTIC_CACHE_ENABLED", False)
+    chat_cache.invalidate()
+    yield
+    chat_cache.invalidate()
+
+
+def _store(question, scope, answer):
+    chat_cache.store(question, scope, {"answer": answer, "sources": []}, chat_cache.current_epoch())
+
+
+def test_exact_hit_ignores_whitespace_and_case_and_respects_scope():
+    scope = chat_cache.scope_key(True, None, ["b", "a"])
+    _store("耐火  構造の 基準は? ABC", scope, "回答1")
+
+    assert chat_cache.lookup("耐火 構造の 基準は? abc", scope)["answer"] == "回答1"
+    assert chat_cache.lookup("耐火 構造の 基準は? abc", chat_cache.scope_key(True, None, ["a", "b"])) is not None
+    assert chat_cache.lookup("耐火 構造の 基準は? abc", chat_cache.scope_key(False, None, ["a", "b"])) is None
+
+
+def test_entries_expire_and_are_bounded(monkeypatch):
+    monkeypatch.setattr(config, "CHAT_ANSWER_CACHE_MAX_ENTRIES", 2)
+    for i in range(3):
+        _store(f"q{i}", "s", f"a{i}")
+    assert chat_cache.lookup("q0", "s") is None
+    assert chat_cache.lookup("q2", "s")["answer"] == "a2"
+
+    monkeypatch.setattr(config, "CHAT_ANSWER_CACHE_TTL_SEC", 0)
+    assert chat_cache.lookup("q2", "s") is None
+
+
+def test_store_is_dropped_when_invalidated_during_generation():
+    """生成中にインデックスが更新された場合、その回答は保存しない"""
+    epoch = chat_cache.current_epoch()
+    chat_cache.invalidate()
+    chat_cache.store("q", "s", {"answer": "stale", "sources": []}, epoch)
+    assert chat_cache.lookup("q", "s") is None
+
+
+def test_semantic_hit_above_threshold(monkeypatch):
+    monkeypatch.setattr(config, "CHAT_SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "CHAT_SEMANTIC_CACHE_THRESHOLD", 0.95)
+    vectors = {
+        "防火区画の面積は？": np.array([1.0, 0.0], dtype=np.float32),
+        "防火区画の面積について": np.array([0.99, 0.141], dtype=np.float32),
+        "階段の寸法は？": np.array([0.0, 1.0], dtype=np.float32),
+    }
+    monkeypatch.setattr(chat_cache, "_embed", lambda q: vectors[q] / np.linalg.norm(vectors[q]))
+
+    _store("防火区画の面積は？", "s", "回答")
+    assert chat_cache.lookup("防火区画の面積について", "s")["answer"] == "回答"
+    assert chat_cache.lookup("階段の寸法は？", "s") is None
+    assert chat_cache.lookup("防火区画の面積について", "other") is None
+
+
+def test_semantic_slots_are_reused_after_eviction(monkeypatch):
+    """LRU で追い出したエントリのベクトルは意味一致に使わず、スロットは次の保存で再利用する"""
+    monkeypatch.setattr(config, "CHAT_SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "CHAT_SEMANTIC_CACHE_THRESHOLD", 0.95)
+    monkeypatch.setattr(config, "CHAT_ANSWER_CACHE_MAX_ENTRIES", 2)
+    eye = np.eye(4, dtype=np.float32)
+    basis = {f"q{i}{suffix}": eye[i] for i in range(4) for suffix in ("", "?")}
+    monkeypatch.setattr(chat_cache, "_embed", lambda q: basis[q])
+
+    for i in range(4):
+        _store(f"q{i}", "s", f"a{i}")
+
+    assert chat_cache.lookup("q0?", "s") is None
+    assert chat_cache.lookup("q1?", "s") is None
+    assert chat_cache.lookup("q3?", "s")["answer"] == "a3"
+    assert chat_cache._vecs.shape[0] == 2
+    assert int(chat_cache._slot_used.sum()) == 2
@@ -0,0 +1,34 @@
+"""
+tests/test_chat_router.py - routers/chat.py のテスト
+"""
+
+import json
+
+import pytest
+from fastapi import BackgroundTasks
+from pydantic import ValidationError
+
+from routers import chat
+
+
+def test_cache_hit_returns_serialized_body_without_none_fields(monkeypatch):
+    """キャッシュヒット時は JSON 本文を直接返し、None のフィールド（web_sources）は含めない"""
+    cached = {"answer": "耐火構造とする", "sources": [{"filename": "法規.md", "score": 0.9}]}
+    monkeypatch.setattr(chat.chat_cache, "lookup", lambda q, scope: dict(cached))
+
+    tasks = BackgroundTasks()
+    res = chat.chat(chat.ChatRequest(question="耐火構造の基準は？", project_id="p"), tasks)
+
+    assert res.media_type == "application/json"
+    assert json.loads(res.body) == cached
+    # キャッシュヒットでも Layer A Memory の更新は行う
+    assert [t.func for t in tasks.tasks] == [chat.run_memory_pipeline]
+    assert tasks.tasks[0].kwargs == {
+        "user_message": "耐火構造の基準は？", "assistant_response": "耐火構造とする", "project_id": "p",
+    }
+
+
+def test_chat_request_is_frozen():
+    req = chat.ChatRequest(question="q")
+    with pytest.raises(ValidationError):
+        req.question = "other"
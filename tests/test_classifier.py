@@ -0,0 +1,31 @@
+"""
+tests/test_classifier.py - classifier.py のテスト
+"""
+
+import os
+
+import classifier
+
+
+def test_rules_cached_until_file_changes(tmp_path, monkeypatch):
+    """分類ルール YAML はインスタンスを作り直しても mtime/size が変わるまで再パースしない"""
+    rules = tmp_path / "rules.yaml"
+    rules.write_text("allowed_categories: [住宅]\n", encoding="utf-8")
+    monkeypatch.setattr(classifier, "_RULES_CACHE", {})
+
+    calls = []
+    real_load = classifier.yaml.load
+    monkeypatch.setattr(classifier.yaml, "load", lambda *a, **kw: calls.append(1) or real_load(*a, **kw))
+
+    assert classifier.DocumentClassifier(str(rules)).rules == {"allowed_categories": ["住宅"]}
+    assert classifier.DocumentClassifier(str(rules)).rules == {"allowed_categories": ["住宅"]}
+    assert len(calls) == 1
+
+    rules.write_text("allowed_categories: [住宅, 店舗]\n", encoding="utf-8")
+    os.utime(rules, ns=(1, 1))
+    assert classifier.DocumentClassifier(str(rules)).rules == {"allowed_categories": ["住宅", "店舗"]}
+    assert len(calls) == 2
+
+
+def test_missing_rules_file_returns_empty(tmp_path):
+    assert classifier.DocumentClassifier(str(tmp_path / "none.yaml")).rules == {}
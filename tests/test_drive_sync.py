@@ -0,0 +1,62 @@
+"""
+tests/test_drive_sync.py - drive_sync のアップロード同期の多重起動抑止テスト
+
+Google Drive API は呼ばず、1 回分の同期処理 (_sync_upload_once) をモックする。
+"""
+
+from unittest.mock import patch
+
+import drive_sync
+
+
+def test_concurrent_upload_syncs_are_coalesced():
+    """同期中に来た複数の要求は 1 回の再実行にまとめられる"""
+    calls = []
+
+    def fake_once(folder):
+        calls.append(folder)
+        if len(calls) == 1:
+            # 実行中に 3 回トリガーされた状況を再現
+            for _ in range(3):
+                assert drive_sync.sync_upload_to_drive(folder)["status"] == "coalesced"
+        return {"status": "success", "folder": folder}
+
+    with patch("drive_sync._sync_upload_once", side_effect=fake_once):
+        result = drive_sync.sync_upload_to_drive("KB")
+
+    assert result["status"] == "success"
+    assert calls == ["KB", "KB"]
+    assert drive_sync._upload_sync_running is False
+
+
+def test_upload_sync_flag_reset_on_error():
+    with patch("drive_sync._sync_upload_once", side_effect=RuntimeError("boom")):
+        try:
+            drive_sync.sync_upload_to_drive("KB")
+        except RuntimeError:
+            pass
+
+    with patch("drive_sync._sync_upload_once", return_value={"status": "success"}) as once:
+        assert drive_sync.sync_upload_to_drive("KB")["status"] == "success"
+        assert once.call_count == 1
+
+
+def test_auth_status_cached_within_ttl_and_invalidated():
+    """TTL 内は get_auth_status を再実行せず、invalidate 後は再取得する"""
+    drive_sync.invalidate_auth_status_cache()
+    with patch("drive_sync.get_auth_status", return_value={"authenticated": True}) as status:
+        assert drive_sync.get_auth_status_cached()["authenticated"] is True
+        drive_sync.get_auth_status_cached()
+        assert status.call_count == 1
+
+        # 呼び出し側が結果を書き換えてもキャッシュは汚れない
+        drive_sync.get_auth_status_cached()["authenticated"] = False
+        assert drive_sync.get_auth_status_cached()["authenticated"] is True
+
+        drive_sync.invalidate_auth_status_cache()
+        drive_sync.get_auth_status_cached()
+        assert status.call_count == 2
+
+        drive_sync.get_auth_status_cached(ttl=0)
+        assert status.call_count == 3
+    drive_sync.invalidate_auth_status_cache()
@@ -0,0 +1,42 @@
+"""utils.file_hash のテスト"""
+
+import hashlib
+import os
+
+from utils import file_hash
+
+
+def test_sha256_file_matches_full_read(tmp_path):
+    """チャンク読みでも一括読みと同じダイジェストになる"""
+    path = tmp_path / "a.bin"
+    data = os.urandom(5000)
+    path.write_bytes(data)
+    assert file_hash.sha256_file(path, chunk_size=333) == hashlib.sha256(data).hexdigest()
+
+
+def test_cached_sha256_file_skips_rehash_until_modified(tmp_path, monkeypatch):
+    """mtime/size が変わらない間は再計算せず、変更後は再計算する"""
+    file_hash._HASH_CACHE.clear()
+    path = tmp_path / "b.pdf"
+    path.write_bytes(b"first")
+    calls = []
+    real = file_hash.sha256_file
+    monkeypatch.setattr(file_hash, "sha256_file", lambda p, *a, **kw: calls.append(p) or real(p))
+
+    assert file_hash.cached_sha256_file(path) == hashlib.sha256(b"first").hexdigest()
+    assert file_hash.cached_sha256_file(path) == hashlib.sha256(b"first").hexdigest()
+    assert len(calls) == 1
+
+    path.write_bytes(b"second!")
+    assert file_hash.cached_sha256_file(path) == hashlib.sha256(b"second!").hexdigest()
+    assert len(calls) == 2
+
+
+def test_remember_sha256_seeds_cache(tmp_path, monkeypatch):
+    """アップロード時に登録したハッシュはファイルを読まずに返る"""
+    file_hash._HASH_CACHE.clear()
+    path = tmp_path / "c.pdf"
+    path.write_bytes(b"payload")
+    file_hash.remember_sha256(path, "precomputed")
+    monkeypatch.setattr(file_hash, "sha256_file", lambda *a, **kw: (_ for _ in ()).throw(AssertionError("rehash")))
+    assert file_hash.cached_sha256_file(path) == "precomputed"
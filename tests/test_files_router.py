@@ -0,0 +1,567 @@
+"""
+tests/test_files_router.py - routers/files.py のアップロード・ファイル操作ヘルパーのテスト
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import UploadFile
+
+from routers import files
+
+
+def _upload(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="sample.pdf")
+
+
+# ---- _stream_upload_to_disk ----
+
+def test_stream_upload_writes_file_and_hashes(tmp_path, monkeypatch):
+    """チャンク分割しても内容・サイズ・SHA-256 が全体読み込みと一致する"""
+    monkeypatch.setattr(files, "UPLOAD_CHUNK_SIZE", 4)
+    data = b"%PDF-1.4 streamed upload body"
+    dest = tmp_path / "out.pdf"
+
+    size, digest = asyncio.run(files._stream_upload_to_disk(_upload(data), dest, 1024))
+
+    assert size == len(data)
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert dest.read_bytes() == data
+
+
+def test_stream_upload_runs_on_dedicated_executor(tmp_path, monkeypatch):
+    """コピーは既定の executor ではなくアップロード専用のスレッドで実行される"""
+    import threading
+
+    seen = []
+    real_copy = files._copy_upload
+
+    def spy(src, dest, max_size):
+        seen.append(threading.current_thread().name)
+        return real_copy(src, dest, max_size)
+
+    monkeypatch.setattr(files, "_copy_upload", spy)
+    asyncio.run(files._stream_upload_to_disk(_upload(b"abc"), tmp_path / "a.bin", 1024))
+    assert seen and seen[0].startswith("upload_io")
+
+
+def test_stream_upload_too_large_removes_partial_file(tmp_path, monkeypatch):
+    """上限超過時は _UploadTooLarge を送出し、書きかけのファイルを残さない"""
+    monkeypatch.setattr(files, "UPLOAD_CHUNK_SIZE", 4)
+    dest = tmp_path / "big.pdf"
+
+    with pytest.raises(files._UploadTooLarge):
+        asyncio.run(files._stream_upload_to_disk(_upload(b"x" * 20), dest, 10))
+
+    assert not dest.exists()
+
+
+# ---- 削除・閲覧のスレッドオフロード用ヘルパー ----
+
+def test_bulk_delete_sync_rejects_traversal(tmp_path, monkeypatch):
+    """KB 外を指すパスは削除せず Access denied として返す"""
+    import config
+    import indexer
+
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path))
+    collection = MagicMock()
+    client = MagicMock()
+    client.get_or_create_collection.return_value = collection
+    monkeypatch.setattr(indexer, "get_chroma_client", lambda: client)
+    deleted = []
+    monkeypatch.setattr(indexer, "delete_file_completely",
+                        lambda p, collection=None: deleted.append((p, collection)) or {"errors": []})
+
+    count, errors = files._bulk_delete_sync(["ok.md", "ok2.md", "../outside.md"])
+
+    assert count == 2
+    # コレクションはバッチ全体で 1 回だけ取得され、各削除に渡される
+    assert client.get_or_create_collection.call_count == 1
+    assert deleted == [("ok.md", collection), ("ok2.md", collection)]
+    assert errors == ["../outside.md: Access denied"]
+
+
+def test_resolve_view_target_missing_file_is_404(tmp_path, monkeypatch):
+    import config
+    from fastapi import HTTPException
+
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path / "kb"))
+    monkeypatch.setattr(config, "BASE_DIR", str(tmp_path))
+
+    with pytest.raises(HTTPException) as exc:
+        files._resolve_view_target("missing.pdf")
+    assert exc.value.status_code == 404
+
+
+def test_resolve_view_target_falls_back_to_input_dir(tmp_path, monkeypatch):
+    """KB に無いファイルは input/ から返し、input/ の外は参照しない"""
+    import config
+
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path / "kb"))
+    monkeypatch.setattr(config, "BASE_DIR", str(tmp_path))
+    (tmp_path / "kb").mkdir()
+    (tmp_path / "input" / "sub").mkdir(parents=True)
+    (tmp_path / "input" / "sub" / "a.pdf").write_bytes(b"%PDF")
+
+    path, st = files._resolve_view_target("sub/x/../a.pdf")
+    assert path == (tmp_path / "input" / "sub" / "a.pdf").resolve()
+    assert st.st_size == 4
+    assert files.safe_join(tmp_path / "input", "../kb/secret.pdf") is None
+
+
+def test_sha256_file_matches_full_read(tmp_path):
+    from indexer import _sha256_file
+
+    path = tmp_path / "doc.pdf"
+    data = b"%PDF" * 1000
+    path.write_bytes(data)
+    assert _sha256_file(path, chunk_size=7) == hashlib.sha256(data).hexdigest()
+
+
+# ---- get_files_tree のキャッシュ ----
+
+def test_files_tree_cached_until_invalidated(tmp_path, monkeypatch):
+    """指紋が同じ間はツリーを再構築せず、invalidate_tree_cache() 後は再構築する"""
+    import config
+    import database
+
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(database, "get_session", lambda: MagicMock())
+    monkeypatch.setattr(files, "_tree_fingerprint",
+                        lambda root, session: (files._TREE_CACHE_EPOCH, "stamp"))
+    built = []
+    monkeypatch.setattr(files, "build_tree_recursive",
+                        lambda *a, **kw: built.append(1) or {"name": "kb", "children": []})
+    files.invalidate_tree_cache()
+
+    first = files.get_files_tree()
+    second = files.get_files_tree()
+    assert len(built) == 1
+    assert first.body == second.body
+    assert json.loads(second.body) == {"name": "kb", "children": []}
+
+    files.invalidate_tree_cache()
+    files.get_files_tree()
+    assert len(built) == 2
+
+
+def test_files_tree_concurrent_misses_build_once(tmp_path, monkeypatch):
+    """同じ指紋でのキャッシュミスが同時に来ても、ツリーの構築は 1 回だけ"""
+    import threading
+    import time
+    import config
+    import database
+
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(database, "get_session", lambda: MagicMock())
+    monkeypatch.setattr(files, "_tree_fingerprint",
+                        lambda root, session: (files._TREE_CACHE_EPOCH, "stamp"))
+    built = []
+
+    def slow_build(*a, **kw):
+        built.append(1)
+        time.sleep(0.2)
+        return {"name": "kb", "children": []}
+
+    monkeypatch.setattr(files, "build_tree_recursive", slow_build)
+    files.invalidate_tree_cache()
+
+    bodies = []
+    threads = [threading.Thread(target=lambda: bodies.append(files.get_files_tree().body)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(built) == 1
+    assert len(set(bodies)) == 1 and len(bodies) == 4
+
+
+def test_kb_dir_stamp_detects_changes_in_category_dirs(tmp_path):
+    """カテゴリフォルダ内へのファイル追加でも指紋が変わる（ルートの mtime は変わらない）"""
+    cat = tmp_path / "01_法規"
+    cat.mkdir()
+    os.utime(cat, ns=(1_000_000_000, 1_000_000_000))
+    before = files._kb_dir_stamp(tmp_path)
+
+    (cat / "new.md").write_text("x", encoding="utf-8")
+    assert files._kb_dir_stamp(tmp_path) != before
+    assert files._kb_dir_stamp(tmp_path / "missing") is None
+
+
+# ---- build_tree_recursive ----
+
+def test_build_tree_recursive_structure(tmp_path):
+    """ディレクトリ優先・名前順で並び、同名 .md があれば OCR 完了扱いになる"""
+    (tmp_path / "b_dir").mkdir()
+    (tmp_path / "b_dir" / "plan.pdf").write_bytes(b"%PDF")
+    (tmp_path / "b_dir" / "plan.md").write_text("# plan", encoding="utf-8")
+    (tmp_path / "a.pdf").write_bytes(b"%PDF-1")
+    (tmp_path / "photo.png").write_bytes(b"png")
+    (tmp_path / "skip.bin").write_bytes(b"x")
+    (tmp_path / ".hidden.md").write_text("x", encoding="utf-8")
+
+    progress = {"a.pdf": {"status": "processing", "processed_pages": 2, "total_pages": 5}}
+    tree = files.build_tree_recursive(tmp_path, tmp_path, progress, {".pdf", ".md"})
+
+    assert [c["name"] for c in tree["children"]] == ["b_dir", "a.pdf", "photo.png"]
+    sub = tree["children"][0]
+    assert sub["path"] == "b_dir"
+    plan_pdf = next(c for c in sub["children"] if c["name"] == "plan.pdf")
+    assert plan_pdf["path"] == "b_dir/plan.pdf"
+    assert plan_pdf["ocr_status"] == "completed"
+    a_pdf = tree["children"][1]
+    assert a_pdf["size"] == 6
+    assert a_pdf["ocr_status"] == "processing"
+    assert a_pdf["ocr_progress"]["current"] == 2
+    assert tree["children"][2]["ocr_status"] == "none"
+
+
+def test_build_tree_recursive_missing_root(tmp_path):
+    missing = tmp_path / "nope"
+    node = files.build_tree_recursive(missing, missing, {}, {".pdf"})
+    assert node["children"] == []
+
+
+def test_build_tree_recursive_skips_directory_symlinks(tmp_path):
+    """ディレクトリへのシンボリックリンク（循環含む）はたどらず、リンク切れでも同じ階層の他ファイルは残る"""
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "spec.pdf").write_bytes(b"%PDF")
+    (tmp_path / "docs" / "loop").symlink_to(tmp_path, target_is_directory=True)
+    (tmp_path / "docs" / "broken.pdf").symlink_to(tmp_path / "missing.pdf")
+    (tmp_path / "alias.pdf").symlink_to(tmp_path / "docs" / "spec.pdf")
+
+    for executor in (None, files._tree_executor):
+        tree = files.build_tree_recursive(tmp_path, tmp_path, {}, {".pdf"}, executor=executor)
+        assert [c["name"] for c in tree["children"]] == ["docs", "alias.pdf"]
+        assert [c["name"] for c in tree["children"][0]["children"]] == ["spec.pdf"]
+
+
+# ---- upload_multiple_files ----
+
+def test_text_upload_written_directly_to_kb(tmp_path, monkeypatch):
+    """.md は input/ を経由せず KB に直接書き込まれ、フロントマターが付与される"""
+    import config
+    import metadata_repository
+    from fastapi import BackgroundTasks
+
+    monkeypatch.setattr(config, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path / "kb"))
+    repo = MagicMock()
+    repo.create_document_version.return_value = {"legacy_id": "L1", "version_id": "V1"}
+    monkeypatch.setattr(metadata_repository, "MetadataRepository", lambda: repo)
+
+    upload = UploadFile(file=io.BytesIO("# 仕様\n本文".encode("utf-8")), filename="spec.md")
+    tasks = BackgroundTasks()
+    res = asyncio.run(files.upload_multiple_files(tasks, files=[upload], project_id="p"))
+
+    final = tmp_path / "kb" / config.UNCATEGORIZED_FOLDER / "spec.md"
+    assert res["errors"] == []
+    assert res["uploaded"][0]["path"] == str(final)
+    assert list((tmp_path / "input").iterdir()) == []
+    assert not (final.parent / ".spec.md.part").exists()
+    text = final.read_text(encoding="utf-8")
+    assert text.startswith("---\n") and "version_id: V1" in text and text.endswith("# 仕様\n本文")
+    assert repo.create_document_version.call_args.kwargs["file_path"] == str(final)
+    assert len(tasks.tasks) == 1
+    assert tasks.tasks[0].args == ([str(final)],)
+
+
+def test_upload_hash_cache_only_registers_final_paths(tmp_path, monkeypatch):
+    """ハッシュキャッシュには最終パスだけを登録する（.part や、フロントマターを書き足したテキストは登録しない）"""
+    import config
+    import metadata_repository
+    from fastapi import BackgroundTasks
+    from utils import file_hash
+
+    monkeypatch.setattr(config, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path / "kb"))
+    monkeypatch.setattr(file_hash, "_HASH_CACHE", {})
+    repo = MagicMock()
+    repo.create_document_version.side_effect = lambda **kw: {"legacy_id": "L", "version_id": "V"}
+    monkeypatch.setattr(metadata_repository, "MetadataRepository", lambda: repo)
+
+    done_md = "---\nsource_pdf_hash: x\n---\n本文".encode("utf-8")
+    uploads = [
+        UploadFile(file=io.BytesIO(b"%PDF-1"), filename="plan.pdf"),
+        UploadFile(file=io.BytesIO(done_md), filename="done.md"),
+        UploadFile(file=io.BytesIO("本文".encode("utf-8")), filename="plain.md"),
+    ]
+    res = asyncio.run(files.upload_multiple_files(BackgroundTasks(), files=uploads, project_id="p"))
+
+    pdf_path, done_path, _ = (u["path"] for u in res["uploaded"])
+    assert set(file_hash._HASH_CACHE) == {pdf_path, done_path}
+    assert file_hash.cached_sha256_file(done_path) == file_hash.sha256_file(done_path)
+
+
+def test_concurrent_uploads_keep_order_and_distinct_paths(tmp_path, monkeypatch):
+    """同名 PDF を並行処理しても別パスに保存され、結果・タスクは入力順に並ぶ"""
+    import config
+    import metadata_repository
+    from fastapi import BackgroundTasks
+
+    monkeypatch.setattr(config, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path / "kb"))
+    repo = MagicMock()
+    repo.create_document_version.side_effect = lambda **kw: {"legacy_id": kw["file_path"], "version_id": kw["source_pdf_hash"][:8]}
+    monkeypatch.setattr(metadata_repository, "MetadataRepository", lambda: repo)
+
+    uploads = [
+        UploadFile(file=io.BytesIO(b"%PDF-1"), filename="plan.pdf"),
+        UploadFile(file=io.BytesIO(b"%PDF-2"), filename="plan.pdf"),
+        UploadFile(file=io.BytesIO(b"x"), filename="bad.exe"),
+        UploadFile(file=io.BytesIO(b"%PDF-3"), filename="other.pdf"),
+    ]
+    tasks = BackgroundTasks()
+    res = asyncio.run(files.upload_multiple_files(tasks, files=uploads, project_id="p"))
+
+    assert [e["filename"] for e in res["errors"]] == ["bad.exe"]
+    paths = [u["path"] for u in res["uploaded"]]
+    assert len(set(paths)) == 3
+    assert [u["original_name"] for u in res["uploaded"]] == ["plan.pdf", "plan.pdf", "other.pdf"]
+    assert [Path(p).read_bytes() for p in paths] == [b"%PDF-1", b"%PDF-2", b"%PDF-3"]
+    # パイプライン投入は入力順の 1 タスクにまとめられる
+    assert len(tasks.tasks) == 1
+    assert [job[0] for job in tasks.tasks[0].args[0]] == paths
+    assert tasks.tasks[0].args[1] == "p"
+
+
+def test_upload_of_version_in_progress_is_skipped(tmp_path, monkeypatch):
+    """同じ内容の版が処理中なら、書き込んだファイルを破棄しパイプラインにも投入しない"""
+    import config
+    import metadata_repository
+    from fastapi import BackgroundTasks
+
+    monkeypatch.setattr(config, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path / "kb"))
+    repo = MagicMock()
+    repo.create_document_version.return_value = {
+        "version_id": "V1", "document_id": "D1", "skipped": True, "status": "ocr_processing",
+    }
+    monkeypatch.setattr(metadata_repository, "MetadataRepository", lambda: repo)
+
+    upload = UploadFile(file=io.BytesIO(b"%PDF-1"), filename="plan.pdf")
+    tasks = BackgroundTasks()
+    res = asyncio.run(files.upload_multiple_files(tasks, files=[upload], project_id="p"))
+
+    assert res["errors"] == []
+    assert res["uploaded"][0]["status"] == "ocr_processing"
+    assert res["uploaded"][0]["skipped"] is True
+    assert list((tmp_path / "input").iterdir()) == []
+    assert tasks.tasks == []
+
+
+def _raw_request(chunks, content_length=None):
+    """本体を chunks に分けて送る ASGI リクエストを作る"""
+    from starlette.requests import Request
+
+    headers = []
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    messages = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1}
+                for i, c in enumerate(chunks)]
+
+    async def receive():
+        return messages.pop(0)
+
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+def test_upload_stream_writes_body_directly(tmp_path, monkeypatch):
+    """生ボディのアップロードは一時ファイルを介さず input/ に書き出され、multiple と同じ形で返る"""
+    import config
+    import metadata_repository
+    from fastapi import BackgroundTasks
+
+    monkeypatch.setattr(config, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path / "kb"))
+    monkeypatch.setattr(files, "UPLOAD_CHUNK_SIZE", 4)
+    repo = MagicMock()
+    repo.create_document_version.return_value = {"legacy_id": "L1", "version_id": "V1"}
+    monkeypatch.setattr(metadata_repository, "MetadataRepository", lambda: repo)
+
+    body = [b"%PDF-", b"1.4 ", b"streamed"]
+    tasks = BackgroundTasks()
+    res = asyncio.run(files.upload_stream(_raw_request(body), tasks, filename="../plan.pdf", project_id="p"))
+
+    saved = tmp_path / "input" / "plan.pdf"
+    assert res["errors"] == []
+    assert res["uploaded"][0]["path"] == str(saved)
+    assert saved.read_bytes() == b"".join(body)
+    assert res["uploaded"][0]["source_pdf_hash"] == hashlib.sha256(b"".join(body)).hexdigest()
+    assert tasks.tasks[0].args[0][0][0] == str(saved)
+
+
+def test_stream_request_to_disk_enforces_limit(tmp_path):
+    """Content-Length でも受信量でも上限を超えたら書きかけを残さない"""
+    dest = tmp_path / "big.bin"
+    with pytest.raises(files._UploadTooLarge):
+        asyncio.run(files._stream_request_to_disk(_raw_request([b"x"], content_length=99), dest, 10))
+    with pytest.raises(files._UploadTooLarge):
+        asyncio.run(files._stream_request_to_disk(_raw_request([b"x" * 6, b"x" * 6]), dest, 10))
+    assert not dest.exists()
+
+
+# ---- _safe_kb_join ----
+
+def test_safe_kb_join_blocks_traversal(tmp_path, monkeypatch):
+    import config
+
+    kb = tmp_path / "kb"
+    kb.mkdir()
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(kb))
+    root = str(kb.resolve())
+
+    assert files._safe_kb_join("06_設計/a.pdf") == os.path.join(root, "06_設計", "a.pdf")
+    assert files._safe_kb_join("x/../a.pdf") == os.path.join(root, "a.pdf")
+    assert files._safe_kb_join("../kb_other/a.pdf") is None
+    assert files._safe_kb_join("../../etc/passwd") is None
+    assert files._safe_kb_join("/etc/passwd") is None
+
+
+def test_copy_upload_without_readinto(tmp_path):
+    """readinto を持たないファイルオブジェクトでも read でコピーできる"""
+    class ReadOnly:
+        def __init__(self, data):
+            self._buf = io.BytesIO(data)
+
+        def read(self, n):
+            return self._buf.read(n)
+
+    data = b"0123456789" * 3
+    dest = tmp_path / "plain.bin"
+    size, digest = files._copy_upload(ReadOnly(data), dest, 1024)
+    assert (size, digest) == (len(data), hashlib.sha256(data).hexdigest())
+    assert dest.read_bytes() == data
+
+
+def test_copy_upload_rejects_oversized_disk_file_before_writing(tmp_path):
+    """ディスク上の一時ファイルは fstat で上限超過を判定し、書き込み先を作らない"""
+    src_path = tmp_path / "big.bin"
+    src_path.write_bytes(b"x" * 64)
+    dest = tmp_path / "out.bin"
+    with open(src_path, "rb") as src:
+        with pytest.raises(files._UploadTooLarge):
+            files._copy_upload(src, dest, 32)
+    assert not dest.exists()
+
+    with open(src_path, "rb") as src:
+        src.seek(40)
+        assert files._copy_upload(src, dest, 32)[0] == 24
+
+
+def test_build_tree_recursive_parallel_matches_sequential(tmp_path):
+    """executor 指定時も逐次版と同じツリー（並び順含む）を返す"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    for d in ("c_dir", "a_dir", "b_dir"):
+        (tmp_path / d / "inner").mkdir(parents=True)
+        (tmp_path / d / "inner" / f"{d}.md").write_text("x", encoding="utf-8")
+        (tmp_path / d / "doc.pdf").write_bytes(b"%PDF")
+    (tmp_path / "top.md").write_text("x", encoding="utf-8")
+
+    sequential = files.build_tree_recursive(tmp_path, tmp_path, {}, {".pdf", ".md"})
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        parallel = files.build_tree_recursive(tmp_path, tmp_path, {}, {".pdf", ".md"}, executor=ex)
+
+    assert parallel == sequential
+    assert [c["name"] for c in parallel["children"]] == ["a_dir", "b_dir", "c_dir", "top.md"]
+
+
+def test_build_tree_recursive_parallel_scans_every_level_in_executor(tmp_path, monkeypatch):
+    """深い 1 本のカテゴリでも、各階層の走査を executor に投入する"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    deep = tmp_path / "cat"
+    for i in range(4):
+        deep = deep / f"lvl{i}"
+        (deep / "side").mkdir(parents=True)
+        (deep / f"f{i}.pdf").write_bytes(b"%PDF")
+
+    sequential = files.build_tree_recursive(tmp_path, tmp_path, {}, {".pdf"})
+    scanned = []
+    orig = files._scan_tree_level
+
+    def spy(path, node, *args):
+        scanned.append(node["path"])
+        return orig(path, node, *args)
+
+    monkeypatch.setattr(files, "_scan_tree_level", spy)
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        parallel = files.build_tree_recursive(tmp_path, tmp_path, {}, {".pdf"}, executor=ex)
+
+    assert parallel == sequential
+    # ルート + cat + lvl0..3 + 各階層の side
+    assert len(scanned) == 1 + 1 + 4 + 4
+
+
+# ---- view_file ----
+
+def _view_request(if_none_match=None):
+    from starlette.requests import Request
+
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+def test_view_file_inline_with_stat(tmp_path, monkeypatch):
+    """PDF はインライン表示、stat 結果が FileResponse に渡される"""
+    import config
+
+    kb = tmp_path / "kb"
+    kb.mkdir()
+    (kb / "図面.pdf").write_bytes(b"%PDF-1.4")
+    (kb / "data.bin").write_bytes(b"x")
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(kb))
+    monkeypatch.setattr(config, "BASE_DIR", str(tmp_path))
+
+    res = asyncio.run(files.view_file("図面.pdf", _view_request()))
+    assert res.media_type == "application/pdf"
+    assert res.stat_result is not None
+    assert res.headers["content-length"] == "8"
+    assert res.headers["content-disposition"].startswith("inline;")
+
+    res = asyncio.run(files.view_file("data.bin", _view_request()))
+    assert res.headers["content-disposition"].startswith("attachment;")
+
+
+def test_view_file_etag_revalidation(tmp_path, monkeypatch):
+    """一致する If-None-Match には本文なしの 304、内容が変われば新しい ETag で返す"""
+    import config
+
+    kb = tmp_path / "kb"
+    kb.mkdir()
+    target = kb / "spec.md"
+    target.write_text("v1", encoding="utf-8")
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(kb))
+    monkeypatch.setattr(config, "BASE_DIR", str(tmp_path))
+
+    first = asyncio.run(files.view_file("spec.md", _view_request()))
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    res = asyncio.run(files.view_file("spec.md", _view_request(f'"other", W/{etag}')))
+    assert res.status_code == 304 and res.body == b""
+    assert res.headers["etag"] == etag
+
+    target.write_text("version 2", encoding="utf-8")
+    res = asyncio.run(files.view_file("spec.md", _view_request(etag)))
+    assert res.status_code == 200 and res.headers["etag"] != etag
+
+
+def test_view_file_directory_is_404(tmp_path, monkeypatch):
+    import config
+    from fastapi import HTTPException
+
+    (tmp_path / "kb" / "folder").mkdir(parents=True)
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path / "kb"))
+    monkeypatch.setattr(config, "BASE_DIR", str(tmp_path))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(files.view_file("folder", _view_request()))
+    assert exc.value.status_code == 404
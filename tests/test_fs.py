@@ -0,0 +1,41 @@
+"""utils.fs のテスト"""
+
+import errno
+import os
+
+import pytest
+
+from utils import fs
+
+
+def test_move_replace_overwrites_existing(tmp_path):
+    """同一 FS では rename で移動し、既存の移動先は置き換える"""
+    src = tmp_path / "in.pdf"
+    dst = tmp_path / "store" / "abc.pdf"
+    dst.parent.mkdir()
+    src.write_bytes(b"new")
+    dst.write_bytes(b"old")
+    fs.move_replace(src, dst)
+    assert dst.read_bytes() == b"new"
+    assert not src.exists()
+
+
+def test_move_replace_falls_back_across_devices(tmp_path, monkeypatch):
+    """EXDEV のときだけ shutil.move にフォールバックする"""
+    src = tmp_path / "a.pdf"
+    dst = tmp_path / "b.pdf"
+    src.write_bytes(b"x")
+
+    def cross_device(*_a):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(fs.os, "replace", cross_device)
+    moved = []
+    monkeypatch.setattr(fs.shutil, "move", lambda s, d: moved.append((s, d)))
+    fs.move_replace(src, dst)
+    assert moved == [(os.fspath(src), os.fspath(dst))]
+
+
+def test_move_replace_propagates_other_errors(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        fs.move_replace(tmp_path / "missing.pdf", tmp_path / "dst.pdf")
@@ -0,0 +1,29 @@
+"""
+tests/test_gemini_client.py - gemini_client のクライアント再利用のテスト
+"""
+
+from unittest.mock import patch
+
+import gemini_client
+
+
+@patch("gemini_client.genai.Client")
+def test_get_client_for_key_reuses_instance(mock_client):
+    """同じ APIキーではクライアントを 1 度だけ生成し、キーが違えば別インスタンス"""
+    gemini_client._keyed_clients.clear()
+    mock_client.side_effect = lambda api_key: object()
+
+    a = gemini_client.get_client_for_key("key-a")
+    assert gemini_client.get_client_for_key("key-a") is a
+    assert gemini_client.get_client_for_key("key-b") is not a
+    assert mock_client.call_count == 2
+    gemini_client._keyed_clients.clear()
+
+
+@patch("gemini_client.genai.Client")
+def test_get_client_uses_reconfigured_client_without_module_key(mock_client, monkeypatch):
+    """起動時にキー未設定でも、reconfigure 後はそのクライアントを返す"""
+    monkeypatch.setattr(gemini_client, "GEMINI_API_KEY", "")
+    monkeypatch.setattr(gemini_client, "_client", None)
+    gemini_client.reconfigure("new-key")
+    assert gemini_client.get_client() is mock_client.return_value
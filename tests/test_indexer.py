@@ -0,0 +1,195 @@
+"""
+tests/test_indexer.py - indexer の一括インデックス処理のテスト
+
+ChromaDB / Gemini は呼ばずモックでテストする。
+"""
+
+from unittest.mock import MagicMock, patch
+
+import indexer
+
+
+@patch("indexer._invalidate_search_cache")
+@patch("indexer.GeminiEmbeddingFunction")
+@patch("indexer.get_chroma_client")
+def test_index_files_deletes_once_and_indexes_each(mock_client, mock_ef, mock_invalidate, tmp_path, monkeypatch):
+    import config
+
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path))
+    (tmp_path / "cat").mkdir()
+    a = tmp_path / "cat" / "a.md"
+    b = tmp_path / "b.md"
+    a.write_text("a", encoding="utf-8")
+    b.write_text("b", encoding="utf-8")
+    collection = MagicMock()
+    mock_client.return_value.get_or_create_collection.return_value = collection
+
+    processed = []
+
+    def fake_process(info, stats):
+        processed.append(info["rel_path"])
+        if info["filename"] == "b.md":
+            raise RuntimeError("embed failed")
+        stats["indexed"] += 1
+        stats["chunks"] += 3
+        return True
+
+    with patch("indexer.process_and_index_file", side_effect=fake_process):
+        stats = indexer.index_files([str(a), str(b), str(tmp_path.parent / "outside.md")])
+
+    collection.delete.assert_called_once_with(where={"rel_path": {"$in": ["cat/a.md", "b.md"]}})
+    assert mock_client.return_value.get_or_create_collection.call_count == 1
+    assert processed == ["cat/a.md", "b.md"]
+    assert stats == {"chunks": 3, "indexed": 1, "skipped": 0, "errors": 2}
+    mock_invalidate.assert_called_once()
+
+
+def test_file_info_for_index_category(tmp_path):
+    (tmp_path / "06_設計" / "sub").mkdir(parents=True)
+    path = tmp_path / "06_設計" / "sub" / "x.md"
+    path.write_text("x", encoding="utf-8")
+
+    info = indexer._file_info_for_index(path, tmp_path)
+    assert info["rel_path"] == "06_設計/sub/x.md"
+    assert info["category"] == "06_設計"
+    assert info["subcategory"] == "sub"
+    assert info["file_type"] == "md"
+
+
+def test_count_md_files_matches_scan_files(tmp_path):
+    """count_md_files は scan_files と同じ除外ルールで件数だけを返す"""
+    (tmp_path / "a" / "__pycache__").mkdir(parents=True)
+    (tmp_path / "a" / "x.md").write_text("x", encoding="utf-8")
+    (tmp_path / "y.md").write_text("y", encoding="utf-8")
+    (tmp_path / "a" / "__pycache__" / "z.md").write_text("z", encoding="utf-8")
+    (tmp_path / "note.txt").write_text("t", encoding="utf-8")
+
+    assert indexer.count_md_files(tmp_path) == len(indexer.scan_files(tmp_path)) == 2
+    assert indexer.count_md_files(tmp_path / "missing") == 0
+    assert not (tmp_path / "missing").exists()
+
+
+@patch("indexer._delete_doc_index")
+def test_delete_file_completely_unlinks_pdf_md_and_parent_chunks(mock_doc, tmp_path, monkeypatch):
+    """PDF/MD と親チャンク JSON を存在確認なしで 1 回ずつ削除する"""
+    import config
+    kb = tmp_path / "kb"
+    parents = tmp_path / "parents"
+    (kb / "06_設計").mkdir(parents=True)
+    parents.mkdir()
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(kb))
+    monkeypatch.setattr(config, "PARENT_CHUNKS_DIR", str(parents))
+    monkeypatch.setattr(config, "PDF_STORAGE_DIR", str(tmp_path / "pdfs"))
+    (kb / "06_設計" / "plan.pdf").write_bytes(b"%PDF")
+    (kb / "06_設計" / "plan.md").write_text("# plan")
+    pdf_hash = indexer._sha256_file(kb / "06_設計" / "plan.pdf")
+    # ハッシュ名とファイル名の両方に一致する JSON も 1 回だけ数える
+    (parents / f"{pdf_hash[:16]}_plan_0.json").write_text("{}")
+    (parents / "x_plan_1.json").write_text("{}")
+    col = MagicMock()
+    col.get.return_value = {"ids": []}
+
+    results = indexer.delete_file_completely("06_設計/plan.pdf", collection=col)
+
+    assert results["physical_files"] == ["plan.pdf", "plan.md"]
+    assert results["parent_chunks"] == 2
+    assert results["errors"] == []
+    assert list(parents.iterdir()) == []
+
+
+@patch("indexer._delete_doc_index")
+def test_delete_file_completely_txt_is_removed_once(mock_doc, tmp_path, monkeypatch):
+    """.txt では pdf_path と md_path が同じなので 1 回だけ削除する"""
+    import config
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "PARENT_CHUNKS_DIR", str(tmp_path / "parents"))
+    monkeypatch.setattr(config, "PDF_STORAGE_DIR", str(tmp_path / "pdfs"))
+    (tmp_path / "memo.txt").write_text("memo")
+    col = MagicMock()
+    col.get.return_value = {"ids": []}
+
+    results = indexer.delete_file_completely("memo.txt", collection=col)
+
+    assert results["physical_files"] == ["memo.txt"]
+    assert not (tmp_path / "memo.txt").exists()
+
+
+def _fake_embed(texts):
+    if "bad" in texts:
+        raise ValueError("bad input")
+    return [[float(len(t))] for t in texts]
+
+
+def test_query_embeddings_from_concurrent_requests_share_one_call(monkeypatch):
+    """時間窓内に来た複数リクエストのクエリは 1 回の API 呼び出しにまとめ、各自の結果を返す"""
+    import threading
+    import config
+
+    monkeypatch.setattr(config, "QUERY_EMBED_BATCH_WINDOW_MS", 100)
+    calls = []
+    monkeypatch.setattr(indexer, "_embed_query_texts", lambda ts: calls.append(list(ts)) or _fake_embed(ts))
+
+    inputs = [["a"], ["bb", "ccc"], ["dddd"]]
+    results = [None] * len(inputs)
+
+    def worker(i):
+        results[i] = indexer.get_query_embeddings_batch(inputs[i])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(inputs))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1 and sorted(calls[0]) == ["a", "bb", "ccc", "dddd"]
+    assert results == [[[1.0]], [[2.0], [3.0]], [[4.0]]]
+
+
+def test_query_embed_batch_splits_and_isolates_failures(monkeypatch):
+    """上限件数で呼び出しを分け、まとめた呼び出しの失敗は要求ごとの取り直しで他に波及させない"""
+    from concurrent.futures import Future
+    import config
+
+    monkeypatch.setattr(config, "QUERY_EMBED_BATCH_MAX", 3)
+    calls = []
+    monkeypatch.setattr(indexer, "_embed_query_texts", lambda ts: calls.append(list(ts)) or _fake_embed(ts))
+
+    batch = [(["a", "bb"], Future()), (["bad"], Future()), (["ccc", "dddd"], Future())]
+    indexer._QueryEmbedBatcher._run(batch)
+
+    assert calls == [["a", "bb", "bad"], ["a", "bb"], ["bad"], ["ccc", "dddd"]]
+    assert batch[0][1].result() == [[1.0], [2.0]]
+    assert isinstance(batch[1][1].exception(), ValueError)
+    assert batch[2][1].result() == [[3.0], [4.0]]
+
+
+def test_query_embeddings_direct_when_window_disabled(monkeypatch):
+    import config
+
+    monkeypatch.setattr(config, "QUERY_EMBED_BATCH_WINDOW_MS", 0)
+    monkeypatch.setattr(indexer, "_embed_query_texts", _fake_embed)
+    assert indexer.get_query_embeddings_batch(["ab"]) == [[2.0]]
+    assert indexer.get_query_embeddings_batch([]) == []
+
+
+@patch("indexer._upsert_doc_index")
+@patch("indexer.LexicalIndexer")
+@patch("indexer.DenseIndexer")
+@patch("indexer.ChunkBuilder")
+@patch("indexer.MetadataRepository")
+def test_process_and_index_file_invalidates_answer_cache(mock_repo, mock_builder, mock_dense, mock_lexical,
+                                                         mock_upsert, tmp_path):
+    """アップロード経路の単一ファイルインデックスでも /api/chat の回答キャッシュが破棄される"""
+    import chat_cache
+
+    md = tmp_path / "spec.md"
+    md.write_text("---\nsource_pdf_hash: abc\n---\n本文", encoding="utf-8")
+    mock_repo.return_value.create_document_version.return_value = {"version_id": "V1"}
+    mock_builder.return_value.build.return_value = [{"text": "本文"}]
+    info = {"rel_path": "spec.md", "full_path": str(md), "filename": "spec.md", "file_type": "md"}
+    stats = {"indexed": 0, "skipped": 0, "errors": 0, "chunks": 0}
+
+    epoch = chat_cache.current_epoch()
+    assert indexer.process_and_index_file(info, stats) is True
+    assert stats["indexed"] == 1
+    assert chat_cache.current_epoch() > epoch
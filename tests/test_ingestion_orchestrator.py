@@ -0,0 +1,52 @@
+"""
+tests/test_ingestion_orchestrator.py - 取り込みジョブ投入のテスト
+
+各ステージ（OCR・Gemini）は実行せず、共有キューへの投入だけを確認する。
+"""
+
+from unittest.mock import MagicMock, patch
+
+import ingestion_orchestrator
+
+
+def _orchestrator():
+    with patch("metadata_repository.MetadataRepository"), \
+            patch("ingestion_orchestrator.MetadataEnricher"):
+        return ingestion_orchestrator.IngestionOrchestrator()
+
+
+def test_enqueue_job_submits_to_bounded_executor_instead_of_new_thread():
+    orch = _orchestrator()
+    executor = MagicMock()
+    with patch("ingestion_orchestrator._ingest_executor", executor), \
+            patch("threading.Thread", side_effect=AssertionError("thread per job")):
+        orch.enqueue_job("v1", "/kb/a.pdf", "h1", "pdf", doc_type="catalog")
+        orch.enqueue_job("v2", "/kb/b.m4a", "h2", "audio", project_id="p")
+
+    assert executor.submit.call_args_list[0].args == (orch._run_ocr_stage, "v1", "/kb/a.pdf", "h1", "pdf", "catalog")
+    assert executor.submit.call_args_list[1].args == (orch._run_audio_stage, "v2", "/kb/b.m4a", "h2", "p")
+    orch.repo.update_ingest_stage_by_version_id.assert_any_call("v1", "processing")
+
+
+def test_shutdown_cancels_queued_jobs(monkeypatch):
+    """停止時はキューで待っているジョブを取り消し、実行中のジョブの完了は待たない"""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(ingestion_orchestrator, "_ingest_executor", executor)
+    started, release = threading.Event(), threading.Event()
+
+    def running_job():
+        started.set()
+        release.wait(5)
+
+    running = executor.submit(running_job)
+    queued = [executor.submit(lambda: None) for _ in range(3)]
+    assert started.wait(5)
+
+    ingestion_orchestrator.shutdown_ingest_executor()
+    assert all(f.cancelled() for f in queued)
+    assert not running.done()
+    release.set()
+    running.result(timeout=5)
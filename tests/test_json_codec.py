@@ -0,0 +1,49 @@
+"""
+tests/test_json_codec.py - utils.json_codec（orjson / 標準 json 切替）のテスト
+"""
+
+import importlib
+import json
+import sys
+from unittest.mock import patch
+
+from utils import json_codec
+
+
+def test_dumps_keeps_non_ascii():
+    out = json_codec.dumps({"type": "answer", "data": "耐火被覆"})
+    assert "耐火被覆" in out
+    assert json.loads(out) == {"type": "answer", "data": "耐火被覆"}
+
+
+def test_dumps_bytes_is_utf8_json():
+    out = json_codec.dumps_bytes({"type": "answer", "data": "耐火被覆"})
+    assert isinstance(out, bytes)
+    assert json.loads(out.decode("utf-8")) == {"type": "answer", "data": "耐火被覆"}
+
+
+def test_loads_accepts_str_and_bytes():
+    assert json_codec.loads('{"a": [1, 2]}') == {"a": [1, 2]}
+    assert json_codec.loads('{"a": "日本語"}'.encode("utf-8")) == {"a": "日本語"}
+
+
+def test_stdlib_fallback_without_orjson():
+    with patch.dict(sys.modules, {"orjson": None}):
+        fallback = importlib.reload(json_codec)
+        try:
+            assert fallback.orjson is None
+            assert fallback.dumps({"k": "値"}) == '{"k": "値"}'
+            assert fallback.dumps_bytes({"k": "値"}) == '{"k": "値"}'.encode("utf-8")
+            assert fallback.loads('{"k": 1}') == {"k": 1}
+        finally:
+            importlib.reload(json_codec)
+
+
+def test_fast_json_response_renders_like_json_codec():
+    """既定レスポンスクラスは非 ASCII をエスケープせず、非文字列キーも扱える"""
+    from utils.json_response import FastJSONResponse
+
+    res = FastJSONResponse({"label": "耐火", 1: [True, None]})
+    assert res.media_type == "application/json"
+    assert json.loads(res.body) == {"label": "耐火", "1": [True, None]}
+    assert "耐火".encode("utf-8") in res.body
@@ -0,0 +1,96 @@
+"""
+tests/test_pdf_router.py - routers/pdf.py のテスト
+"""
+
+from unittest.mock import MagicMock, patch
+
+from routers import pdf
+
+
+def _session(key, rows):
+    """list_pdfs が発行する 2 種類のクエリ（指紋・一覧）を模倣するセッション"""
+    session = MagicMock()
+    session.query.return_value.filter.return_value.one.return_value = key
+    session.query.return_value.filter.return_value.all.return_value = rows
+    return session
+
+
+def test_list_pdfs_cached_while_fingerprint_unchanged(monkeypatch):
+    import database
+
+    session = _session(("t1", 1), [("hash1", "a.pdf")])
+    monkeypatch.setattr(database, "get_session", lambda: session)
+    pdf.invalidate_pdf_list_cache()
+
+    assert pdf.list_pdfs() == [{"file_id": "hash1", "filename": "a.pdf"}]
+    assert pdf.list_pdfs() == [{"file_id": "hash1", "filename": "a.pdf"}]
+    # 一覧クエリは 1 回だけ（2 回目は指紋の照合のみ）
+    assert session.query.return_value.filter.return_value.all.call_count == 1
+
+    # 行が更新されると指紋が変わり再取得する
+    session.query.return_value.filter.return_value.one.return_value = ("t2", 2)
+    session.query.return_value.filter.return_value.all.return_value = [("hash1", "a.pdf"), ("hash2", "b.pdf")]
+    assert len(pdf.list_pdfs()) == 2
+    assert session.query.return_value.filter.return_value.all.call_count == 2
+
+
+def test_invalidate_pdf_list_cache_forces_reload(monkeypatch):
+    import database
+
+    session = _session(("t1", 1), [("hash1", "a.pdf")])
+    monkeypatch.setattr(database, "get_session", lambda: session)
+    pdf.invalidate_pdf_list_cache()
+    pdf.list_pdfs()
+    pdf.invalidate_pdf_list_cache()
+    pdf.list_pdfs()
+    assert session.query.return_value.filter.return_value.all.call_count == 2
+
+
+def test_pdf_page_count_cached_by_mtime(tmp_path):
+    import fitz
+
+    path = tmp_path / "doc.pdf"
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page()
+    doc.save(str(path))
+    doc.close()
+
+    st = path.stat()
+    assert pdf._pdf_page_count(path, st) == 3
+
+    # 同じ (mtime, size) ならファイルを開かずキャッシュから返す
+    with patch("fitz.open", side_effect=AssertionError("should not reopen")):
+        assert pdf._pdf_page_count(path, st) == 3
+
+
+def test_pdf_by_path_serves_kb_file_and_blocks_traversal(tmp_path, monkeypatch):
+    """KB 配下のファイルは stat 済みで返し、KB・PDF_STORAGE_DIR の外は参照しない"""
+    import asyncio
+
+    import config
+    import pytest
+    from fastapi import HTTPException
+
+    kb = tmp_path / "kb"
+    storage = tmp_path / "pdfs"
+    (kb / "06_設計").mkdir(parents=True)
+    storage.mkdir()
+    (kb / "06_設計" / "a.pdf").write_bytes(b"%PDF-1")
+    (tmp_path / "secret.pdf").write_bytes(b"%PDF-secret")
+    monkeypatch.setattr(config, "KNOWLEDGE_BASE_DIR", str(kb))
+    monkeypatch.setattr(config, "PDF_STORAGE_DIR", str(storage))
+
+    resp = asyncio.run(pdf.get_pdf_by_path("06_設計/x/../a.pdf"))
+    assert str(resp.path) == str(kb / "06_設計" / "a.pdf")
+    assert resp.headers["content-length"] == "6"
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(pdf.get_pdf_by_path("../secret.pdf"))
+    assert exc.value.status_code == 403
+
+    # ディレクトリは存在しても配信対象にしない
+    (kb / "dir.pdf").mkdir()
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(pdf.get_pdf_by_path("dir.pdf"))
+    assert exc.value.status_code == 404
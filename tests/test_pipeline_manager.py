@@ -0,0 +1,27 @@
+"""
+tests/test_pipeline_manager.py - パイプライン一括投入のテスト
+
+分類（Gemini）・オーケストレーターは呼ばず、PipelineManager をモックする。
+"""
+
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pipeline_manager
+
+
+def test_batch_reuses_one_manager_for_all_jobs():
+    jobs = [(f"/in/{i}.pdf", f"h{i}", f"v{i}") for i in range(6)]
+    manager = MagicMock()
+    with patch("pipeline_manager.PipelineManager", return_value=manager) as cls:
+        pipeline_manager.process_files_pipeline_batch(jobs, "proj")
+
+    assert cls.call_count == 1
+    calls = sorted(c.args for c in manager.process_file.call_args_list)
+    assert calls == sorted((Path(p), h, v, "proj") for p, h, v in jobs)
+
+
+def test_batch_with_no_jobs_does_nothing():
+    with patch("pipeline_manager.PipelineManager") as cls:
+        pipeline_manager.process_files_pipeline_batch([], "proj")
+    cls.assert_not_called()
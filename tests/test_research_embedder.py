@@ -0,0 +1,32 @@
+"""
+tests/test_research_embedder.py - research_engine.embedder のテスト
+
+ChromaDB / Gemini は呼ばずモックでテストする。
+"""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+from research_engine import embedder
+
+
+@patch("gemini_client.get_client", return_value=MagicMock())
+@patch("dense_indexer._embed_batch_with_retry", side_effect=lambda client, docs: [[0.0]] * len(docs))
+@patch("dense_indexer.get_chroma_client")
+def test_report_chunks_share_base_metadata(mock_chroma, mock_embed, mock_gemini):
+    sources_col, reports_col = MagicMock(), MagicMock()
+    mock_chroma.return_value.get_or_create_collection.side_effect = [sources_col, reports_col]
+
+    report = "あ" * 2500
+    asyncio.run(embedder.embed_research("r1", [], report, "質問" * 200))
+
+    kwargs = reports_col.upsert.call_args.kwargs
+    assert kwargs["ids"] == ["r1_report_0", "r1_report_1", "r1_report_2"]
+    assert "".join(kwargs["documents"][:1]) == report[:1000]
+    metas = kwargs["metadatas"]
+    assert len(metas) == 3
+    assert metas[0] == metas[2]
+    assert metas[0] is not metas[1]
+    assert metas[0]["research_id"] == "r1"
+    assert len(metas[0]["question"]) == 200
+    sources_col.upsert.assert_not_called()
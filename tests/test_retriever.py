@@ -0,0 +1,300 @@
+"""
+tests/test_retriever.py - retriever の検索パイプライン部品のユニットテスト
+
+ChromaDB / Gemini API を呼ばずにモックでテストする。
+"""
+
+from unittest.mock import MagicMock, patch
+
+import retriever
+
+
+# ---- ヘルパー ----
+
+def make_query_result(per_query: list[list[tuple[str, dict, float]]]):
+    """collection.query() のレスポンス（クエリごとのリスト）を模倣する。"""
+    return {
+        "documents": [[d for d, _, _ in rows] for rows in per_query],
+        "metadatas": [[m for _, m, _ in rows] for rows in per_query],
+        "distances": [[x for _, _, x in rows] for rows in per_query],
+    }
+
+
+# ---- _search_vectors ----
+
+@patch("retriever.get_query_embeddings_batch", side_effect=lambda ts: [[float(len(t))] for t in ts])
+def test_search_vectors_issues_single_query(mock_embed):
+    collection = MagicMock()
+    collection.query.return_value = make_query_result([
+        [("a", {"rel_path": "a.md"}, 0.1)],
+        [("b", {"rel_path": "b.md"}, 0.3), ("far", {"rel_path": "c.md"}, 1.2)],
+    ])
+
+    hits_lists = retriever._search_vectors(["q1", "query2"], collection, n=5, where={"category": {"$eq": "x"}})
+
+    mock_embed.assert_called_once_with(["q1", "query2"])
+    collection.query.assert_called_once()
+    kwargs = collection.query.call_args.kwargs
+    assert kwargs["query_embeddings"] == [[2.0], [6.0]]
+    assert kwargs["n_results"] == 5
+    assert kwargs["where"] == {"category": {"$eq": "x"}}
+
+    assert len(hits_lists) == 2
+    assert [h["document"] for h in hits_lists[0]] == ["a"]
+    # 距離 > 1.0 は除外される
+    assert [h["document"] for h in hits_lists[1]] == ["b"]
+    assert abs(hits_lists[1][0]["score"] - 0.7) < 1e-9
+
+
+def test_search_vectors_empty_queries():
+    collection = MagicMock()
+    assert retriever._search_vectors([], collection) == []
+    collection.query.assert_not_called()
+
+
+@patch("retriever.get_query_embeddings_batch", return_value=[[0.0]])
+def test_search_vectors_query_failure_returns_empty(mock_embed):
+    collection = MagicMock()
+    collection.query.side_effect = RuntimeError("boom")
+    assert retriever._search_vectors(["q"], collection) == []
+
+
+# ---- _merge_hits ----
+
+def _hit(rel_path: str, idx: int, score: float, search_type: str = "vector") -> dict:
+    return {
+        "document": f"{rel_path}#{idx}",
+        "metadata": {"rel_path": rel_path, "chunk_index": idx},
+        "score": score,
+        "search_type": search_type,
+    }
+
+
+def test_merge_hits_dedups_and_sorts():
+    merged = retriever._merge_hits([
+        [_hit("a.md", 0, 0.5), _hit("b.md", 0, 0.9)],
+        [_hit("a.md", 0, 0.7), _hit("c.md", 1, 0.1)],
+    ], top_k=10)
+    assert [h["metadata"]["rel_path"] for h in merged] == ["b.md", "a.md", "c.md"]
+    # 重複ヒットは max + 0.05 * min で統合され、個別のベクトルスコアも保持される
+    assert abs(merged[1]["score"] - (0.7 + 0.05 * 0.5)) < 1e-9
+    assert merged[1]["vector_scores"] == [0.5, 0.7]
+    assert merged[0]["vector_scores"] == [0.9]
+
+
+def test_merge_hits_keeps_best_document_and_does_not_mutate_input():
+    low = _hit("a.md", 0, 0.4)
+    high = dict(_hit("a.md", 0, 2.0, "lexical"), document="全文検索側の本文")
+    merged = retriever._merge_hits([[low], [high]], top_k=5)
+
+    assert len(merged) == 1
+    assert merged[0]["document"] == "全文検索側の本文"
+    assert merged[0]["search_type"] == "lexical"
+    assert merged[0]["vector_scores"] == [0.4]
+    assert low["score"] == 0.4 and "vector_scores" not in low
+
+
+def test_merge_hits_top_k_partial_selection():
+    hits = [_hit("f.md", i, s) for i, s in enumerate([0.2, 0.8, 0.5, 0.9, 0.1, 0.6])]
+    merged = retriever._merge_hits([hits], top_k=3)
+    assert [h["score"] for h in merged] == [0.9, 0.8, 0.6]
+
+
+def test_merge_hits_empty():
+    assert retriever._merge_hits([[], []]) == []
+    assert retriever._merge_hits([[_hit("a.md", 0, 0.5)]], top_k=0) == []
+
+
+# ---- get_source_files ----
+
+def test_get_source_files_aggregates_per_file():
+    results = {"metadatas": [
+        {"rel_path": "a.pdf", "filename": "a.md", "page_no": 3, "tags_str": "x,y"},
+        {"rel_path": "b.md", "filename": "b.md", "page_no": 1},
+        {"rel_path": "a.pdf", "filename": "a.md", "page_no": 1},
+        {"rel_path": "a.pdf", "filename": "a.md", "page_no": 3},
+        None,
+        {"filename": "no_rel_path.md"},
+    ]}
+    files = retriever.get_source_files(results)
+
+    assert [f["rel_path"] for f in files] == ["a.pdf", "b.md"]
+    a, b = files
+    assert a["source_id"] == "S1" and b["source_id"] == "S2"
+    assert a["hit_count"] == a["relevance_count"] == 3
+    assert a["pages"] == [1, 3]
+    assert a["tags"] == ["x", "y"]
+    # PDF は rel_path を source_pdf にフォールバック、MD は空のまま
+    assert a["source_pdf"] == "a.pdf"
+    assert b["source_pdf"] == ""
+    assert b["source_pdf_name"] == "b.md"
+
+
+# ---- _resolve_parent_chunks ----
+
+def test_resolve_parent_chunks_reads_each_parent_once(tmp_path):
+    (tmp_path / "h1").mkdir()
+    (tmp_path / "h1" / "p0.md").write_text("親チャンク本文", encoding="utf-8")
+    hits = [
+        {"document": "子1", "metadata": {"parent_chunk_id": "h1/p0"}},
+        {"document": "子2", "metadata": {"parent_chunk_id": "h1/p0"}},
+        {"document": "子3", "metadata": {"parent_chunk_id": "h1/missing"}},
+        {"document": "子4", "metadata": {}},
+    ]
+    with patch("indexer.PARENT_CHUNKS_DIR", tmp_path), \
+            patch("pathlib.Path.read_text", autospec=True, side_effect=lambda self, **kw: open(self, encoding="utf-8").read()) as mock_read:
+        resolved = retriever._resolve_parent_chunks(hits)
+
+    assert [h["context_text"] for h in resolved] == ["親チャンク本文", "親チャンク本文", "子3", "子4"]
+    # 共有された親チャンクは 1 回だけ読む（存在しない ID を含めて 2 回）
+    assert mock_read.call_count == 2
+    # 元のヒットは変更しない
+    assert "context_text" not in hits[0]
+
+
+# ---- classify_and_expand fast-path ----
+
+@patch("retriever._call_gemini_json")
+def test_classify_and_expand_skips_trivial_queries(mock_call):
+    for q in ["こんにちは", "  RC造  ", "JIS A 5371", "SUS304"]:
+        assert retriever.classify_and_expand(q) == (None, [q], "")
+    mock_call.assert_not_called()
+
+
+@patch("retriever._call_gemini_json", return_value={
+    "doc_type_filter": "law",
+    "expanded_queries": ["避難階段 幅員", "直通階段 基準"],
+    "hypothetical_doc": "建築基準法施行令第23条",
+})
+def test_classify_and_expand_calls_gemini_for_real_questions(mock_call):
+    q = "避難階段の必要幅員はどのように決まりますか"
+    assert retriever.classify_and_expand(q) == (
+        "law", ["避難階段 幅員", "直通階段 基準"], "建築基準法施行令第23条",
+    )
+    mock_call.assert_called_once_with(q)
+
+
+# ---- _build_where_filter ----
+
+def test_build_where_filter_combinations():
+    assert retriever._build_where_filter(None, None, None, None) is None
+    assert retriever._build_where_filter("pdf", None, None, None) is None
+    assert retriever._build_where_filter("law", None, None, None) == {"doc_type": {"$eq": "law"}}
+
+    where = retriever._build_where_filter("spec", "構造", "7d", ["a", "b"], "any")
+    conds = where["$and"]
+    assert conds[0] == {"doc_type": {"$eq": "spec"}}
+    assert conds[1] == {"category": {"$eq": "構造"}}
+    assert "$gte" in conds[2]["modified_at"]
+    assert conds[3] == {"$or": [{"tags_str": {"$contains": "a"}}, {"tags_str": {"$contains": "b"}}]}
+
+    where_all = retriever._build_where_filter(None, None, "unknown", ["a", "b"], "all")
+    assert where_all == {"$and": [{"tags_str": {"$contains": "a"}}, {"tags_str": {"$contains": "b"}}]}
+
+
+# ---- リランク省略判定 ----
+
+def test_is_confident_without_rerank():
+    strong = [_hit("a.md", i, 0.9) for i in range(5)]
+    assert retriever._is_confident_without_rerank(strong)
+    assert not retriever._is_confident_without_rerank(strong[:4])
+    assert not retriever._is_confident_without_rerank(strong[:4] + [_hit("a.md", 9, 0.5)])
+    # BM25 由来の全文検索スコアは判定に使わない
+    assert not retriever._is_confident_without_rerank(strong[:4] + [_hit("b.md", 0, 12.0, "lexical")])
+
+
+# ---- 平均ベクトル検索 ----
+
+def test_average_embedding_is_normalized_mean():
+    avg = retriever._average_embedding([[2.0, 0.0], [0.0, 5.0]])
+    assert abs(avg[0] - avg[1]) < 1e-6
+    assert abs((avg[0] ** 2 + avg[1] ** 2) - 1.0) < 1e-6
+    # ゼロベクトルが混じっても NaN にならない
+    assert retriever._average_embedding([[0.0, 0.0], [0.0, 0.0]]) == [0.0, 0.0]
+
+
+@patch("retriever.get_query_embeddings_batch", return_value=[[1.0, 0.0], [0.0, 1.0], [1.0, 0.0]])
+def test_search_vectors_average_mode_queries_once(mock_embed):
+    collection = MagicMock()
+    collection.query.return_value = make_query_result([[("a", {"rel_path": "a.md"}, 0.2)]])
+
+    hits_lists = retriever._search_vectors(["q1", "q2", "hyde"], collection, n=15, average=True)
+
+    embeddings = collection.query.call_args.kwargs["query_embeddings"]
+    assert len(embeddings) == 1
+    assert len(hits_lists) == 1 and hits_lists[0][0]["document"] == "a"
+
+
+# ---- DB 非空キャッシュ ----
+
+def test_search_checks_count_only_until_nonempty():
+    collection = MagicMock()
+    collection.count.return_value = 0
+    retriever.invalidate_db_cache()
+    with patch("retriever.get_collection", return_value=collection):
+        assert retriever.search("空のDB", use_lexical=False)["hits"] == []
+        assert collection.count.call_count == 1
+
+        collection.count.return_value = 3
+        with patch("retriever._search_vectors", return_value=[]) as mock_vectors, \
+                patch("retriever.classify_and_expand", return_value=(None, ["q"], "")):
+            retriever.search("質問文です、よろしく", use_lexical=False, use_rerank=False)
+            retriever.search("質問文です、よろしく", use_lexical=False, use_rerank=False)
+        # 非空を一度確認した後は count() を呼ばない
+        assert collection.count.call_count == 2
+        assert mock_vectors.call_count == 2
+
+        retriever.invalidate_db_cache()
+        collection.count.return_value = 0
+        assert retriever.search("再確認", use_lexical=False)["hits"] == []
+        assert collection.count.call_count == 3
+    retriever.invalidate_db_cache()
+
+
+# ---- リランク入力の事前切り詰め ----
+
+def test_truncate_utf8_never_splits_characters():
+    text = "耐火" * 10  # 1 文字 3 バイト
+    out = retriever._truncate_utf8(text, max_bytes=7)
+    assert out == "耐火"
+    assert retriever._truncate_utf8("abc", max_bytes=10) == "abc"
+
+
+def test_merge_hits_precomputes_rerank_text():
+    long_doc = "あ" * 2000
+    merged = retriever._merge_hits([[dict(_hit("a.md", 0, 0.5), document=long_doc)]])
+    assert merged[0]["rerank_text"] == "あ" * (retriever._RERANK_TEXT_MAX_BYTES // 3)
+
+
+# ---- Gemini 失敗のネガティブキャッシュ ----
+
+@patch("retriever._call_gemini_json", side_effect=RuntimeError("503"))
+def test_classify_failure_is_cached(mock_call):
+    retriever._negative_cache.clear()
+    q = "外壁タイルの剥落防止に関する基準を教えて"
+    assert retriever.classify_and_expand(q) == (None, [q], "")
+    assert retriever.classify_and_expand(q) == (None, [q], "")
+    # 2 回目はキャッシュされた失敗により Gemini を呼ばない
+    assert mock_call.call_count == 1
+
+    with patch("retriever.GEMINI_NEGATIVE_CACHE_TTL_SEC", 0):
+        retriever.classify_and_expand(q)
+    assert mock_call.call_count == 2
+    retriever._negative_cache.clear()
+
+
+# ---- コレクションハンドルのキャッシュ ----
+
+@patch("retriever.GeminiEmbeddingFunction")
+@patch("retriever.get_chroma_client")
+def test_get_collection_is_memoized(mock_client, _mock_ef):
+    retriever.invalidate_collection_cache()
+    client = mock_client.return_value
+    first = retriever.get_collection()
+    assert retriever.get_collection() is first
+    assert client.get_or_create_collection.call_count == 1
+
+    retriever.invalidate_collection_cache()
+    retriever.get_collection()
+    assert client.get_or_create_collection.call_count == 2
+    retriever.invalidate_collection_cache()
@@ -0,0 +1,77 @@
+"""
+tests/test_sse.py - utils.sse（SSE フレーム組み立て）のテスト
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from utils.sse import coalesce_answer_parts, sse_frame, SSE_ERROR_PREFIX, SSE_DONE
+
+
+def test_sse_frame_data():
+    frame = sse_frame({"type": "answer", "data": "耐火被覆"})
+    assert isinstance(frame, bytes)
+    assert frame.startswith(b"data: ") and frame.endswith(b"\n\n")
+    assert json.loads(frame[len(b"data: "):-2].decode("utf-8")) == {"type": "answer", "data": "耐火被覆"}
+
+
+def test_sse_frame_error_event():
+    frame = sse_frame({"error": "boom"}, SSE_ERROR_PREFIX)
+    assert frame.startswith(b"event: error\ndata: ")
+    assert SSE_DONE == b"data: [DONE]\n\n"
+
+
+def _collect(agen):
+    async def run():
+        return [p async for p in agen]
+    return asyncio.run(run())
+
+
+async def _parts(items, delay=0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+def test_coalesce_merges_answer_bursts_and_keeps_other_parts_in_order():
+    items = [
+        {"type": "answer", "data": "耐"},
+        {"type": "answer", "data": "火"},
+        {"type": "web_sources", "data": [1]},
+        {"type": "answer", "data": "被覆"},
+    ]
+    out = _collect(coalesce_answer_parts(_parts(items), window=10))
+    assert out == [
+        {"type": "answer", "data": "耐火"},
+        {"type": "web_sources", "data": [1]},
+        {"type": "answer", "data": "被覆"},
+    ]
+
+
+def test_coalesce_flushes_on_size_and_on_window_expiry():
+    items = [{"type": "answer", "data": "abc"}] * 4
+    out = _collect(coalesce_answer_parts(_parts(items), window=10, max_chars=6))
+    assert [p["data"] for p in out] == ["abcabc", "abcabc"]
+
+    # 上流が遅い場合は窓の期限で 1 チャンクずつ送られる
+    out = _collect(coalesce_answer_parts(_parts(items[:2], delay=0.05), window=0.001))
+    assert [p["data"] for p in out] == ["abc", "abc"]
+
+
+def test_coalesce_flushes_buffer_before_reraising():
+    async def failing():
+        yield {"type": "answer", "data": "途中"}
+        raise RuntimeError("boom")
+
+    seen = []
+
+    async def run():
+        async for p in coalesce_answer_parts(failing(), window=10):
+            seen.append(p)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    assert seen == [{"type": "answer", "data": "途中"}]
@@ -0,0 +1,369 @@
+"""
+tests/test_system_router.py - routers/system.py のヘルスチェック部品のテスト
+"""
+
+import asyncio
+import json
+import os
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from routers import system
+
+
+def _run_probe(name, fn, ttl):
+    return asyncio.run(system._probe(name, fn, ttl))
+
+
+@pytest.fixture(autouse=True)
+def _clear_health_cache():
+    system._HEALTH_CACHE.clear()
+    system._HEALTH_LAST_GOOD.clear()
+    yield
+    system._HEALTH_CACHE.clear()
+    system._HEALTH_LAST_GOOD.clear()
+
+
+def test_probe_serves_cached_value_within_ttl(monkeypatch):
+    """TTL 内は fn を呼ばずキャッシュを返し、期限切れで再実行する"""
+    clock = [100.0]
+    monkeypatch.setattr(system.time, "monotonic", lambda: clock[0])
+    fn = MagicMock(return_value="ok")
+
+    assert _run_probe("x", fn, ttl=10) == "ok"
+    clock[0] += 5
+    assert _run_probe("x", fn, ttl=10) == "ok"
+    assert fn.call_count == 1
+
+    clock[0] += 6
+    _run_probe("x", fn, ttl=10)
+    assert fn.call_count == 2
+
+
+def test_probe_falls_back_to_stale_on_failure(monkeypatch):
+    """失敗時は直近の正常値を degraded として返し、正常値が無ければ error"""
+    clock = [0.0]
+    monkeypatch.setattr(system.time, "monotonic", lambda: clock[0])
+    fn = MagicMock(side_effect=["ok (3 chunks)", RuntimeError("down")])
+
+    assert _run_probe("chromadb", fn, ttl=1) == "ok (3 chunks)"
+    clock[0] += 2
+    value = _run_probe("chromadb", fn, ttl=1)
+    assert value.startswith("degraded") and "ok (3 chunks)" in value and "down" in value
+
+    assert _run_probe("other", MagicMock(side_effect=RuntimeError("boom")), ttl=1) == "error: boom"
+
+
+def test_health_check_aggregates_cached_probes(monkeypatch):
+    """全プローブ正常なら 200 / ok、2 回目の呼び出しではプローブを再実行しない"""
+    calls = []
+    probes = tuple((name, (lambda n=name: calls.append(n) or "ok")) for name, _ in system._HEALTH_PROBES)
+    monkeypatch.setattr(system, "_HEALTH_PROBES", probes)
+
+    res = asyncio.run(system.health_check())
+    body = json.loads(res.body)
+    assert res.status_code == 200 and body["status"] == "ok"
+    assert set(body["services"]) == {"server", *system._HEALTH_TTLS}
+
+    asyncio.run(system.health_check())
+    assert len(calls) == len(probes)
+
+
+def test_livez_does_not_touch_probes(monkeypatch):
+    """/api/livez はプローブを実行しない。/api/readyz と /api/health は同じハンドラ"""
+    monkeypatch.setattr(system, "_probe", MagicMock(side_effect=AssertionError("probe called")))
+    assert system.liveness() == {"status": "ok"}
+
+    handlers = {r.path: r.endpoint for r in system.router.routes}
+    assert handlers["/api/livez"] is system.liveness
+    assert handlers["/api/readyz"] is handlers["/api/health"] is system.health_check
+
+
+def test_health_check_runs_probes_concurrently(monkeypatch):
+    """プローブは並行に実行される（全プローブが同時にバリアへ到達できる）"""
+    import threading
+
+    barrier = threading.Barrier(len(system._HEALTH_PROBES), timeout=5)
+
+    def wait_all():
+        barrier.wait()
+        return "ok"
+
+    monkeypatch.setattr(system, "_HEALTH_PROBES", tuple((name, wait_all) for name, _ in system._HEALTH_PROBES))
+    body = json.loads(asyncio.run(system.health_check()).body)
+    assert body["status"] == "ok"
+
+
+def test_iter_source_zip_streams_valid_archive(tmp_path, monkeypatch):
+    """逐次 yield したバイト列を連結すると、除外規則どおりの正しい ZIP になる"""
+    import io
+    import zipfile
+
+    monkeypatch.setattr(system, "_EXPORT_CHUNK_SIZE", 64)
+    monkeypatch.setattr(system, "_EXPORT_YIELD_MIN", 1)
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "big.py").write_bytes(b"print('x')\n" * 100)
+    (tmp_path / "server.py").write_text("app = None\n")
+    (tmp_path / "bundle.zip").write_bytes(b"PK\x05\x06" + b"\0" * 18)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "dep.js").write_text("x")
+    (tmp_path / "pkg" / "node_modules").mkdir()
+    (tmp_path / "pkg" / "node_modules" / "nested.js").write_text("x")
+    (tmp_path / "pkg" / "shot.webp").write_bytes(b"RIFF")
+    old = tmp_path / "pkg" / "old.py"
+    old.write_text("legacy\n")
+    os.utime(old, (0, 0))
+
+    chunks = list(system._iter_source_zip(tmp_path))
+    assert len(chunks) > 2
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert sorted(zf.namelist()) == ["bundle.zip", "pkg/big.py", "pkg/old.py", "server.py"]
+        assert zf.getinfo("pkg/old.py").date_time == (1980, 1, 1, 0, 0, 0)
+        assert zf.read("pkg/big.py") == b"print('x')\n" * 100
+        # 圧縮済み形式は無圧縮、テキストは deflate
+        assert zf.getinfo("bundle.zip").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("pkg/big.py").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.testzip() is None
+
+
+def test_export_extension_rules_ignore_case(tmp_path):
+    """除外・無圧縮の拡張子判定は大文字小文字を区別しない"""
+    import zipfile
+
+    (tmp_path / "Logo.PNG").write_bytes(b"\x89PNG")
+    (tmp_path / "shot.WebP").write_bytes(b"RIFF")
+    (tmp_path / "Photo.JPG").write_bytes(b"\xff\xd8")
+    (tmp_path / "main.py").write_text("x")
+
+    names = sorted(arc for _, arc in system._iter_export_files(tmp_path))
+    assert names == ["Photo.JPG", "main.py"]
+    st = (tmp_path / "Photo.JPG").stat()
+    assert system._export_zipinfo("Photo.JPG", st).compress_type == zipfile.ZIP_STORED
+    assert system._export_zipinfo("main.py", st).compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_iter_source_zip_mixes_parallel_and_streamed_entries(tmp_path, monkeypatch):
+    """並列圧縮したエントリとストリーミングしたエントリが混在しても、順序どおりの正しい ZIP になる"""
+    import io
+    import zipfile
+
+    monkeypatch.setattr(system, "_EXPORT_PARALLEL_MAX_BYTES", 1000)
+    monkeypatch.setattr(system, "_EXPORT_CHUNK_SIZE", 256)
+    payloads = {}
+    for i in range(12):
+        data = (f"# module {i}\n".encode() + os.urandom(300).hex().encode()) * (1 if i % 3 else 5)
+        payloads[f"m{i:02d}.py"] = data
+        (tmp_path / f"m{i:02d}.py").write_bytes(data)
+    payloads["日本語.md"] = "見出し\n".encode("utf-8") * 10
+    (tmp_path / "日本語.md").write_bytes(payloads["日本語.md"])
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(system._iter_source_zip(tmp_path)))) as zf:
+        assert zf.testzip() is None
+        assert {n: zf.read(n) for n in zf.namelist()} == payloads
+        big = zf.getinfo("m00.py")
+        assert big.file_size > 1000 and big.compress_type == zipfile.ZIP_DEFLATED
+
+
+@pytest.mark.parametrize("precompressed", [True, False])
+def test_iter_source_zip_round_trips_with_and_without_zipfile_internals(tmp_path, monkeypatch, precompressed):
+    """ZipFile の内部属性が無い場合は ZipFile.open でのストリーミングに切り替え、どちらでも正しい ZIP になる"""
+    import io
+    import zipfile
+
+    monkeypatch.setattr(system, "_zip_supports_precompressed", lambda zf: precompressed)
+    submitted = []
+    real_submit = system._export_deflate_pool.submit
+    monkeypatch.setattr(system._export_deflate_pool, "submit",
+                        lambda fn, *a: submitted.append(a) or real_submit(fn, *a))
+    payloads = {f"m{i}.py": f"print({i})\n".encode() * (i + 1) * 50 for i in range(6)}
+    for name, data in payloads.items():
+        (tmp_path / name).write_bytes(data)
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(system._iter_source_zip(tmp_path)))) as zf:
+        assert zf.testzip() is None
+        assert {n: zf.read(n) for n in zf.namelist()} == payloads
+        assert all(i.compress_type == zipfile.ZIP_DEFLATED for i in zf.infolist())
+    assert len(submitted) == (len(payloads) if precompressed else 0)
+
+
+def test_iter_source_zip_coalesces_small_files(tmp_path, monkeypatch):
+    """小さいファイルの出力は _EXPORT_YIELD_MIN まで溜めてからまとめて yield する"""
+    import io
+    import zipfile
+
+    monkeypatch.setattr(system, "_EXPORT_YIELD_MIN", 4096)
+    payloads = {f"m{i}.py": os.urandom(400) for i in range(50)}  # 圧縮で縮まない中身
+    for name, data in payloads.items():
+        (tmp_path / name).write_bytes(data)
+
+    chunks = list(system._iter_source_zip(tmp_path))
+    assert 1 < len(chunks) < 50
+    assert all(len(c) >= 4096 for c in chunks[:-1])
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert len(zf.namelist()) == 50
+        assert zf.read("m7.py") == payloads["m7.py"]
+
+
+def test_zip_chunk_sink_keeps_bytes_without_copy():
+    """bytes はそのまま保持し、再利用されうるバッファ（memoryview 等）だけを固定する"""
+    sink = system._ZipChunkSink()
+    data = b"x" * 100
+    sink.write(data)
+    assert sink.drain() is data
+
+    buf = bytearray(b"abc")
+    sink.write(memoryview(buf))
+    buf[:] = b"zzz"
+    sink.write(b"def")
+    assert sink.pending == 6
+    assert sink.drain() == b"abcdef"
+    assert sink.pending == 0
+
+
+def test_iter_source_zip_cancels_prefetch_on_early_close(tmp_path, monkeypatch):
+    """途中で閉じられたら、共有プールに投入済みの先読み圧縮を取り消す"""
+    from concurrent.futures import Future
+
+    monkeypatch.setattr(system, "_EXPORT_YIELD_MIN", 1)
+    for i in range(20):
+        (tmp_path / f"m{i:02d}.py").write_bytes(b"x" * 100)
+    submitted = []
+
+    class _Pool:
+        def submit(self, fn, *args):
+            fut = Future()
+            if not submitted:  # 先頭だけ完了させ、残りは実行待ちのままにする
+                fut.set_result(fn(*args))
+            submitted.append(fut)
+            return fut
+
+    monkeypatch.setattr(system, "_export_deflate_pool", _Pool())
+    gen = system._iter_source_zip(tmp_path)
+    assert next(gen)
+    gen.close()
+
+    assert len(submitted) == system._EXPORT_DEFLATE_WORKERS * 2 + 1
+    assert all(f.cancelled() for f in submitted[1:])
+
+
+def test_check_sqlite_uses_core_connection(monkeypatch):
+    """SQLite プローブは Session を作らず engine の接続で SELECT 1 を実行する"""
+    import database
+
+    engine = MagicMock()
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "get_session", MagicMock(side_effect=AssertionError("session used")))
+    assert system._check_sqlite() == "ok"
+    conn = engine.connect.return_value.__enter__.return_value
+    conn.exec_driver_sql.assert_called_once_with("SELECT 1")
+
+
+def test_get_ocr_status_merges_versions_in_one_query(monkeypatch):
+    """DocumentVersion の詳細ステージ・エラーを反映し、対象外の行は返さない"""
+    from datetime import datetime, timedelta, timezone
+
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+
+    import database
+    from database import Base, DocumentVersion, LegacyDocument
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[LegacyDocument.__table__, DocumentVersion.__table__])
+    Session = sessionmaker(bind=engine)
+    now = datetime.now(timezone.utc)
+    with Session() as s:
+        s.add_all([
+            LegacyDocument(file_path="a.pdf", filename="a.pdf", status="processing", source_pdf_hash="h1", updated_at=now),
+            LegacyDocument(file_path="b.pdf", filename="b.pdf", status="failed", source_pdf_hash="h2",
+                           updated_at=now - timedelta(minutes=1)),
+            LegacyDocument(file_path="old.pdf", filename="old.pdf", status="failed", updated_at=now - timedelta(hours=3)),
+            DocumentVersion(document_id="d", version_hash="h1", ingest_status="indexing"),
+            DocumentVersion(document_id="d", version_hash="h2", ingest_status="failed", error_message="OCR error"),
+        ])
+        s.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    monkeypatch.setattr(database, "get_session", Session)
+
+    res = system.get_ocr_status()
+    assert [j["file_path"] for j in res["jobs"]] == ["a.pdf", "b.pdf"]
+    assert res["jobs"][0]["status"] == "indexing"
+    assert res["jobs"][1]["error_message"] == "OCR error"
+    assert res["processing_count"] == 1
+    assert sum("document_versions" in sql for sql in statements) == 1
+
+
+def test_write_env_var_replaces_or_appends(tmp_path):
+    """既存行は 1 行だけ置換し、無ければ末尾に追記する。一時ファイルは残らない"""
+    env = tmp_path / ".env"
+    env.write_text("FOO=1\nGEMINI_API_KEY=old\nBAR=2", encoding="utf-8")
+    system._write_env_var(env, "GEMINI_API_KEY", "new\\key")
+    assert env.read_text(encoding="utf-8") == "FOO=1\nGEMINI_API_KEY=new\\key\nBAR=2"
+
+    system._write_env_var(env, "OTHER", "x")
+    assert env.read_text(encoding="utf-8") == "FOO=1\nGEMINI_API_KEY=new\\key\nBAR=2\nOTHER=x\n"
+    assert list(tmp_path.iterdir()) == [env]
+
+    fresh = tmp_path / "fresh.env"
+    system._write_env_var(fresh, "GEMINI_API_KEY", "k")
+    assert fresh.read_text(encoding="utf-8") == "GEMINI_API_KEY=k\n"
+
+
+def test_write_env_var_keeps_file_mode(tmp_path):
+    """書き戻し後も既存 .env のパーミッションを保つ。新規作成時は 0600"""
+    env = tmp_path / ".env"
+    env.write_text("GEMINI_API_KEY=old\n", encoding="utf-8")
+    os.chmod(env, 0o600)
+    system._write_env_var(env, "GEMINI_API_KEY", "new")
+    assert env.read_text(encoding="utf-8") == "GEMINI_API_KEY=new\n"
+    assert os.stat(env).st_mode & 0o777 == 0o600
+
+    os.chmod(env, 0o640)
+    system._write_env_var(env, "GEMINI_API_KEY", "newer")
+    assert os.stat(env).st_mode & 0o777 == 0o640
+
+    fresh = tmp_path / "fresh.env"
+    system._write_env_var(fresh, "GEMINI_API_KEY", "k")
+    assert os.stat(fresh).st_mode & 0o777 == 0o600
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".env", "fresh.env"]
+
+
+def test_rebuild_index_requests_share_running_build(monkeypatch):
+    """実行中の再構築と同じ指定の要求は新たに build_index を走らせず、結果を共有する"""
+    import threading
+    import indexer
+
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    stats = {"total_files": 1, "indexed": 1, "skipped": 0, "errors": 0, "chunks": 3}
+
+    def fake_build(force_rebuild=False):
+        calls.append(force_rebuild)
+        started.set()
+        release.wait(5)
+        return stats
+
+    monkeypatch.setattr(indexer, "build_index", fake_build)
+    results = []
+    first = threading.Thread(target=lambda: results.append(system.rebuild_index(force=False)))
+    first.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(system.rebuild_index(force=False)))
+                 for _ in range(3)]
+    for t in followers:
+        t.start()
+    # 後続が in-flight の Future を取得して待ちに入るまで少し待ってから解放する
+    time.sleep(0.2)
+    release.set()
+    for t in [first, *followers]:
+        t.join(5)
+
+    assert calls == [False]
+    assert [r.chunks for r in results] == [3, 3, 3, 3]
+    assert system._INDEX_INFLIGHT == {}
@@ -0,0 +1,42 @@
+"""
+tests/test_tags_router.py - routers/tags.py のテスト
+"""
+
+import asyncio
+import json
+import os
+
+from routers import tags
+
+
+def test_get_tags_cached_until_file_changes(tmp_path, monkeypatch):
+    """YAML は mtime/size が変わるまで再パースしない"""
+    rules = tmp_path / "classification_rules.yaml"
+    rules.write_text("available_tags:\n  用途: [住宅]\n", encoding="utf-8")
+    monkeypatch.setattr(tags, "_RULES_PATH", rules)
+    monkeypatch.setattr(tags, "_TAGS_CACHE", None)
+
+    import yaml
+    calls = []
+    real_load = yaml.load
+    monkeypatch.setattr(yaml, "load", lambda *a, **kw: calls.append(1) or real_load(*a, **kw))
+
+    assert tags.get_tags() == {"用途": ["住宅"]}
+    assert tags.get_tags() == {"用途": ["住宅"]}
+    assert len(calls) == 1
+
+    rules.write_text("available_tags:\n  用途: [住宅, 店舗]\n", encoding="utf-8")
+    os.utime(rules, ns=(1, 1))
+    assert tags.get_tags() == {"用途": ["住宅", "店舗"]}
+    assert len(calls) == 2
+
+
+def test_get_tags_missing_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(tags, "_RULES_PATH", tmp_path / "none.yaml")
+    assert tags.get_tags() == {}
+
+
+def test_list_categories():
+    res = json.loads(asyncio.run(tags.list_categories()).body)
+    assert res["categories"][0] == {"value": None, "label": "全て（横断検索）"}
+    assert len(res["categories"]) == 9
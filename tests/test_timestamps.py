@@ -0,0 +1,31 @@
+"""utils.timestamps のテスト"""
+
+from datetime import datetime, timezone
+
+from utils import timestamps
+
+
+def test_utc_now_iso_matches_datetime_isoformat(monkeypatch):
+    """datetime.isoformat() と同じ書式（マイクロ秒・UTC オフセット付き）になる"""
+    ns = 1_760_000_000_123_456_000
+    monkeypatch.setattr(timestamps.time, "time_ns", lambda: ns)
+    expected = datetime.fromtimestamp(ns / 1e9, timezone.utc).replace(microsecond=123456).isoformat()
+    assert timestamps.utc_now_iso() == expected
+
+
+def test_utc_now_iso_whole_second_omits_microseconds(monkeypatch):
+    """マイクロ秒が 0 のときは isoformat() 同様に小数部を省略する"""
+    ns = 1_760_000_001_000_000_000
+    monkeypatch.setattr(timestamps.time, "time_ns", lambda: ns)
+    assert timestamps.utc_now_iso() == datetime.fromtimestamp(1_760_000_001, timezone.utc).isoformat()
+
+
+def test_utc_now_iso_reuses_second_prefix(monkeypatch):
+    """同一秒内では秒までの整形を使い回し、秒が変われば更新する"""
+    ticks = iter([5_000_000_000_000_001_000, 5_000_000_000_000_002_000, 5_000_000_001_000_003_000])
+    monkeypatch.setattr(timestamps.time, "time_ns", lambda: next(ticks))
+    a = timestamps.utc_now_iso()
+    b = timestamps.utc_now_iso()
+    c = timestamps.utc_now_iso()
+    assert a[:19] == b[:19] != c[:19]
+    assert a < b < c
@@ -0,0 +1,44 @@
+"""
+tests/test_transcribe.py - 音声アップロード読み込みのテスト
+
+Gemini は呼ばず、read_audio_upload の上限チェックだけを確認する。
+"""
+
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import config
+from routers import transcribe
+
+
+def _upload(data: bytes, size=None) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), size=size, filename="a.webm")
+
+
+def test_read_audio_upload_reads_in_chunks(monkeypatch):
+    monkeypatch.setattr(transcribe, "_AUDIO_READ_CHUNK", 4)
+    assert asyncio.run(transcribe.read_audio_upload(_upload(b"0123456789"))) == b"0123456789"
+
+
+def test_read_audio_upload_rejects_oversized_without_reading_all(monkeypatch):
+    """サイズ不明でも上限を超えた時点で 413 を返し、残りは読まない"""
+    monkeypatch.setattr(config, "TRANSCRIBE_MAX_AUDIO_BYTES", 8)
+    monkeypatch.setattr(transcribe, "_AUDIO_READ_CHUNK", 4)
+    upload = _upload(b"x" * 100)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(transcribe.read_audio_upload(upload))
+    assert exc.value.status_code == 413
+    assert upload.file.tell() == 12
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(transcribe.read_audio_upload(_upload(b"", size=100)))
+    assert exc.value.status_code == 413
+
+
+def test_read_audio_upload_rejects_empty():
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(transcribe.read_audio_upload(_upload(b"")))
+    assert exc.value.status_code == 400
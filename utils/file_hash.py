@@ -0,0 +1,62 @@
+"""ファイルの SHA-256 計算ヘルパー
+
+source_pdf_hash / version_hash は重複排除のキーなので SHA-256 のまま維持し、
+ファイル全体をメモリに載せないチャンク読みと、(mtime, size) をキーにしたメモ化で
+同じファイルを何度もハッシュしないようにする。
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, Tuple
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+_HASH_CACHE: Dict[str, Tuple[int, int, str]] = {}
+_HASH_CACHE_LOCK = threading.Lock()
+_HASH_CACHE_MAX = 1024
+
+
+def sha256_file(path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """ファイルの SHA-256 をチャンク読みで計算
+
+    既定のチャンクサイズでは hashlib.file_digest（Python 3.11+）に任せる。読み込みバッファを
+    使い回し、ハッシュ計算中は GIL を解放する。
+    """
+    if chunk_size == HASH_CHUNK_SIZE and hasattr(hashlib, "file_digest"):
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def cached_sha256_file(path) -> str:
+    """sha256_file のメモ化版（mtime_ns と size が変わらない限り再計算しない）"""
+    key = os.fspath(path)
+    st = os.stat(key)
+    with _HASH_CACHE_LOCK:
+        hit = _HASH_CACHE.get(key)
+    if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        return hit[2]
+    digest = sha256_file(key)
+    with _HASH_CACHE_LOCK:
+        if len(_HASH_CACHE) >= _HASH_CACHE_MAX:
+            _HASH_CACHE.clear()
+        _HASH_CACHE[key] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def remember_sha256(path, digest: str) -> None:
+    """アップロード時など、既に計算済みのハッシュをキャッシュに登録する"""
+    key = os.fspath(path)
+    try:
+        st = os.stat(key)
+    except OSError:
+        return
+    with _HASH_CACHE_LOCK:
+        if len(_HASH_CACHE) >= _HASH_CACHE_MAX:
+            _HASH_CACHE.clear()
+        _HASH_CACHE[key] = (st.st_mtime_ns, st.st_size, digest)
@@ -0,0 +1,40 @@
+"""ファイル移動・パス結合ヘルパー"""
+
+import errno
+import functools
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+
+def move_replace(src, dst) -> None:
+    """src を dst へ移動する（dst が存在すれば置き換える）
+
+    同一ファイルシステム上なら os.replace の 1 回の rename で済ませ、
+    shutil.move の事前 stat やコピー経路を通らない。別デバイス間（EXDEV）のみ shutil.move にフォールバックする。
+    """
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(os.fspath(src), os.fspath(dst))
+
+
+@functools.lru_cache(maxsize=8)
+def resolved_root(root: str) -> str:
+    """ルートディレクトリの実パス（realpath は構成要素ごとに syscall が走るため一度だけ解決して使い回す）"""
+    return str(Path(root).resolve())
+
+
+def safe_join(root_dir, rel_path: str) -> Optional[str]:
+    """root_dir と相対パスを結合した絶対パスを返す。root_dir 外を指す場合は None。
+
+    パストラバーサル（..）の判定は文字列正規化で行い、ファイルごとの resolve() を避ける。
+    """
+    root = resolved_root(str(root_dir))
+    target = os.path.normpath(os.path.join(root, rel_path))
+    if target != root and not target.startswith(root + os.sep):
+        return None
+    return target
@@ -0,0 +1,42 @@
+"""ホットパス（SSE フレーム・Gemini レスポンス解析）用の JSON エンコード/デコード
+
+orjson（C 実装）が使える場合はそれを使い、無ければ標準ライブラリの json にフォールバックする。
+どちらの場合も非 ASCII（日本語）はエスケープせず UTF-8 のまま出力する（ensure_ascii=False 相当）。
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson は任意依存
+    orjson = None
+
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> str:
+        """obj を JSON 文字列に変換"""
+        return orjson.dumps(obj, option=_ORJSON_OPTS).decode("utf-8")
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """obj を UTF-8 の JSON バイト列に変換（str を経由しない）"""
+        return orjson.dumps(obj, option=_ORJSON_OPTS)
+
+    def loads(data: Any) -> Any:
+        """JSON 文字列（str / bytes）をパース"""
+        return orjson.loads(data)
+
+else:
+    def dumps(obj: Any) -> str:
+        """obj を JSON 文字列に変換"""
+        return json.dumps(obj, ensure_ascii=False)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """obj を UTF-8 の JSON バイト列に変換"""
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def loads(data: Any) -> Any:
+        """JSON 文字列（str / bytes）をパース"""
+        return json.loads(data)
@@ -0,0 +1,19 @@
+"""FastAPI の既定レスポンスクラス
+
+starlette の JSONResponse は標準ライブラリの json.dumps で本文を作る。
+大きな dict/list を返すエンドポイント（ファイル一覧・ツリー等）のため、json_codec（orjson 優先、
+未導入時は標準 json）でバイト列を直接作るサブクラスを既定にする。
+"""
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from utils import json_codec
+
+
+class FastJSONResponse(JSONResponse):
+    """json_codec で本文をエンコードする JSONResponse（非 ASCII はエスケープしない）"""
+
+    def render(self, content: Any) -> bytes:
+        return json_codec.dumps_bytes(content)
@@ -0,0 +1,85 @@
+"""Server-Sent Events のフレーム組み立て
+
+固定部分は事前にバイト列化しておき、ペイロードは json_codec（orjson 優先）で直接 bytes にする。
+フレームごとの str 生成・UTF-8 再エンコードを省くため、StreamingResponse にはこの bytes をそのまま渡す。
+"""
+
+import asyncio
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List
+
+from utils import json_codec
+
+SSE_DATA_PREFIX = b"data: "
+SSE_ERROR_PREFIX = b"event: error\ndata: "
+SSE_FRAME_END = b"\n\n"
+SSE_DONE = b"data: [DONE]\n\n"
+
+
+def sse_frame(payload: dict, prefix: bytes = SSE_DATA_PREFIX) -> bytes:
+    """payload を 1 つの SSE フレーム（bytes）にエンコード"""
+    return prefix + json_codec.dumps_bytes(payload) + SSE_FRAME_END
+
+
+# answer パートをまとめる時間窓と上限文字数（送信回数を減らしつつ体感の遅れは出ない範囲）
+COALESCE_WINDOW_SEC = 0.016
+COALESCE_MAX_CHARS = 1024
+
+
+async def coalesce_answer_parts(
+    parts: AsyncIterable[Dict[str, Any]],
+    window: float = COALESCE_WINDOW_SEC,
+    max_chars: int = COALESCE_MAX_CHARS,
+) -> AsyncIterator[Dict[str, Any]]:
+    """{'type': 'answer'} パートを短い時間窓でまとめて 1 パートにする
+
+    最初の answer を受け取ってから window 秒経つか max_chars に達したら送る。次のパートを待つ間も
+    窓の期限で送り出すため、上流が止まってもテキストが溜まったままにはならない。
+    answer 以外のパートは、溜めた answer を先に送ってからそのまま流す。
+    """
+    loop = asyncio.get_running_loop()
+    ait = parts.__aiter__()
+    buf: List[str] = []
+    buf_len = 0
+    deadline = None
+    nxt = None
+    try:
+        while True:
+            if nxt is None:
+                nxt = asyncio.ensure_future(ait.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({nxt}, timeout=timeout)
+            if not done:
+                yield {"type": "answer", "data": "".join(buf)}
+                buf.clear()
+                buf_len = 0
+                deadline = None
+                continue
+            task, nxt = nxt, None
+            try:
+                part = task.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                if buf:
+                    yield {"type": "answer", "data": "".join(buf)}
+                    buf.clear()
+                raise
+            if part.get("type") == "answer":
+                buf.append(part["data"])
+                buf_len += len(part["data"])
+                if deadline is None:
+                    deadline = loop.time() + window
+                if buf_len < max_chars:
+                    continue
+            if buf:
+                yield {"type": "answer", "data": "".join(buf)}
+                buf.clear()
+                buf_len = 0
+                deadline = None
+            if part.get("type") != "answer":
+                yield part
+        if buf:
+            yield {"type": "answer", "data": "".join(buf)}
+    finally:
+        if nxt is not None:
+            nxt.cancel()
@@ -0,0 +1,27 @@
+"""UTC 現在時刻の ISO 8601 文字列を安価に生成する
+
+datetime.now(timezone.utc).isoformat() と同じ書式（マイクロ秒精度・"+00:00" 付き）を返すが、
+秒までの部分は 1 秒ごとにキャッシュし、呼び出しごとの datetime 生成・整形を避ける。
+created_at での並び替えに使われるため、秒単位に丸めることはしない。
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+_sec_cache = (-1, "")
+_sec_cache_lock = threading.Lock()
+
+
+def utc_now_iso() -> str:
+    """現在時刻（UTC）を ISO 8601 文字列で返す"""
+    global _sec_cache
+    sec, usec = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_sec, prefix = _sec_cache
+    if cached_sec != sec:
+        prefix = datetime.fromtimestamp(sec, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        with _sec_cache_lock:
+            _sec_cache = (sec, prefix)
+    if usec:
+        return f"{prefix}.{usec:06d}+00:00"
+    return f"{prefix}+00:00"